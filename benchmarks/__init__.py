@@ -0,0 +1 @@
+"""Standalone benchmarks. Run them as modules from the project root, e.g. python -m benchmarks.feature_profile_loss"""
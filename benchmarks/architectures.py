@@ -0,0 +1,77 @@
+"""
+Compares the number of parameters, FLOPs and inference latency of the generator (netG) and the extractor (netE)
+per variant of the architecture options. The networks are randomly initialized, the length of the spectra is given by --roi.
+The validation error of the architectures is compared by training them with benchmarks.train_step and the same variants.
+
+Usage:
+    python -m benchmarks.architectures --roi 361,713 --variants "" netG_arch=separable netG_arch=inverted,netG_expansion=2 netE_arch=conv,nef=16
+    python -m benchmarks.train_step --dataroot datasets/ucsf --model cycleGAN_W_REG --gpu_ids 0 --roi 361,713 \\
+        --checkpoints_dir /tmp/bench --bench_iters 2000 --variants "" netG_arch=separable netG_arch=inverted,netG_expansion=2 netE_arch=conv,nef=16
+
+A variant is a comma separated list of options, e.g. "netG_arch=inverted,netG_expansion=2" for --netG_arch inverted --netG_expansion 2.
+FLOPs are counted per spectrum (a multiply-add counts as two FLOPs), the latency is measured for a batch of --batch_size spectra.
+"""
+import sys
+import torch
+from torch.utils.flop_counter import FlopCounterMode
+
+from benchmarks.train_step import parse_variant
+from models import define
+from models.auxiliaries import auxiliary
+from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
+from options.base_options import BaseOptions
+from util.benchmark import measure, print_results
+
+
+def benchmark(network, x, device, n_iter):
+    network.eval()
+    with torch.inference_mode():
+        with FlopCounterMode(display=False) as counter:
+            network(x)
+        timing = measure(lambda: network(x), device, n_iter=n_iter)
+    return {
+        'parameters': sum(p.numel() for p in network.parameters()),
+        'MFLOPs': counter.get_total_flops() / len(x) / 1e6,
+        'time_ms': timing['time_ms'],
+        'samples/s': len(x) / timing['time_ms'] * 1000
+    }
+
+
+def run(options: BaseOptions, argv: list):
+    opt = options.parser.parse_args(argv)
+    options.adjust(opt)
+    device = torch.device('cuda:%d' % opt.gpu_ids[0]) if opt.gpu_ids else torch.device('cpu')
+    auxiliary.set_num_dimensions(1)
+    physicsModel = MRSPhysicsModel(opt)
+    data_length = physicsModel.basis_spectra.shape[-1]  # the region of interest
+    netG = define.define_G(opt.input_nc, opt.output_nc, opt.ngf, opt.which_model_netG, opt.norm, opt.gpu_ids,
+                           init_type=opt.init_type, arch=opt.netG_arch, expansion=opt.netG_expansion)
+    netE = define.define_extractor(opt.input_nc, physicsModel.get_num_out_channels(), data_length, opt.nef, opt.n_layers_E,
+                                   opt.norm, opt.gpu_ids, arch=opt.netE_arch)
+    x = torch.randn(opt.batch_size, opt.input_nc, data_length, device=device)
+    return benchmark(netG, x, device, opt.bench_iters), benchmark(netE, x, device, opt.bench_iters)
+
+
+def main():
+    options = BaseOptions()
+    options.initialize()
+    options.isTrain = False
+    options.parser.set_defaults(gpu_ids='-1')
+    for action in options.parser._actions:
+        if action.dest == 'dataroot':
+            action.required = False
+    options.parser.add_argument('--variants', type=str, nargs='+', default=[''], help='comma separated option overrides per variant')
+    options.parser.add_argument('--bench_iters', type=int, default=50, help='number of timed forward passes per network')
+    argv = sys.argv[1:]
+    variants = options.parser.parse_args(argv).variants
+
+    results = {}
+    for variant in variants:
+        netG, netE = run(options, argv + parse_variant(variant))
+        results['netG %s' % (variant or 'baseline')] = netG
+        results['netE %s' % (variant or 'baseline')] = netE
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares the unfold/cumsum based FeatureProfileLoss with the previous gather based implementation.
+Measures forward + backward time and memory of the loss as it is used in calculate_G_loss when lambda_feat > 0.
+
+Usage: python -m benchmarks.feature_profile_loss --device cuda --batch_size 50 --data_length 352
+"""
+import argparse
+import torch
+import torch.nn as nn
+
+from models.auxiliaries.FeatureProfileLoss import FeatureProfileLoss
+from util.benchmark import measure, print_results
+
+
+class GatherFeature(nn.Module):
+    """The previous implementation of Feature, kept here as reference."""
+    def __init__(self, k):
+        super().__init__()
+        self.k = k
+        self.index = None
+
+    def forward(self, input):
+        s = input.shape
+        if self.index is None:
+            index = torch.empty(1, 1, (s[2] - self.k + 1) * self.k, device=input.device, dtype=torch.long)
+            for i in range(s[2] - self.k + 1):
+                index[:, :, i*self.k:(i+1)*self.k] = torch.arange(i, i+self.k, 1)
+            self.index = index.expand(s[0], s[1], -1)
+        temp = input.gather(2, self.index).reshape(s[0], s[1], s[2] - self.k + 1, self.k)
+        entropy = torch.mean(nn.functional.softmax(temp, dim=3) * nn.functional.log_softmax(temp, dim=3), dim=3)
+        content = torch.mean(temp, dim=3)
+        return entropy, content
+
+
+def gather_loss(kernel_sizes, device):
+    loss = FeatureProfileLoss(kernel_sizes).to(device)
+    for module in loss.entropyloss:
+        module.entropy = GatherFeature(module.entropy.k)
+    return loss
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--batch_size', type=int, default=50)
+    parser.add_argument('--input_nc', type=int, default=2)
+    parser.add_argument('--data_length', type=int, default=352)
+    parser.add_argument('--kernel_sizes', type=str, default='2,3,4,5')
+    parser.add_argument('--n_iter', type=int, default=20)
+    args = parser.parse_args()
+    kernel_sizes = tuple(map(int, args.kernel_sizes.split(',')))
+
+    shape = (args.batch_size, args.input_nc, args.data_length)
+    rec = torch.rand(shape, device=args.device) * 2 - 1
+    real = torch.rand(shape, device=args.device) * 2 - 1
+    rec.requires_grad_(True)
+
+    losses = {'gather': gather_loss(kernel_sizes, args.device), 'unfold/cumsum': FeatureProfileLoss(kernel_sizes).to(args.device)}
+    values = {}
+    results = {}
+    for name, criterion in losses.items():
+        def step():
+            rec.grad = None
+            entropy_loss, content_loss = criterion(rec, real)
+            (entropy_loss + content_loss).backward()
+            return entropy_loss, content_loss
+        values[name] = [v.item() for v in step()]
+        results[name] = measure(step, args.device, n_iter=args.n_iter)
+
+    print('Input shape', shape, 'kernel sizes', [2**k for k in kernel_sizes], 'on', args.device)
+    print_results(results)
+    print('Loss values (entropy, content):', values)
+
+
+if __name__ == '__main__':
+    main()
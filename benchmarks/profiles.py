@@ -0,0 +1,43 @@
+"""
+Compares the cost of training runs by the profile.json that train.py and raytune.py save in the checkpoint directory:
+parameters, FLOPs, memory and latency per network, or with --layers per layer of the given network.
+
+Usage:
+    python -m benchmarks.profiles checkpoints/REG-CycleGAN_ucsf_medium checkpoints/CycleGAN-WGP_ucsf
+    python -m benchmarks.profiles checkpoints/REG-CycleGAN_ucsf_medium --layers netG_B
+"""
+import argparse
+import json
+import os
+
+from util.benchmark import print_results
+
+
+def load_profile(path):
+    if os.path.isdir(path):
+        path = os.path.join(path, 'profile.json')
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('runs', type=str, nargs='+', help='checkpoint directories or profile.json files')
+    parser.add_argument('--layers', type=str, default=None, help='name of the network whose layers are listed')
+    args = parser.parse_args()
+
+    results = {}
+    for path in args.runs:
+        profile = load_profile(path)
+        run = os.path.basename(os.path.dirname(path) if path.endswith('.json') else os.path.normpath(path))
+        for name, network in profile['networks'].items():
+            if args.layers is None:
+                results['%s %s' % (run, name)] = {key: value for key, value in network.items() if key != 'layers'}
+            elif name == args.layers:
+                results.update({'%s %s' % (run, layer['name']): {key: value for key, value in layer.items() if key not in ['name', 'type']}
+                                for layer in network['layers']})
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
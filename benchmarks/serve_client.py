@@ -0,0 +1,72 @@
+"""
+Load test of the inference server (serve.py): sends single spectrum requests from concurrent clients and reports the
+client side latency and throughput together with the server metrics (batch sizes, server side latency).
+The spectra are random unless --dataroot is given, then they are taken from the data files of the --phase set.
+
+Usage:
+    python serve.py --name CycleGAN-WGP_ucsf --checkpoints_dir ./checkpoints --model_path ./checkpoints/CycleGAN-WGP_ucsf/best &
+    python -m benchmarks.serve_client --concurrency 16 --requests 2000
+    python -m benchmarks.serve_client --socket /tmp/quantify.sock --concurrency 1 --requests 500
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from util.inference_server import InferenceClient
+
+
+def load_spectra(args):
+    if args.dataroot is None:
+        return np.random.rand(args.num_spectra, 2, args.data_length) * 2 - 1
+    sizes = np.genfromtxt(os.path.join(args.dataroot, 'sizes_A'), delimiter=',').astype(np.int64)
+    size = sizes[{'train': 0, 'val': 1, 'test': 1}[args.phase]]   # like the datasets
+    spectra = np.memmap(os.path.join(args.dataroot, args.phase + '_A.dat'), dtype='double', mode='r', shape=(size, sizes[4], sizes[3]))
+    return np.asarray(spectra[:args.num_spectra])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--socket', type=str, default=None, help='path of the Unix socket of the server')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=1000, help='total number of requests')
+    parser.add_argument('--batch', type=int, default=1, help='number of spectra per request')
+    parser.add_argument('--dataroot', type=str, default=None, help='dataset to take the spectra from')
+    parser.add_argument('--phase', type=str, default='val')
+    parser.add_argument('--num_spectra', type=int, default=100, help='number of different spectra sent')
+    parser.add_argument('--data_length', type=int, default=352, help='length of the random spectra')
+    args = parser.parse_args()
+
+    client = InferenceClient(args.host, args.port, args.socket)
+    spectra = load_spectra(args)
+    requests = [spectra[np.arange(i * args.batch, (i + 1) * args.batch) % len(spectra)] for i in range(args.requests)]
+    if args.batch == 1:
+        requests = [request[0] for request in requests]
+    client.quantify(requests[0])    # warm up
+    start_metrics = client.metrics()
+
+    def send(request):
+        start = time.perf_counter()
+        client.quantify(request)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        latencies = np.array(list(executor.map(send, requests))) * 1000
+    duration = time.perf_counter() - start
+    metrics = client.metrics()
+
+    batches = metrics['batches'] - start_metrics['batches']
+    print('%d requests of %d spectra from %d clients in %.2f s' % (args.requests, args.batch, args.concurrency, duration))
+    print('Throughput: %.1f requests/s, %.1f spectra/s' % (args.requests / duration, args.requests * args.batch / duration))
+    print('Client latency (ms): mean %.2f, p50 %.2f, p95 %.2f, p99 %.2f, max %.2f' % (
+        latencies.mean(), *np.percentile(latencies, [50, 95, 99]), latencies.max()))
+    print('Server: %d batches, %.1f spectra per batch' % (batches, (metrics['samples'] - start_metrics['samples']) / max(batches, 1)))
+    print('Server metrics:', metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Trains a model for a fixed number of iterations once per variant of the training options and compares
+throughput, peak memory and the validation score reached. All variants start from the same random seed,
+so they only differ in the given options.
+
+Usage:
+    python -m benchmarks.train_step --dataroot datasets/ucsf --model cycleGAN_W_REG --gpu_ids 0 --n_critic 5 \\
+        --checkpoints_dir /tmp/bench --bench_iters 500 --variants amp=off amp=bf16 amp=fp16
+    python -m benchmarks.train_step [...] --variants weight_norm=gp weight_norm=gp,reg_interval=4 weight_norm=r1,reg_interval=4
+    python -m benchmarks.train_step [...] --variants "" grad_checkpoint=all
+    python -m benchmarks.train_step --model cycleGAN_W [...] --variants "" fuse_twins
+
+A variant is a comma separated list of options, e.g. "amp=bf16,compile" for --amp bf16 --compile.
+peak_mb is the peak CUDA memory and only measured on GPUs. saved_mb is the memory of the activations autograd saves for the
+backward passes of one generator step (without parameters), on any device.
+Started with torchrun, the benchmark trains data parallel and reports the samples/s of all processes together:
+    torchrun --nproc_per_node 4 -m benchmarks.train_step [...] --gpu_ids -1
+"""
+import os
+import random
+import sys
+import time
+import numpy as np
+import torch
+
+from data.data_loader import CreateDataLoader
+from models.auxiliaries import lr_scheduler
+from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
+from models.models import create_model
+from options.train_options import TrainOptions
+from util import distributed, util
+from util.benchmark import synchronize
+from util.validator import Validator
+
+
+def parse_variant(variant: str):
+    """Turns 'key=value,flag' into ['--key', 'value', '--flag']"""
+    argv = []
+    for item in filter(None, variant.split(',')):
+        key, _, value = item.partition('=')
+        argv.append('--' + key)
+        if value:
+            argv.append(value)
+    return argv
+
+
+def infinite(dataset):
+    while True:
+        for data in dataset:
+            yield data
+
+
+def saved_tensors_mb(model, data):
+    """Runs a generator step and returns the size of all activations autograd saved for the backward passes in MB"""
+    storages = {}
+    def pack(tensor):
+        if not isinstance(tensor, torch.nn.Parameter):
+            storage = tensor.untyped_storage()
+            storages[(storage.device, storage.data_ptr())] = storage.nbytes()
+        return tensor
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        model.set_input(data)
+        model.optimize_parameters(optimize_G=True)
+    return sum(storages.values()) / 2**20
+
+
+def run(options: TrainOptions, argv: list):
+    opt = options.parser.parse_args(argv)
+    options.adjust(opt)
+    opt.quiet = True
+    util.mkdirs(os.path.join(opt.checkpoints_dir, opt.name))
+    if opt.gpu_ids:
+        torch.cuda.set_device(opt.gpu_ids[0])
+    distributed.init_process_group(opt)
+    lr_scheduler.initialized = False
+    random.seed(opt.bench_seed + opt.rank)
+    np.random.seed(opt.bench_seed + opt.rank)
+    torch.manual_seed(opt.bench_seed + opt.rank)
+
+    physicsModel = MRSPhysicsModel(opt)
+    data_loader = CreateDataLoader(opt, 'train')
+    train_set = data_loader.load_data()
+    val_set = CreateDataLoader(opt, 'val').load_data()
+    model = create_model(opt, physicsModel)
+    if opt.compile:
+        batch_sizes = {opt.batch_size, len(data_loader) % opt.batch_size, len(val_set.sampler) % opt.batch_size} - {0}
+        model.warmup(train_set, sorted(batch_sizes, reverse=True))
+
+    device = model.device
+    batches = infinite(train_set)
+    for i in range(opt.bench_warmup + opt.bench_iters):
+        if i == opt.bench_warmup:
+            synchronize(device)
+            if device.type == 'cuda':
+                torch.cuda.reset_peak_memory_stats(device)
+            start = time.perf_counter()
+        model.set_input(next(batches))
+        model.optimize_parameters(optimize_G=not(i % opt.n_critic))
+    synchronize(device)
+    duration = time.perf_counter() - start
+
+    opt.phase = 'val'
+    _, _, avg_err_rel, r2 = Validator(opt).get_validation_score(model, val_set, per_sample=False)
+    opt.phase = 'train'
+    saved_mb = saved_tensors_mb(model, next(batches))
+    result = {
+        'samples/s': opt.bench_iters * opt.batch_size * opt.accum_steps * opt.world_size / duration,
+        'ms/iter': duration / opt.bench_iters * 1000,
+        'peak_mb': torch.cuda.max_memory_allocated(device) / 2**20 if device.type == 'cuda' else float('nan'),
+        'saved_mb': saved_mb,
+        'err_rel': np.mean(avg_err_rel),
+        'r2': np.mean(r2)
+    }
+    for name, err in zip(physicsModel.get_label_names(), avg_err_rel):
+        result['err_rel_' + name] = err
+    return result
+
+
+def main():
+    options = TrainOptions()
+    options.initialize()
+    options.parser.add_argument('--variants', type=str, nargs='+', default=[''], help='comma separated option overrides per variant')
+    options.parser.add_argument('--bench_iters', type=int, default=200, help='number of timed training iterations per variant')
+    options.parser.add_argument('--bench_warmup', type=int, default=10, help='number of untimed training iterations per variant')
+    options.parser.add_argument('--bench_seed', type=int, default=0, help='random seed used for every variant')
+    argv = sys.argv[1:]
+    variants = options.parser.parse_args(argv).variants
+
+    results = {}
+    for variant in variants:
+        results[variant or 'baseline'] = run(options, argv + parse_variant(variant))
+        if distributed.is_main_process():
+            print(variant or 'baseline', results[variant or 'baseline'])
+
+    if not distributed.is_main_process():
+        return
+
+    keys = list(next(iter(results.values())).keys())
+    print(('%-30s' + '%14s' * len(keys)) % ('', *keys))
+    for name, result in results.items():
+        print(('%-30s' + '%14.4g' * len(keys)) % (name, *[result[key] for key in keys]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,27 @@
+import random
+import torch
 from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
 from data.base_data_loader import BaseDataLoader
+from util import distributed
+
+
+class ResumableSampler(DistributedSampler):
+    """
+    Sampler for the training set. The order of every epoch is determined by seed and epoch, and an epoch can be started
+    at any sample, so training can resume in the middle of an epoch with the same batches.
+    With multiple processes each one samples its own shard of the dataset.
+    """
+    def __init__(self, dataset, num_replicas, rank, shuffle, seed):
+        super().__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle, seed=seed)
+        self.start = 0
+
+    def __iter__(self):
+        return iter(list(super().__iter__())[self.start:])
+
+    def __len__(self):
+        return self.num_samples - self.start
+
 
 class CustomDatasetDataLoader(BaseDataLoader):
     def name(self):
@@ -9,10 +31,24 @@ class CustomDatasetDataLoader(BaseDataLoader):
         BaseDataLoader.initialize(self, opt)
         self.dataset = self.createDataset(opt, phase)
 
+        self.sampler = None
+        if phase == 'train':
+            # All processes need the same seed to split the dataset into disjoint shards
+            seed = distributed.broadcast_object(random.randrange(2**31))
+            self.sampler = ResumableSampler(self.dataset, num_replicas=opt.world_size, rank=opt.rank, shuffle=not opt.no_shuffle, seed=seed)
+        elif opt.world_size > 1:
+            # Each sample is used exactly once, so validation scores gathered over all processes are exact
+            self.sampler = list(range(opt.rank, len(self.dataset), opt.world_size))
+
+        # With gradient accumulation a training batch holds the micro-batches of one optimizer step
+        self.batch_size = opt.batch_size * opt.accum_steps if opt.isTrain and phase == 'train' else opt.batch_size
+        # The data loader draws the seeds of its workers from its own generator instead of the global random number generator
+        self.generator = torch.Generator()
         self.dataloader = DataLoader(self.dataset,
-                                        batch_size=opt.batch_size,
-                                        shuffle=(not opt.no_shuffle and phase=='train'),   # Already included when the dataset is split
+                                        batch_size=self.batch_size,
+                                        sampler=self.sampler,
                                         num_workers=int(opt.nThreads),
+                                        generator=self.generator,
                                         drop_last=False)
 
     def createDataset(self, opt, phase):
@@ -34,5 +70,21 @@ class CustomDatasetDataLoader(BaseDataLoader):
     def load_data(self):
         return self.dataloader
 
+    def set_epoch(self, epoch, start_batch=0):
+        """Sets the order of the training set for the given epoch, which starts at batch start_batch"""
+        if isinstance(self.sampler, ResumableSampler):
+            self.sampler.set_epoch(epoch)
+            self.sampler.start = start_batch * self.batch_size
+            self.generator.manual_seed(self.sampler.seed + epoch)
+
+    def state_dict(self):
+        """Returns the seed that determines the order of the training set in every epoch"""
+        return {'seed': self.sampler.seed} if isinstance(self.sampler, ResumableSampler) else {}
+
+    def load_state_dict(self, state_dict):
+        if isinstance(self.sampler, ResumableSampler):
+            self.sampler.seed = state_dict['seed']
+
     def __len__(self):
-        return len(self.dataset)
+        """Number of samples loaded by this process"""
+        return len(self.dataloader.sampler)
@@ -15,6 +15,7 @@ class RegCycleGANDataset(BaseDataset):
         self.root = opt.dataroot
         self.physics_model: PhysicsModel = opt.physics_model
         self.empty_tensor = empty(0)
+        self.generator = None   # random number generator of the B samples. Default: the global torch generator
 
         # Select relevant part of dataset
         if opt.representation == 'real':
@@ -60,7 +61,7 @@ class RegCycleGANDataset(BaseDataset):
         self.B_sampler = self.generate_B_sample
 
     def generate_B_sample(self, index = None):
-        param = torch.rand((1, self.num_labels))
+        param = torch.rand((1, self.num_labels), generator=self.generator)
         return self.physics_model.param_to_quantity(param).squeeze(0)
 
     def innit_length(self, full_length):
@@ -0,0 +1,175 @@
+"""
+Distillation of the generators of a trained CycleGAN or cycleGAN_W_REG into smaller students.
+
+Once you have trained your model with train.py, you can use this script to train smaller networks (students) that
+imitate its generators (the frozen teacher). The students are trained on spectra of the physics model, so no dataset is needed:
+    - netG_B (ideal -> real spectra) on ideal spectra of random parameters, imitating the teacher's netG_B
+    - netG_A (real spectra -> parameters or ideal spectra) on the real spectra the teacher's netG_B generates from them
+The Resnet generator students have '--student_ngf' filters and '--student_blocks' blocks, the extractor student of
+cycleGAN_W_REG has '--student_layers_E' layers of '--student_nef' neurons. Networks not named in '--distill' are copied from the teacher.
+Students and teacher are compared on '--eval_samples' held-out spectra of the physics model (and on the '--eval_phase' set, if given):
+the error of the student outputs relative to the teacher outputs, the quantification error (compute_error()) against the
+known parameters, the number of parameters and the runtime of every network.
+The students are saved as new experiment '--student_name' with
+    - latest: the checkpoint of the student model
+    - generators.json: the channels of the student generators, loaded by define_G() with --netG_channels
+    - opt.txt: the options of the student model, to validate, export or serve it by its name
+    - distill.json: the comparison of students and teacher
+
+Usage:
+    python distill.py --name CycleGAN-WGP_ucsf --checkpoints_dir ./checkpoints --model_path ./checkpoints/CycleGAN-WGP_ucsf/best --student_ngf 16 --student_blocks 2
+"""
+from data.data_loader import CreateDataLoader
+from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
+from models.auxiliaries.pruning import count_parameters
+from models.networks import ResnetGenerator, ExtractorConv, ExtractorMLP
+from models import define
+from util.util import compute_error, get_networks, load_options, merge_options, mkdir, save_options
+from util.benchmark import measure, print_results
+from util.validator import Validator
+from options.distill_options import DistillOptions
+from models.models import create_model
+import copy
+import itertools
+import json
+import numpy as np
+import os
+import torch
+import torch.nn as nn
+
+
+def synthesize(num_samples, generator=None):
+    """
+    Returns random parameters and the inputs and teacher outputs of netG_B and netG_A:
+    the ideal spectra of the parameters, the real spectra the teacher generates from them and the teacher's netG_A output of those
+    """
+    params = torch.rand(num_samples, physicsModel.get_num_out_channels(), generator=generator).to(teacher.device)
+    with torch.no_grad():
+        ideal = physicsModel.forward(params)
+        real = teacher_networks['netG_B'](ideal)
+        return params, {'netG_B': ideal, 'netG_A': real}, {'netG_B': real, 'netG_A': teacher_networks['netG_A'](real)}
+
+
+def predict(model, spectra: list, quantities: list):
+    """Returns the predicted quantities of the model for batches of real spectra"""
+    predictions = []
+    for A, label_A in zip(spectra, quantities):
+        model.set_input({'A': A, 'label_A': label_A})
+        model.test()
+        predictions.append(model.get_prediction())
+    return np.concatenate(predictions)
+
+
+def summarize(predictions, y):
+    _, _, avg_err_rel, r2 = compute_error(predictions, y)
+    return {'avg_err_rel': float(np.mean(avg_err_rel)), 'r2': float(np.mean(r2))}
+
+
+distillOptions = DistillOptions()
+opt = distillOptions.parse()  # get distillation options
+train_options = load_options(os.path.join(opt.checkpoints_dir, opt.name, 'opt.txt'))
+default_options = distillOptions.get_defaults()
+opt = merge_options(default_options, train_options, opt)
+
+# hard-code some parameters for distillation
+opt.isTrain = False     # teacher and students are inference models, opt.txt of the training run has isTrain=True
+opt.phase = 'val'       # inference forward pass
+if opt.model not in ['cycleGAN', 'cycleGAN_W_REG']:
+    raise ValueError('Distillation needs the generators netG_A and netG_B of a cycleGAN or cycleGAN_W_REG checkpoint, not %s' % opt.model)
+
+physicsModel = MRSPhysicsModel(opt)
+opt.data_length = physicsModel.basis_spectra.shape[-1]  # set by the dataset otherwise
+teacher = create_model(opt, physicsModel)
+teacher.load_checkpoint(opt.model_path)
+teacher_networks = get_networks(teacher)
+for network in teacher_networks.values():
+    network.eval()
+    network.requires_grad_(False)
+
+# The student model is a model of the same type with smaller generators
+student_opt = copy.copy(opt)
+student_opt.name = opt.student_name or opt.name + '_student'
+save_dir = os.path.join(opt.checkpoints_dir, student_opt.name)
+mkdir(save_dir)
+distilled = opt.distill.split(',')
+channels = define.load_generator_channels(opt.netG_channels)
+for name in distilled:
+    if not isinstance(teacher_networks.get(name), (ResnetGenerator, ExtractorMLP, ExtractorConv)):
+        raise ValueError('--distill: %s is not a generator or extractor of %s' % (name, teacher.name()))
+    if isinstance(teacher_networks[name], ResnetGenerator):
+        channels[name] = ResnetGenerator.default_channels(opt.student_ngf, opt.student_blocks, expansion=teacher_networks[name].expansion)
+    else:
+        student_opt.nef, student_opt.n_layers_E = opt.student_nef, opt.student_layers_E
+student_opt.netG_channels = os.path.join(save_dir, 'generators.json') if channels else None
+if channels:
+    with open(student_opt.netG_channels, 'w') as f:
+        json.dump(channels, f, indent=4)
+student = create_model(student_opt, physicsModel)
+student_networks = get_networks(student)
+for name, network in student_networks.items():
+    if name not in distilled:
+        network.load_state_dict(teacher_networks[name].state_dict())
+
+criterion = {'l1': nn.L1Loss(), 'mse': nn.MSELoss()}[opt.distill_loss]
+optimizer = torch.optim.Adam(itertools.chain(*[student_networks[name].parameters() for name in distilled]), lr=opt.distill_lr)
+for name in distilled:
+    student_networks[name].train()
+for i in range(1, opt.distill_iters + 1):
+    _, inputs, targets = synthesize(opt.batch_size)
+    losses = {name: criterion(student_networks[name](inputs[name]), targets[name]) for name in distilled}
+    optimizer.zero_grad(set_to_none=True)
+    sum(losses.values()).backward()
+    optimizer.step()
+    if i % opt.print_freq == 0:
+        print('Distillation iteration %d: %s' % (i, ', '.join('loss_%s %.5f' % (name, loss.item()) for name, loss in losses.items())))
+for name in distilled:
+    student_networks[name].eval()
+
+# Compare students and teacher on held-out spectra of the physics model
+generator = torch.Generator().manual_seed(0)
+batches = [synthesize(min(opt.batch_size, opt.eval_samples - start), generator) for start in range(0, opt.eval_samples, opt.batch_size)]
+report = {'distill_loss': opt.distill_loss, 'distill_iters': opt.distill_iters, 'networks': {}}
+timings = {}
+with torch.inference_mode():
+    for name in distilled:
+        errors = [(student_networks[name](inputs[name]) - targets[name]).abs() for _, inputs, targets in batches]
+        scale = torch.cat([targets[name].abs().flatten() for _, _, targets in batches]).mean()
+        sample = batches[0][1][name]
+        for role, network in [('teacher', teacher_networks[name]), ('student', student_networks[name])]:
+            timings['%s %s' % (name, role)] = dict(measure(lambda: network(sample), teacher.device, n_iter=opt.bench_iters), parameters=count_parameters(network))
+        report['networks'][name] = {
+            'mean_abs_err': torch.cat([e.flatten() for e in errors]).mean().item(),
+            'rel_err': (torch.cat([e.flatten() for e in errors]).mean() / scale).item(),
+            'parameters': {role: timings['%s %s' % (name, role)]['parameters'] for role in ['teacher', 'student']},
+            'time_ms': {role: timings['%s %s' % (name, role)]['time_ms'] for role in ['teacher', 'student']},
+            'batch_size': len(sample)
+        }
+        report['networks'][name]['speedup'] = report['networks'][name]['time_ms']['teacher'] / report['networks'][name]['time_ms']['student']
+    quantities = [physicsModel.param_to_quantity(params) for params, _, _ in batches]
+    spectra = [inputs['netG_A'] for _, inputs, _ in batches]
+    y = torch.cat(quantities).cpu().numpy()
+    report['synthetic'] = {role: summarize(predict(model, spectra, quantities), y) for role, model in [('teacher', teacher), ('student', student)]}
+print_results({key: {'time_ms': value['time_ms'], 'parameters': value['parameters']} for key, value in timings.items()})
+
+if opt.eval_phase:
+    dataset = CreateDataLoader(opt, opt.eval_phase).load_data()
+    validator = Validator(opt)
+    report[opt.eval_phase] = {}
+    for role, model in [('teacher', teacher), ('student', student)]:
+        _, _, avg_err_rel, r2 = validator.get_validation_score(model, dataset, per_sample=False)
+        report[opt.eval_phase][role] = {'avg_err_rel': float(np.mean(avg_err_rel)), 'r2': float(np.mean(r2))}
+
+for name, result in report['networks'].items():
+    print('%s: %d -> %d parameters, %.2fx faster, mean absolute error to the teacher %.4g (%.2f%% of the mean absolute output)'
+          % (name, result['parameters']['teacher'], result['parameters']['student'], result['speedup'], result['mean_abs_err'], result['rel_err'] * 100))
+for data in ['synthetic', opt.eval_phase]:
+    if data in report:
+        print('%s spectra: avg_err_rel %.4f (teacher) -> %.4f (student), R^2 %.4f -> %.4f' % (data, report[data]['teacher']['avg_err_rel'],
+              report[data]['student']['avg_err_rel'], report[data]['teacher']['r2'], report[data]['student']['r2']))
+
+torch.save({'networks': [network.state_dict() for network in student.networks]}, os.path.join(save_dir, 'latest'))
+student.save_network_architecture(student.networks)
+save_options(student_opt, os.path.join(save_dir, 'opt.txt'))
+with open(os.path.join(save_dir, 'distill.json'), 'w') as f:
+    json.dump(report, f, indent=4)
+print('Student model saved to', save_dir)
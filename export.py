@@ -0,0 +1,138 @@
+"""
+Export script for the inference networks.
+
+Once you have trained your model with train.py, you can use this script to export its inference networks
+(the generators, the extractor of cycleGAN_W_REG or the splitter and style generator of cycleGAN_REGv2) to TorchScript and ONNX.
+The networks that predict metabolite parameters are exported with the scaling of the physics model folded in,
+so they output quantities like model.get_prediction(). The networks are traced with a batch of the '--phase' set.
+Every exported network is checked for parity with the original network on this batch and on half of it (dynamic batch size),
+and benchmarked on the CPU with PyTorch eager, TorchScript and, if installed, ONNX Runtime.
+The networks and a report (export.json) are saved to '--export_dir'.
+
+Usage:
+    python export.py --dataroot datasets/ucsf --name CycleGAN-WGP_ucsf --checkpoints_dir ./checkpoints --model_path ./checkpoints/CycleGAN-WGP_ucsf/best
+"""
+from data.data_loader import CreateDataLoader
+from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
+from util.util import get_networks, load_options, merge_options, mkdir, record_network_inputs
+from util.benchmark import measure, print_results
+from options.export_options import ExportOptions
+from models.models import create_model
+import json
+import os
+import sys
+import torch
+import torch.nn as nn
+
+# Networks that predict the metabolite parameters (as first output) per model
+QUANTITY_NETWORKS = {'cycleGAN_W_REG': 'netG_A', 'cycleGAN_REGv2': 'splitter'}
+
+
+class QuantityHead(nn.Module):
+    """Folds param_to_quantity() of the physics model into a network: its first output is scaled from parameters to quantities"""
+    def __init__(self, network: nn.Module, physicsModel: MRSPhysicsModel):
+        super().__init__()
+        self.network = network
+        self.register_buffer('scale', physicsModel.max_per_met.detach().clone())
+        self.register_buffer('offset', physicsModel.min_per_met.detach().clone())
+
+    def forward(self, *inputs):
+        out = self.network(*inputs)
+        if isinstance(out, tuple):
+            return (out[0] * self.scale + self.offset,) + tuple(out[1:])
+        return out * self.scale + self.offset
+
+
+def as_tuple(out):
+    return tuple(out) if isinstance(out, (tuple, list)) else (out,)
+
+
+def max_error(outputs, references):
+    return max((output - reference).abs().max().item() for output, reference in zip(outputs, references))
+
+
+exportOptions = ExportOptions()
+opt = exportOptions.parse()  # get export options
+sample_phase = opt.phase
+train_options = load_options(os.path.join(opt.checkpoints_dir, opt.name, 'opt.txt'))
+default_options = exportOptions.get_defaults()
+opt = merge_options(default_options, train_options, opt)
+
+# hard-code some parameters for export
+opt.gpu_ids = []
+opt.isTrain = False     # only the inference networks, opt.txt of the training run has isTrain=True
+opt.phase = 'val'       # inference forward pass
+formats = opt.formats.split(',')
+export_dir = opt.export_dir or os.path.join(opt.checkpoints_dir, opt.name, 'export')
+mkdir(export_dir)
+if 'onnx' in formats:
+    try:
+        import onnxruntime
+    except ImportError:
+        onnxruntime = None
+        print('onnxruntime is not installed: the ONNX models are exported without parity check and benchmark')
+
+physicsModel = MRSPhysicsModel(opt)
+dataset = CreateDataLoader(opt, sample_phase).load_data()     # creates the dataset first, it determines opt.data_length
+model = create_model(opt, physicsModel)
+model.load_checkpoint(opt.model_path)
+inputs = record_network_inputs(model, [next(iter(dataset))])
+
+report = {}
+failed = False
+for name, network in get_networks(model).items():
+    network.eval()
+    module = QuantityHead(network, physicsModel) if QUANTITY_NETWORKS.get(opt.model) == name else network
+    module.eval()
+    sample = inputs[name][0]
+    half = tuple(x[:max(len(x) // 2, 1)] for x in sample)
+    with torch.inference_mode():
+        references = {len(sample[0]): as_tuple(module(*sample)), len(half[0]): as_tuple(module(*half))}
+    input_names = ['input%d' % i for i in range(len(sample))]
+    output_names = ['output%d' % i for i in range(len(references[len(sample[0])]))]
+    result = {'inputs': [list(x.shape[1:]) for x in sample], 'quantities': module is not network}
+    runtimes = {'%s eager' % name: lambda: module(*sample)}
+
+    if 'torchscript' in formats:
+        path = os.path.join(export_dir, name + '.pt')
+        with torch.no_grad():
+            scripted = torch.jit.freeze(torch.jit.trace(module, sample, check_trace=False))
+        scripted.save(path)
+        scripted = torch.jit.load(path)
+        with torch.inference_mode():
+            error = max(max_error(as_tuple(scripted(*x)), references[len(x[0])]) for x in [sample, half])
+        result['torchscript'] = {'path': path, 'max_abs_err': error, 'parity': error <= opt.parity_tol}
+        runtimes['%s torchscript' % name] = lambda: scripted(*sample)
+
+    if 'onnx' in formats:
+        path = os.path.join(export_dir, name + '.onnx')
+        dynamic_axes = {key: {0: 'batch'} for key in input_names + output_names}
+        with torch.no_grad():
+            torch.onnx.export(module, sample, path, input_names=input_names, output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=opt.opset, dynamo=False)
+        result['onnx'] = {'path': path}
+        if onnxruntime is not None:
+            session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+            feed = lambda x: {key: value.numpy() for key, value in zip(input_names, x)}
+            error = max(max_error([torch.from_numpy(out) for out in session.run(None, feed(x))], references[len(x[0])]) for x in [sample, half])
+            result['onnx'].update(max_abs_err=error, parity=error <= opt.parity_tol)
+            sample_feed = feed(sample)
+            runtimes['%s onnxruntime' % name] = lambda: session.run(None, sample_feed)
+
+    with torch.inference_mode():
+        timings = {key: measure(fn, 'cpu', n_iter=opt.bench_iters) for key, fn in runtimes.items()}
+    print_results({key: {'time_ms': value['time_ms'], 'samples/s': len(sample[0]) / value['time_ms'] * 1000} for key, value in timings.items()})
+    result['time_ms'] = {key.split(' ')[1]: value['time_ms'] for key, value in timings.items()}
+    result['batch_size'] = len(sample[0])
+    for format in ['torchscript', 'onnx']:
+        if 'parity' in result.get(format, {}):
+            print('%s %s: max abs error %.3g (%s)' % (name, format, result[format]['max_abs_err'], 'ok' if result[format]['parity'] else 'FAILED'))
+            failed |= not result[format]['parity']
+    report[name] = result
+
+with open(os.path.join(export_dir, 'export.json'), 'w') as f:
+    json.dump(report, f, indent=4)
+print('Exported to', export_dir)
+if failed:
+    print('Parity check failed, see', os.path.join(export_dir, 'export.json'))
+    sys.exit(1)
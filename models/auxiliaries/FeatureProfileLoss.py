@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 __all__ = ['FeatureProfileLoss']
 
@@ -26,13 +27,12 @@ class FeatureProfileLoss(nn.Module):
         super(FeatureProfileLoss, self).__init__()
         self.k = tuple( 2**val for val in kernel_sizes )
         self.entropyloss = nn.Sequential()
-        self.entropy_loss = torch.tensor(0.0,requires_grad=True, device='cuda')
-        self.content_loss = torch.tensor(0.0,requires_grad=True, device='cuda')
         for k in self.k:
             self.entropyloss.add_module('kernel{}'.format(k), Loss(k))
 
     def forward(self, input, target):
-        _, _, entropy_loss, content_loss = self.entropyloss((input, target, self.entropy_loss, self.content_loss))
+        zero = input.new_zeros(())
+        _, _, entropy_loss, content_loss = self.entropyloss((input, target, zero, zero))
         return 10*entropy_loss, content_loss
 
 class Loss(nn.Module):
@@ -52,20 +52,15 @@ class Loss(nn.Module):
 
 
 class Feature(nn.Module):
+    """
+    Computes the entropy and the content profile of a 1D signal with a running kernel of size k.
+    The kernel windows are strided views of the input (Tensor.unfold), so no index tensor is needed
+    and signals of any batch size on any device are accepted.
+    """
     def __init__(self, k):
         super(Feature, self).__init__()
-        self.initialized = False
         self.k = k
 
-    def initialize(self, input: torch.Tensor):
-        self.initialized = True
-        self.s = input.shape
-        self.index = torch.empty(1,1,(self.s[2] - self.k + 1) * self.k, device='cuda', dtype=torch.long)
-        for i in range(input.shape[2]-self.k+1):
-            m = i*self.k
-            self.index[:,:,m:m+self.k] = torch.arange(i,i+self.k,1)
-        self.index = self.index.expand(self.s[0],self.s[1],-1)        
-
     def forward(self, input: torch.Tensor):
         """
         Parameters:
@@ -75,15 +70,20 @@ class Feature(nn.Module):
         Returns
         --------
             - entropy of the signal per kernel. (B x C x L-k+1)
-            - sum of signal per kernel. (B x C x L-k+1)
+            - mean of signal per kernel. (B x C x L-k+1)
         """
-        if not self.initialized:
-            self.initialize(input)
+        windows = input.unfold(2, self.k, 1) # (B x C x L-k+1 x k), no copy
 
-        temp = input.gather(2, self.index)
-        temp = temp.reshape(self.s[0],self.s[1],self.s[2] - self.k + 1,self.k)
+        # mean(p * log(p)) with log(p) = x - logsumexp(x) and sum(p) = 1
+        p = F.softmax(windows, dim=3)
+        entropy = ((p * windows).sum(3) - torch.logsumexp(windows, dim=3)) / self.k
+        content = self.moving_average(input)
 
-        entropy = torch.mean(nn.functional.softmax(temp, dim=3) * nn.functional.log_softmax(temp, dim=3),dim=3)
-        content = torch.mean(temp, dim=3)
+        return  entropy, content
 
-        return  entropy, content
\ No newline at end of file
+    def moving_average(self, input: torch.Tensor):
+        """
+        Running mean over k samples computed from the cumulative sum, i.e. in O(L) independent of k.
+        """
+        csum = F.pad(torch.cumsum(input, dim=2), (1, 0))
+        return (csum[:,:,self.k:] - csum[:,:,:-self.k]) / self.k
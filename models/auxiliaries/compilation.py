@@ -0,0 +1,25 @@
+import os
+import torch
+import torch._functorch.config
+import torch._inductor.config
+
+
+def setup_compile_cache(cache_dir: str):
+    """
+    Stores the graphs and kernels generated by torch.compile in the given directory.
+    Subsequent runs with the same configuration load them from disk instead of compiling again.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ['TORCHINDUCTOR_CACHE_DIR'] = cache_dir
+    torch._inductor.config.fx_graph_cache = True
+    if hasattr(torch._functorch.config, 'enable_autograd_cache'):
+        torch._functorch.config.enable_autograd_cache = True
+
+
+def compile_function(fn, mode='default'):
+    """
+    Compiles the given function with torch.compile.
+    Shapes are specialized on the first call and become dynamic after the first recompilation,
+    so a partial last batch costs one additional compilation instead of one per batch size.
+    """
+    return torch.compile(fn, mode=mode, dynamic=None)
@@ -44,7 +44,8 @@ class CubicHermiteSplines():
         return self.h_poly_helper(tt)
 
     def interp(self, xs):
-        I = torch.from_numpy(np.apply_along_axis(np.searchsorted, 2, self.x[:,:,1:].clone().cpu(), xs.cpu())).long().to(self.y.device)# self.x[:,:,1:]
+        sorted_x = self.x[:,:,1:].contiguous()
+        I = torch.searchsorted(sorted_x, xs.to(sorted_x).expand(*sorted_x.shape[:2], -1).contiguous())
         x = torch.gather(self.x, -1, I)
         dx = torch.gather(self.x, -1, I+1) - x
 
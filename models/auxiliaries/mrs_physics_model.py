@@ -43,7 +43,7 @@ class MRSPhysicsModel(PhysicsModel):
             self.params['fidCh'].unsqueeze(0) / 3.0912,
             self.params['fidNaa'].unsqueeze(0) / 1.0221,
             self.params['fidCr'].unsqueeze(0)
-        ), dim=0).unsqueeze(0).cuda()
+        ), dim=0).unsqueeze(0)
         self.register_buffer('basis_spectra', _export(self.basis_fids, roi=self.roi))
 
         if self.opt.representation == 'mag':
@@ -72,14 +72,15 @@ class MRSPhysicsModel(PhysicsModel):
         -------
             A Tensor of shape Nx2xL, containing N spectra with real and imaginary channel and L datapoints (cf. self.roi).
         """
-        fids: T = self.basis_fids
+        device = self.basis_spectra.device
+        fids: T = self.basis_fids.to(device)
         M = fids.shape[1]
         N = quantities.shape[0]
         L = fids.shape[-1]
 
         # Line Broadening
-        x = torch.arange(L, device='cuda').unsqueeze(0).repeat(M, 1)
-        β_factor = (β_max-β_min) * torch.rand(N, M, device='cuda') + β_min
+        x = torch.arange(L, device=device).unsqueeze(0).repeat(M, 1)
+        β_factor = (β_max-β_min) * torch.rand(N, M, device=device) + β_min
         β = self.standard_β / β_factor
         x = β.unsqueeze(-1) * x.unsqueeze(0)
         line_broadening = torch.exp(x) # Invidual line broadening function per metabolite per sample
@@ -90,11 +91,11 @@ class MRSPhysicsModel(PhysicsModel):
         fid_sum = fids.sum(1) # Nx2x2048
 
         # FFT
-        spectra = fftshift(torch.fft(fid_sum.transpose(2,1),1).transpose(2,1),-1)
-        spectra = _resample_(spectra, 1024).cuda() # Nx2xROI
+        spectra = fftshift(_fft(fid_sum.transpose(2,1)).transpose(2,1),-1)
+        spectra = _resample_(spectra, 1024) # Nx2xROI
 
         # Noise SNR_db = 10*log10(P_s/ P_n)
-        snr = (snr_max-snr_min) * torch.rand(N, device='cuda') + snr_min
+        snr = (snr_max-snr_min) * torch.rand(N, device=device) + snr_min
         P_signal = (spectra**2).mean(-1).mean(-1) # Signal power
         P_noise = P_signal / (10**(snr/10)) # Noise power
         noise = torch.distributions.normal.Normal(0, torch.sqrt(P_noise)).sample((2, spectra.shape[-1])).permute(2,0,1) # Nx2xROI
@@ -121,18 +122,20 @@ class MRSPhysicsModel(PhysicsModel):
             ideal_spectra = modulated_basis_spectra.sum(1, keepdim=True)
         else:
             modulated_basis_spectra = torch.repeat_interleave(parameters, 2, 1).unsqueeze(-1) * self.basis_spectra
-            index_real = [i%2==0 for i in range(modulated_basis_spectra.shape[1])]
-            index_imag = [i%2==1 for i in range(modulated_basis_spectra.shape[1])]
             ideal_spectra = torch.cat([
-                modulated_basis_spectra[:,index_real,:].sum(1, keepdim=True), 
-                modulated_basis_spectra[:,index_imag,:].sum(1, keepdim=True)
+                modulated_basis_spectra[:,0::2,:].sum(1, keepdim=True), # real channels
+                modulated_basis_spectra[:,1::2,:].sum(1, keepdim=True)  # imaginary channels
             ], dim=1)
         return self.normalize(ideal_spectra)
 
     def normalize(self, x: T):
+        """
+        Scales each sample to a maximum absolute value of 1.
+        Runs in full precision, so that spectra produced under autocast neither overflow nor divide by zero.
+        """
         shape = x.shape
-        x = x.reshape(shape[0],-1)
-        x = x/abs(x).max(1, keepdim=True)[0]
+        x = x.reshape(shape[0],-1).float()
+        x = x/abs(x).max(1, keepdim=True)[0].clamp_min(torch.finfo(x.dtype).tiny)
         return x.view(*shape)
 
     def get_num_out_channels(self):
@@ -145,7 +148,7 @@ class MRSPhysicsModel(PhysicsModel):
         return (quantities-self.min_per_met) / self.max_per_met
     
     def param_to_quantity(self, params: T):
-        return params * self.max_per_met.detach().cpu() + self.min_per_met.detach().cpu()
+        return params * self.max_per_met.detach().to(params.device) + self.min_per_met.detach().to(params.device)
 
     def plot_basisspectra(self, path, plot_sum=False):
         import matplotlib.pyplot as plt
@@ -204,7 +207,7 @@ def _export(fids: T, roi=slice(None,None)):
         - Tensor of shape (Bx2MxL) containing the basis spectra for each metabolite for each sample
     """
     # Recover Spectrum
-    specSummed = fftshift(torch.fft(fids.transpose(3,2),1).transpose(3,2),-1)
+    specSummed = fftshift(_fft(fids.transpose(3,2)).transpose(3,2),-1)
 
     # Normalize Spectra by dividing by the norm of the area under the 3 major peaks
     # channel_max = torch.max(torch.abs(specSummed),dim=-1, keepdim=True).values
@@ -214,7 +217,16 @@ def _export(fids: T, roi=slice(None,None)):
     # spec_norm = specSummed / torch.max(torch.abs(specSummed),dim=-1,keepdim=True).values
     out = spec_norm.reshape(spec_norm.shape[0], 2*spec_norm.shape[1], spec_norm.shape[3])
     
-    return _resample_(out, 1024).cuda()[:,:,roi]
+    return _resample_(out, 1024)[:,:,roi]
+
+def _fft(x: T):
+    """
+    1D FFT of a real tensor whose last dimension of size 2 holds the real and imaginary part,
+    i.e. the legacy torch.fft(x, 1). Uses the torch.fft module on PyTorch >= 1.8.
+    """
+    if callable(torch.fft):
+        return torch.fft(x, 1)
+    return torch.view_as_real(torch.fft.fft(torch.view_as_complex(x.contiguous()), dim=-1))
 
 def fftshift(x, dim=None):
     assert(torch.is_tensor(x))
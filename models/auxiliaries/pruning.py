@@ -0,0 +1,101 @@
+import torch
+import torch.nn as nn
+from models.auxiliaries.CBAM import CBAM1d
+from models.networks import ResnetBlock
+
+T = torch.Tensor
+
+
+def get_conv_layers(network: nn.Module):
+    """Returns the (transposed) convolutions and the normalization layers of a ResnetGenerator in the order they are applied"""
+    convs = [m for m in network.model.modules() if isinstance(m, nn.modules.conv._ConvNd)]
+    norms = [m for m in network.model.modules() if isinstance(m, nn.modules.batchnorm._NormBase)]
+    return convs, norms
+
+
+def get_channel_groups(network: nn.Module):
+    """
+    Returns the prunable channel groups of a ResnetGenerator, keyed like its channels (see ResnetGenerator.default_channels()).
+    Every group is a pair of the indices (in get_conv_layers()) of the convolutions producing and consuming its channels.
+    The last downsampling convolution and the second convolution of every Resnet block produce the same channels,
+    since they are added by the skip connections. They form one group and are pruned together.
+    """
+    n_down = len(network.channels['down']) - 1
+    n_blocks = len(network.channels['blocks'])
+    block = lambda b: n_down + 1 + 2 * b    # first convolution of Resnet block b
+    up = lambda i: block(n_blocks) + i
+    groups = {'down': [([i], [i + 1]) for i in range(n_down)], 'blocks': [], 'up': []}
+    groups['down'].append(([n_down] + [block(b) + 1 for b in range(n_blocks)], [block(b) for b in range(n_blocks)] + [up(0)]))
+    groups['blocks'] = [([block(b)], [block(b) + 1]) for b in range(n_blocks)]
+    groups['up'] = [([up(i)], [up(i + 1)]) for i in range(n_down)]
+    return groups
+
+
+def input_channel_norms(conv: nn.Module) -> T:
+    """L1 norm of the weights of a (transposed) convolution per input channel"""
+    weight = conv.weight.detach().abs()
+    return weight.sum(dim=[d for d in range(weight.dim()) if d != (0 if conv.transposed else 1)])
+
+
+def rank_channels(network: nn.Module, criterion='weight'):
+    """
+    Returns the importance of every channel of every prunable channel group of a ResnetGenerator, keyed like its channels.
+    Criteria:
+        - weight: L1 norm of the weights reading the channel in the consuming convolutions, relative to their mean per convolution.
+          The normalization layers scale every channel to unit variance, so its contribution is proportional to these weights.
+        - norm: absolute scale of the normalization layers after the producing convolutions. Needs affine normalization layers (--norm batch)
+    """
+    if any(isinstance(m, CBAM1d) for m in network.modules()):
+        raise ValueError('Pruning generators with CBAM (--cbamG) is not supported')
+    if any(isinstance(m, ResnetBlock) and type(m) is not ResnetBlock for m in network.modules()):
+        raise ValueError('Pruning supports generators with plain Resnet blocks (--netG_arch resnet) only')
+    convs, norms = get_conv_layers(network)
+    if criterion == 'norm' and not all(norm.affine for norm in norms):
+        raise ValueError('The norm criterion needs affine normalization layers, e.g. --norm batch')
+    def importance(producers, consumers):
+        if criterion == 'weight':
+            return sum(scores / scores.mean() for scores in (input_channel_norms(convs[c]) for c in consumers))
+        elif criterion == 'norm':
+            return sum(norms[p].weight.detach().abs() for p in producers)
+        raise NotImplementedError('Pruning criterion [%s] is not implemented' % criterion)
+    return {key: [importance(*group) for group in groups] for key, groups in get_channel_groups(network).items()}
+
+
+def select_channels(importance: dict, amount: float):
+    """Returns the sorted indices of the channels to keep per group: the most important (1-amount) share, at least one"""
+    keep = lambda scores: scores.topk(max(1, round(len(scores) * (1 - amount)))).indices.sort().values
+    return {key: [keep(scores) for scores in groups] for key, groups in importance.items()}
+
+
+def copy_pruned_weights(network: nn.Module, pruned: nn.Module, keep: dict):
+    """
+    Copies the weights of the kept channels (see select_channels()) of a ResnetGenerator into a ResnetGenerator
+    with the channels of the pruned architecture ({key: [len(indices) for indices in keep[key]]}).
+    """
+    convs, norms = get_conv_layers(network)
+    pruned_convs, pruned_norms = get_conv_layers(pruned)
+    inputs = [slice(None)] * len(convs)
+    outputs = [slice(None)] * len(convs)
+    for key, groups in get_channel_groups(network).items():
+        for (producers, consumers), indices in zip(groups, keep[key]):
+            for p in producers:
+                outputs[p] = indices
+            for c in consumers:
+                inputs[c] = indices
+    with torch.no_grad():
+        for conv, pruned_conv, i, o in zip(convs, pruned_convs, inputs, outputs):
+            weight = conv.weight[i][:, o] if conv.transposed else conv.weight[o][:, i]
+            pruned_conv.weight.copy_(weight)
+            if conv.bias is not None:
+                pruned_conv.bias.copy_(conv.bias[o])
+        # Every convolution but the last one is followed by a normalization layer
+        for norm, pruned_norm, o in zip(norms, pruned_norms, outputs):
+            for name in ['weight', 'bias', 'running_mean', 'running_var']:
+                if getattr(norm, name, None) is not None:
+                    getattr(pruned_norm, name).copy_(getattr(norm, name)[o])
+            if norm.num_batches_tracked is not None:
+                pruned_norm.num_batches_tracked.copy_(norm.num_batches_tracked)
+
+
+def count_parameters(network: nn.Module):
+    return sum(p.numel() for p in network.parameters())
@@ -0,0 +1,69 @@
+import torch
+import torch.nn as nn
+from torch.func import functional_call, vmap
+from torch.nn.utils.spectral_norm import SpectralNorm
+
+
+class TwinNetworks():
+    """
+    Evaluates two networks of identical architecture, e.g. netG_A and netG_B, in one batched call:
+    The parameters of both networks are stacked and the first network is vmapped over the stack,
+    so every layer runs once for both networks instead of twice.
+    The networks keep their own parameters, so optimizers and checkpoints are not affected.
+    Spectral normalization is applied to each network before the batched call, like in a normal forward pass.
+    """
+
+    def __init__(self, net_a: nn.Module, net_b: nn.Module):
+        # Unwrap DataParallel
+        self.net_a = getattr(net_a, 'module', net_a)
+        self.net_b = getattr(net_b, 'module', net_b)
+        names_a = [name for name, _ in self.net_a.named_parameters()]
+        names_b = [name for name, _ in self.net_b.named_parameters()]
+        if names_a != names_b:
+            raise ValueError('Twin networks must have identical architectures')
+        for module_name, module in self.net_a.named_modules():
+            spectral_norm_buffers = [hook.name + suffix for hook in module._forward_pre_hooks.values() if isinstance(hook, SpectralNorm) for suffix in ['_u', '_v']]
+            for name, _ in module.named_buffers(recurse=False):
+                if name not in spectral_norm_buffers:
+                    # Updates of running statistics would only be applied to the stacked copies
+                    raise ValueError('Twin networks do not support buffers like the running statistics of batch norm (%s.%s)' % (module_name, name))
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Parameters:
+            x -- the input of net_a concatenated with the input of net_b of the same size along the batch dimension
+        Returns the outputs of net_a and net_b, concatenated the same way
+        """
+        states = [self.get_state(self.net_a), self.get_state(self.net_b)]
+        stacked = {name: torch.stack([states[0][name], states[1][name]]) for name in states[0]}
+        hooks = self.remove_spectral_norm_hooks(self.net_a)
+        try:
+            y = vmap(self.call_net_a, randomness='different')(stacked, torch.stack(x.chunk(2)))
+        finally:
+            for module, key, hook in hooks:
+                module._forward_pre_hooks[key] = hook
+        return y.flatten(0, 1)
+
+    def call_net_a(self, state, x):
+        return functional_call(self.net_a, state, (x,))
+
+    @staticmethod
+    def get_state(net: nn.Module) -> dict:
+        """Returns the parameters of the network and the spectral normalized weights, computed like in its forward pass"""
+        state = dict(net.named_parameters())
+        for module_name, module in net.named_modules():
+            for hook in module._forward_pre_hooks.values():
+                if isinstance(hook, SpectralNorm):
+                    name = module_name + '.' + hook.name if module_name else hook.name
+                    state[name] = hook.compute_weight(module, do_power_iteration=module.training)
+        return state
+
+    @staticmethod
+    def remove_spectral_norm_hooks(net: nn.Module) -> list:
+        """The spectral normalized weights are computed before the batched call, the in-place power iteration does not support vmap"""
+        hooks = []
+        for module in net.modules():
+            for key, hook in list(module._forward_pre_hooks.items()):
+                if isinstance(hook, SpectralNorm):
+                    hooks.append((module, key, module._forward_pre_hooks.pop(key)))
+        return hooks
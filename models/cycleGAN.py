@@ -12,6 +12,13 @@ import numpy as np
 from collections import OrderedDict
 import util.util as util
 from models.auxiliaries.lr_scheduler import get_scheduler_G, get_scheduler_D
+from models.auxiliaries import compilation
+from util import distributed
+from util.checkpoint_writer import CheckpointWriter
+from util.profiler import profile_model
+from models.auxiliaries.twin_networks import TwinNetworks
+import copy
+import json
 import os
 
 T = torch.Tensor
@@ -22,25 +29,44 @@ class CycleGAN():
     CycleGAN paper: https://arxiv.org/pdf/1703.10593.pdf
     """
 
+    # Intermediate spectra of a training step, dropped after every step with --lean
+    activation_names = ['real_A', 'fake_B', 'rec_A', 'real_B', 'fake_A', 'rec_B', 'idt_A', 'idt_B']
+
     def name(self):
         return 'CycleGAN'
 
     def __init__(self, opt, physicsModel: PhysicsModel, num_dimensions=1):
         auxiliary.set_num_dimensions(num_dimensions)
-        self.physicsModel = physicsModel
-        self.physicsModel.cuda()
         self.opt = opt
         self.gpu_ids = opt.gpu_ids
+        self.device = torch.device('cuda:%d' % self.gpu_ids[0]) if self.gpu_ids else torch.device('cpu')
+        self.physicsModel = physicsModel
+        self.physicsModel.to(self.device)
         self.Tensor = torch.cuda.FloatTensor if self.gpu_ids else torch.Tensor
         self.save_dir = os.path.join(opt.checkpoints_dir, opt.name)
         self.optimizers = dict()
         self.schedulers = []
+        self.loss_weight = 1.0
         self.init(opt)
+        self.twin_G = self.twin_D = None
+        if opt.isTrain:
+            self.init_activation_checkpointing(opt)
+            if opt.fuse_twins:
+                self.init_twins()
+        # All processes start from the weights of rank 0
+        distributed.broadcast_parameters(self.networks)
         if opt.isTrain:
             self.old_glr = opt.lr
             self.old_dlr = opt.lr
             self.init_optimizers(opt)
-            self.save_network_architecture(self.networks)
+            self.init_amp(opt)
+            self.checkpoint_writer = CheckpointWriter(keep_epochs=opt.keep_epoch_checkpoints)
+            if distributed.is_main_process():
+                self.save_network_architecture(self.networks)
+            if opt.compile:
+                self.init_compile(opt)
+        else:
+            self.amp_dtype = None
         self.init_loss_array()
         if not self.opt.quiet:
             print('---------- Networks initialized -------------')
@@ -54,14 +80,17 @@ class CycleGAN():
         self.input_A: T = self.Tensor(nb, opt.input_nc, size, size)
         self.input_B: T = self.Tensor(nb, opt.output_nc, size, size)
 
-        self.val_network = MLP(self.opt.val_path, gpu=self.opt.gpu_ids[0], in_out= (opt.input_nc * opt.data_length, opt.output_nc), batch_size=opt.batch_size)
+        self.val_network = MLP(self.opt.val_path, gpu=self.gpu_ids[0] if self.gpu_ids else None, in_out= (opt.input_nc * opt.data_length, opt.output_nc), batch_size=opt.batch_size)
         assert self.val_network.pretrained
 
         # Generators
+        channels = define.load_generator_channels(opt.netG_channels)
         self.netG_A = define.define_G(opt.input_nc, opt.output_nc, opt.ngf, opt.which_model_netG,
-                                            opt.norm, self.gpu_ids, init_type=opt.init_type, cbam=opt.cbamG)
+                                            opt.norm, self.gpu_ids, init_type=opt.init_type, cbam=opt.cbamG, channels=channels.get('netG_A'),
+                                            arch=opt.netG_arch, expansion=opt.netG_expansion)
         self.netG_B = define.define_G(opt.input_nc, opt.output_nc, opt.ngf, opt.which_model_netG, 
-                                            opt.norm, self.gpu_ids, init_type=opt.init_type, cbam=opt.cbamG)
+                                            opt.norm, self.gpu_ids, init_type=opt.init_type, cbam=opt.cbamG, channels=channels.get('netG_B'),
+                                            arch=opt.netG_arch, expansion=opt.netG_expansion)
 
         self.networks = [self.netG_A, self.netG_B]
         # Discriminators
@@ -76,7 +105,7 @@ class CycleGAN():
             self.fake_A_pool = ImagePool(opt.pool_size)  # create image buffer to store previously generated images
             self.fake_B_pool = ImagePool(opt.pool_size)  # create image buffer to store previously generated images
             # define loss functions
-            self.criterionGAN = networks.GANLoss(gan_mode=opt.gan_mode, tensor=self.Tensor)
+            self.criterionGAN = networks.GANLoss(gan_mode=opt.gan_mode, tensor=self.Tensor).to(self.device)
             self.criterionCycle = torch.nn.L1Loss()
             self.criterionIdt = torch.nn.L1Loss()
             self.criterionEntropy = FeatureProfileLoss(kernel_sizes=(2,3,4,5))
@@ -98,6 +127,31 @@ class CycleGAN():
         for loss in self.loss_names:
             setattr(self, loss, 0)
 
+    def init_activation_checkpointing(self, opt):
+        """Enables activation checkpointing of the Resnet blocks for the networks named in --grad_checkpoint"""
+        if opt.grad_checkpoint and opt.norm == 'batch':
+            # The recomputation in the backward pass would update the running statistics of the BatchNorm layers a second time
+            raise ValueError('--grad_checkpoint does not support --norm batch')
+        if opt.grad_checkpoint == 'all':
+            for network in self.networks:
+                network = getattr(network, 'module', network)   # unwrap DataParallel
+                if hasattr(network, 'checkpoint_blocks'):
+                    network.checkpoint_blocks = True
+            return
+        for name in filter(None, opt.grad_checkpoint.split(',')):
+            network = getattr(self, name, None)
+            network = getattr(network, 'module', network)
+            if not hasattr(network, 'checkpoint_blocks'):
+                raise ValueError('--grad_checkpoint: %s is not a network with Resnet blocks of %s' % (name, self.name()))
+            network.checkpoint_blocks = True
+
+    def init_twins(self):
+        """Evaluates netG_A and netG_B as well as netD_A and netD_B in one batched call each during training (--fuse_twins)"""
+        if not all(hasattr(self, name) for name in ['netG_A', 'netG_B', 'netD_A', 'netD_B']):
+            raise ValueError('--fuse_twins needs twin generators and critics, which %s does not have' % self.name())
+        self.twin_G = TwinNetworks(self.netG_A, self.netG_B)
+        self.twin_D = TwinNetworks(self.netD_A, self.netD_B)
+
     def init_optimizers(self, opt):
         """
         Initialize optimizers and learning rate schedulers
@@ -114,6 +168,89 @@ class CycleGAN():
             get_scheduler_D(self.optimizer_D, opt)
         ]
 
+    def init_amp(self, opt):
+        """
+        Sets up mixed precision training. The forward pass and the losses run under autocast with the dtype chosen by opt.amp,
+        generator and critic losses are scaled by separate gradient scalers (only needed for fp16).
+        """
+        assert opt.amp in ['off', 'fp16', 'bf16']
+        self.amp_dtype = {'off': None, 'fp16': torch.float16, 'bf16': torch.bfloat16}[opt.amp]
+        self.scaler_G = torch.amp.GradScaler(self.device.type, enabled=opt.amp == 'fp16')
+        self.scaler_D = torch.amp.GradScaler(self.device.type, enabled=opt.amp == 'fp16')
+
+    def autocast(self):
+        """Returns the autocast context for the configured mixed precision mode"""
+        return torch.autocast(self.device.type, dtype=self.amp_dtype, enabled=self.amp_dtype is not None)
+
+    def init_compile(self, opt):
+        """
+        Compiles the generator and the critic step with torch.compile.
+        forward(), forward_fakes() (generators and physics model), calculate_G_loss() and calculate_D_loss() are traced into graphs.
+        The backward passes and the gradient penalty run eagerly, since AOTAutograd does not support double backward.
+        """
+        if len(self.gpu_ids) > 1:
+            print('WARNING: --compile is not supported for nn.DataParallel on multiple GPUs. Training runs eagerly.')
+            return
+        compilation.setup_compile_cache(opt.compile_cache_dir or os.path.join(opt.checkpoints_dir, 'compile_cache'))
+        self.forward = compilation.compile_function(self.forward, opt.compile_mode)
+        self.forward_fakes = compilation.compile_function(self.forward_fakes, opt.compile_mode)
+        self.calculate_G_loss = compilation.compile_function(self.calculate_G_loss, opt.compile_mode)
+        self.calculate_D_loss = compilation.compile_function(self.calculate_D_loss, opt.compile_mode)
+
+    def warmup(self, dataset, batch_sizes):
+        """
+        Runs generator and critic steps and the validation forward pass on the first batch of the dataset,
+        cut to each of the given batch sizes, to trigger all compilations before training starts.
+        The training state (weights, optimizers, image pools, random number generators) is restored afterwards.
+        """
+        state = self.get_training_state()
+        phase = self.opt.phase
+        data = next(iter(dataset))
+        for batch_size in batch_sizes:
+            self.set_input({key: value[:batch_size] for key, value in data.items()})
+            self.optimize_parameters(optimize_G=True)
+            self.optimize_parameters(optimize_G=False)
+            # Validation and visuals run the inference forward pass in both phases
+            self.opt.phase = 'val'
+            self.test()
+            self.opt.phase = phase
+            self.test()
+        self.set_training_state(state)
+
+    def get_image_pools(self):
+        """Returns all image buffers of the model by attribute name"""
+        return {name: value for name, value in vars(self).items() if isinstance(value, ImagePool)}
+
+    def get_training_state(self, to_cpu=False):
+        """
+        Returns an in-memory copy of everything that changes during training:
+        network weights, optimizer and scheduler states, image pools and random number generator states.
+        With to_cpu=True all tensors are copied to the CPU, e.g. to write them to a checkpoint.
+        """
+        state = {
+            'networks': [network.state_dict() for network in self.networks],
+            'optimizers': {name: optimizer.state_dict() for name, optimizer in self.optimizers.items()},
+            'schedulers': [scheduler.state_dict() for scheduler in self.schedulers],
+            'scalers': [self.scaler_G.state_dict(), self.scaler_D.state_dict()],
+            'pools': {name: pool.state_dict() for name, pool in self.get_image_pools().items()},
+            'rng': util.get_rng_states()
+        }
+        return util.copy_tensors(state, 'cpu') if to_cpu else copy.deepcopy(state)
+
+    def set_training_state(self, state):
+        """Restores a state created by get_training_state()"""
+        for network, network_state in zip(self.networks, state['networks']):
+            network.load_state_dict(network_state)
+        for name, optimizer in self.optimizers.items():
+            optimizer.load_state_dict(state['optimizers'][name])
+        for scheduler, scheduler_state in zip(self.schedulers, state['schedulers']):
+            scheduler.load_state_dict(scheduler_state)
+        self.scaler_G.load_state_dict(state['scalers'][0])
+        self.scaler_D.load_state_dict(state['scalers'][1])
+        for name, pool in self.get_image_pools().items():
+            pool.load_state_dict(util.copy_tensors(state['pools'][name], self.device))
+        util.set_rng_states(state['rng'])
+
     def update_learning_rate(self):
         """Update learning rates for all the networks; called at the end of every epoch"""
         old_lr = {}
@@ -127,7 +264,8 @@ class CycleGAN():
                 scheduler.step()
 
         for name, optimizer in self.optimizers.items():
-            print(name, ': learning rate %.7f -> %.7f' % (old_lr[name], optimizer.param_groups[0]['lr']))
+            if distributed.is_main_process():
+                print(name, ': learning rate %.7f -> %.7f' % (old_lr[name], optimizer.param_groups[0]['lr']))
 
 
     def set_input(self, input):
@@ -150,6 +288,11 @@ class CycleGAN():
         Uses Generators to generate fake and reconstructed spectra
         """
         self.real_A = self.input_A
+        if self.twin_G is not None and self.opt.phase != 'val':
+            self.real_B = self.physicsModel.forward(self.physicsModel.quantity_to_param(self.input_B))
+            self.fake_B, self.fake_A = self.twin_G(torch.cat([self.real_A, self.real_B])).chunk(2)
+            self.rec_B, self.rec_A = self.twin_G(torch.cat([self.fake_A, self.fake_B])).chunk(2)
+            return
         self.fake_B = self.netG_A.forward(self.real_A)
         self.rec_A = self.netG_B.forward(self.fake_B)
 
@@ -158,6 +301,18 @@ class CycleGAN():
             self.fake_A = self.netG_B.forward(self.real_B)
             self.rec_B = self.netG_A.forward(self.fake_A)
 
+    def forward_fakes(self):
+        """
+        Uses Generators to generate only the fake spectra the discriminators need, without reconstructions
+        """
+        self.real_A = self.input_A
+        self.real_B = self.physicsModel.forward(self.physicsModel.quantity_to_param(self.input_B))
+        if self.twin_G is not None:
+            self.fake_B, self.fake_A = self.twin_G(torch.cat([self.real_A, self.real_B])).chunk(2)
+        else:
+            self.fake_B = self.netG_A.forward(self.real_A)
+            self.fake_A = self.netG_B.forward(self.real_B)
+
     def test(self):
         with torch.no_grad():
             if self.label_A.numel():
@@ -166,13 +321,12 @@ class CycleGAN():
                 print('WARNING: Paired forward not possile: No label_A found.')
             self.forward()
 
-    def backward_D_basic(self, netD: nn.Module, real: T, fake: T):
+    def calculate_D_loss(self, netD: nn.Module, real: T, fake: T):
         """Calculate GAN loss for the discriminator\n
             netD (network)      -- the discriminator D\n
             real (tensor array) -- real images\n
             fake (tensor array) -- images generated by a generator\n
-        Return the discriminator loss.\n
-        We also call loss_D.backward() to calculate the gradients.
+        Return the discriminator loss.
         """
         # Real
         pred_real = netD.forward(real)
@@ -182,11 +336,40 @@ class CycleGAN():
         loss_D_fake = self.criterionGAN(pred_fake, False)
         # Combined loss
         # The Discrimintator performs good when it return small numbers for real samples and big numbers for fake samples
-        loss_D = (loss_D_real + loss_D_fake) * 0.5
-        # backward
-        loss_D.backward()
+        return (loss_D_real + loss_D_fake) * 0.5
+
+    def backward_D_basic(self, netD: nn.Module, real: T, fake: T):
+        """Calculate GAN loss for the discriminator and call loss_D.backward() to calculate the gradients.\n
+        Return the discriminator loss.
+        """
+        with self.autocast():
+            loss_D = self.calculate_D_loss(netD, real, fake)
+        self.scaler_D.scale(loss_D * self.loss_weight).backward()
         return loss_D
 
+    def backward_D(self):
+        """Calculate the losses and gradients of all discriminators"""
+        if self.twin_D is not None:
+            fake_B = self.fake_B_pool.query(self.fake_B)
+            fake_A = self.fake_A_pool.query(self.fake_A)
+            self.loss_D_A, self.loss_D_B = self.backward_D_twin(torch.cat([self.real_B, self.real_A]), torch.cat([fake_B, fake_A]))
+            return
+        self.backward_D_A()
+        self.backward_D_B()
+
+    def calculate_D_loss_twin(self, real: T, fake: T):
+        """calculate_D_loss() of netD_A and netD_B in one batched call, real and fake are the inputs of netD_A and netD_B concatenated"""
+        pred_real = self.twin_D(real).chunk(2)
+        pred_fake = self.twin_D(fake.detach()).chunk(2)
+        return [(self.criterionGAN(p_real, True) + self.criterionGAN(p_fake, False)) * 0.5 for p_real, p_fake in zip(pred_real, pred_fake)]
+
+    def backward_D_twin(self, real: T, fake: T):
+        """backward_D_basic() of netD_A and netD_B in one batched call. Returns the losses of both discriminators"""
+        with self.autocast():
+            losses = self.calculate_D_loss_twin(real, fake)
+        self.scaler_D.scale((losses[0] + losses[1]) * self.loss_weight).backward()
+        return losses
+
     def backward_D_A(self):
         """Calculate GAN loss for discriminator D_A"""
         fake_B = self.fake_B_pool.query(self.fake_B)
@@ -204,9 +387,13 @@ class CycleGAN():
         # GAN loss
         # The Generator performs good when the the discriminator return a small number for a fake, i.e. treats it like a real sample. => Aversarial to D loss
         # D_A(G_A(A))
-        self.loss_G_A = self.criterionGAN(self.netD_A(self.fake_B), True)
+        if self.twin_D is not None:
+            pred_fake_B, pred_fake_A = self.twin_D(torch.cat([self.fake_B, self.fake_A])).chunk(2)
+        else:
+            pred_fake_B, pred_fake_A = self.netD_A(self.fake_B), self.netD_B(self.fake_A)
+        self.loss_G_A = self.criterionGAN(pred_fake_B, True)
         # D_B(G_B(B))
-        self.loss_G_B = self.criterionGAN(self.netD_B(self.fake_A), True)
+        self.loss_G_B = self.criterionGAN(pred_fake_A, True)
         # Forward cycle loss
         self.loss_cycle_A: T = self.criterionCycle(self.rec_A, self.real_A) * self.opt.lambda_A
         # Backward cycle loss
@@ -228,31 +415,87 @@ class CycleGAN():
     def calculate_identity_loss(self):
         """Calculates the idetity loss"""
         if self.opt.lambda_identity > 0:
-            # G_A should be identity if real_B is fed.
-            self.idt_A = self.netG_A.forward(self.real_B)
+            if self.twin_G is not None:
+                self.idt_A, self.idt_B = self.twin_G(torch.cat([self.real_B, self.real_A])).chunk(2)
+            else:
+                # G_A should be identity if real_B is fed.
+                self.idt_A = self.netG_A.forward(self.real_B)
+                # G_B should be identity if real_A is fed.
+                self.idt_B = self.netG_B.forward(self.real_A)
             self.loss_idt_A: T = self.criterionIdt(self.idt_A, self.real_B) * self.opt.lambda_B * self.opt.lambda_identity
-            # G_B should be identity if real_A is fed.
-            self.idt_B = self.netG_B.forward(self.real_A)
             self.loss_idt_B: T = self.criterionIdt(self.idt_B, self.real_A) * self.opt.lambda_A * self.opt.lambda_identity
         else:
             self.loss_idt_A = 0
             self.loss_idt_B = 0
 
+    def set_requires_grad(self, optimizer: torch.optim.Optimizer, requires_grad: bool):
+        """Sets requires_grad for all parameters of the optimizer, used to freeze the critics in the generator step"""
+        for group in optimizer.param_groups:
+            for param in group['params']:
+                param.requires_grad_(requires_grad)
+
     def optimize_parameters(self, optimize_G=True, optimize_D=True):
-        """Calculate losses, gradients, and update network weights; called in every training iteration"""
-        # forward
-        self.forward() # compute fake images and reconstruction images.
-        # G_A and G_B
+        """
+        Calculate losses, gradients, and update network weights; called in every training iteration.
+        With --accum_steps the input batch is processed in micro-batches of batch_size, whose gradients are accumulated before the update.
+        """
+        input_A, input_B = self.input_A, self.input_B
         if optimize_G:
             self.optimizer_G.zero_grad()
-            self.calculate_G_loss().backward()
-            self.optimizer_G.step()
         if optimize_D:
-            # D_A and D_B
             self.optimizer_D.zero_grad()
-            self.backward_D_A()
-            self.backward_D_B()
-            self.optimizer_D.step()
+        for micro_A, micro_B in zip(input_A.split(self.opt.batch_size), input_B.split(self.opt.batch_size)):
+            # Every micro-batch contributes according to its size, as if the batch was processed at once
+            self.loss_weight = len(micro_A) / len(input_A)
+            self.input_A, self.input_B = micro_A, micro_B
+            # forward
+            with self.autocast():
+                if optimize_G:
+                    self.forward() # compute fake images and reconstruction images.
+                else:
+                    # The critic only needs the fakes, the generator graph would be thrown away
+                    with torch.no_grad():
+                        self.forward_fakes()
+            # G_A and G_B
+            if optimize_G:
+                # The generator loss does not need gradients of the critics
+                self.set_requires_grad(self.optimizer_D, False)
+                with self.autocast():
+                    loss_G = self.calculate_G_loss()
+                self.scaler_G.scale(loss_G * self.loss_weight).backward()
+                self.set_requires_grad(self.optimizer_D, True)
+            # D_A and D_B
+            if optimize_D:
+                self.backward_D()
+            if self.opt.lean:
+                self.release_activations()
+        self.input_A, self.input_B = input_A, input_B
+        self.loss_weight = 1.0
+
+        if optimize_G:
+            distributed.all_reduce_gradients(self.optimizer_G)
+            self.scaler_G.step(self.optimizer_G)
+            self.scaler_G.update()
+        if optimize_D:
+            distributed.all_reduce_gradients(self.optimizer_D)
+            self.scaler_D.step(self.optimizer_D)
+            self.scaler_D.update()
+        if self.opt.lean:
+            # Otherwise the generator gradients stay alive during the critic-only steps until the next generator step
+            self.optimizer_G.zero_grad(set_to_none=True)
+            self.optimizer_D.zero_grad(set_to_none=True)
+
+    def release_activations(self):
+        """
+        Drops the intermediate spectra of the last (micro-)batch and detaches the losses, so that no tensor or graph of a step
+        is alive while the next one runs. The visuals recompute the spectra with test().
+        """
+        for name in self.activation_names:
+            self.__dict__.pop(name, None)
+        for name in self.loss_names:
+            loss = getattr(self, name)
+            if isinstance(loss, torch.Tensor):
+                setattr(self, name, loss.detach())
 
     def get_current_losses(self):
         d = OrderedDict()
@@ -297,22 +540,45 @@ class CycleGAN():
 
         return items
 
-    def create_checkpoint(self, path, d=None):
-        states = list(map(lambda x: x.cpu().state_dict(), self.networks))
+    def get_checkpoint(self, d=None):
+        """Returns a checkpoint with the network weights, the full training state (see get_training_state()) and the entries of d, copied to the CPU"""
+        state = self.get_training_state(to_cpu=True)
         checkpoint = {
-            "networks": states
+            "networks": state.pop('networks'),
+            "training_state": state
         }
         if d is not None:
             checkpoint.update(d)
-        torch.save(checkpoint, path)
-        for x in self.networks:
-            x.cuda()
+        return checkpoint
+
+    def create_checkpoint(self, path, d=None):
+        """
+        Saves the network weights, the full training state (see get_training_state()) and the entries of d to path.
+        The state is copied to the CPU right away and written in the background. Use wait_for_checkpoints() to wait until it is written.
+        """
+        self.checkpoint_writer.write(path, self.get_checkpoint(d))
+
+    def wait_for_checkpoints(self):
+        """Blocks until all checkpoints created so far are written"""
+        if hasattr(self, 'checkpoint_writer'):
+            self.checkpoint_writer.wait()
 
     def load_checkpoint(self, path):
-        checkpoint = torch.load(path)
+        """
+        Loads the network weights and, when training, the training state of a checkpoint if it contains one.
+        Returns the remaining entries of the checkpoint.
+        """
+        self.wait_for_checkpoints()
+        checkpoint = torch.load(path, map_location=self.device, weights_only=False)
         states = checkpoint.pop('networks')
-        for i in range(len(self.networks)):
-            self.networks[i].load_state_dict(states[i])
+        training_state = checkpoint.pop('training_state', None)
+        if self.opt.isTrain and len(states) < len(self.networks):
+            raise ValueError('%s only contains the inference networks (e.g. a distilled student) and cannot be trained further' % path)
+        if self.opt.isTrain and training_state is not None:
+            self.set_training_state(dict(training_state, networks=states))
+        else:
+            for i in range(len(self.networks)):
+                self.networks[i].load_state_dict(states[i])
         print('Loaded checkpoint successfully')
         return checkpoint
 
@@ -328,8 +594,27 @@ class CycleGAN():
             f.flush()
             f.close()
 
+    def save_network_profile(self, data, n_iter=10, save_dir=None):
+        """
+        Profiles the networks and the physics model on the batch data (see util.profiler.profile_model())
+        and saves the profile as profile.json next to architecture.txt.
+        The random number generators are restored afterwards, so that profiling does not change the course of training.
+        """
+        rng_states = util.get_rng_states()
+        try:
+            profile = profile_model(self, data, n_iter)
+        finally:
+            util.set_rng_states(rng_states)
+        with open(os.path.join(save_dir or self.save_dir, 'profile.json'), 'w') as f:
+            json.dump(profile, f, indent=4)
+        return profile
+
     def get_prediction(self) -> np.ndarray:
-        return self.val_network.predict(self.get_predicted_spectra())
+        return self.get_prediction_tensor().cpu().numpy()
+
+    def get_prediction_tensor(self) -> T:
+        """Returns the prediction of get_prediction() as a tensor on the device of the model"""
+        return self.val_network.predict_tensor(self.fake_B.detach())
 
     def get_predicted_spectra(self) -> np.ndarray:
         return self.fake_B.detach().cpu().numpy()
\ No newline at end of file
@@ -17,6 +17,8 @@ class CycleGAN_REG(CycleGAN_W):
     This class implements the novel CycleGAN architecture for arbitrary unsupervised regression task
     """
 
+    activation_names = CycleGAN_W.activation_names + ['fake_params', 'fake_style', 'real_params', 'real_style', 'rec_params', 'rec_style']
+
     def __init__(self, opt, physicsModel: PhysicsModel):
         opt.lambda_identity = 0
         super().__init__(opt, physicsModel)
@@ -40,7 +42,7 @@ class CycleGAN_REG(CycleGAN_W):
             # TODO create option
             self.style_cache = ImagePool(opt.batch_size)
 
-            self.criterionGAN = networks.GANLoss(gan_mode=opt.gan_mode, tensor=self.Tensor)
+            self.criterionGAN = networks.GANLoss(gan_mode=opt.gan_mode, tensor=self.Tensor).to(self.device)
             self.criterionCycle = torch.nn.MSELoss()
             self.criterionEntropy = FeatureProfileLoss(kernel_sizes=(2,3,4,5))
             self.networks.extend([self.netD_B])
@@ -78,6 +80,17 @@ class CycleGAN_REG(CycleGAN_W):
             self.fake_A = self.styleGenerator.forward(ideal_spectra, self.real_style)
             self.rec_params, self.rec_style = self.splitter.forward(self.fake_A)
 
+    def forward_fakes(self):
+        """
+        Uses the splitter and the styleGenerator to generate only the fake spectra the discriminator D_B needs
+        """
+        self.real_A = self.input_A
+        self.fake_params, self.fake_style = self.splitter.forward(self.real_A)
+        self.real_params = self.physicsModel.quantity_to_param(self.input_B)
+        ideal_spectra = self.physicsModel.forward(self.real_params)
+        self.real_style: "T" = self.style_cache.query(self.fake_style.detach())
+        self.fake_A = self.styleGenerator.forward(ideal_spectra, self.real_style)
+
     def calculate_G_loss(self):
         """Calculate the loss for the splitter and the styleGenerator"""
         # GAN loss
@@ -99,20 +112,9 @@ class CycleGAN_REG(CycleGAN_W):
         self.loss_G: T = self.loss_G_B + self.loss_cycle_A + self.loss_cycle_B # + self.loss_feat_A
         return self.loss_G
 
-    def optimize_parameters(self, optimize_G=True, optimize_D=True):
-        """Calculate losses, gradients, and update network weights; called in every training iteration"""
-        # forward
-        self.forward() # compute fake images and reconstruction images.
-        # G_A and G_B
-        if optimize_G:
-            self.optimizer_G.zero_grad()
-            self.calculate_G_loss().backward()
-            self.optimizer_G.step()
-        if optimize_D:
-            # D_A and D_B
-            self.optimizer_D.zero_grad()
-            self.backward_D_B()
-            self.optimizer_D.step()
+    def backward_D(self):
+        """Calculate the loss and gradients of the only discriminator D_B"""
+        self.backward_D_B()
 
     def get_current_visuals(self, get_all = False):
         self.test()
@@ -149,5 +151,8 @@ class CycleGAN_REG(CycleGAN_W):
     def get_prediction(self) -> np.ndarray:
         return self.physicsModel.param_to_quantity(self.fake_params.detach().cpu()).numpy()
 
+    def get_prediction_tensor(self) -> T:
+        return self.physicsModel.param_to_quantity(self.fake_params.detach())
+
     def get_predicted_spectra(self) -> np.ndarray:
         return self.physicsModel.forward(self.fake_params).detach().cpu().numpy()
@@ -3,6 +3,7 @@ from models.auxiliaries.physics_model_interface import PhysicsModel
 from models.cycleGAN import CycleGAN
 import torch
 import models.auxiliaries.auxiliary as aux
+from util import distributed
 
 class CycleGAN_W(CycleGAN):
     """
@@ -17,11 +18,15 @@ class CycleGAN_W(CycleGAN):
     def __init__(self, opt, physicsModel: PhysicsModel):
         opt.gan_mode = 'wasserstein'
         opt.clip_value = 0.01
-        opt.beta1 = 0
+        opt.beta1 = 0.0     # a float: recent versions of torch.optim.Adam reject betas of mixed int and float type
         opt.beta2 = 0.9
         aux.weight_norm = spectral_norm
         super().__init__(opt, physicsModel)
-        
+        self.critic_steps = 0
+        self.apply_penalty = False
+        # Running sums of the wasserstein estimate, the penalty and the number of critic evaluations, read by the CriticScheduler
+        self.critic_stats = torch.zeros(3, device=self.device)
+
     def backward_D_basic(self, netD, real, fake):
         """Calculate GAN loss for the discriminator
 
@@ -33,22 +38,47 @@ class CycleGAN_W(CycleGAN):
         Return the discriminator loss.
         We also call loss_D.backward() to calculate the gradients.
         """
-        # Real
-        pred_real = netD.forward(real)
-        loss_D_real = self.criterionGAN(pred_real, True)
-        # Fake
-        pred_fake = netD.forward(fake.detach())
-        loss_D_fake = self.criterionGAN(pred_fake, False)
-
-        if self.opt.weight_norm == 'gp':
-            gradient_penalty = self.cal_gradient_penalty(netD,real,fake,'cuda')
-        else: 
-            gradient_penalty = 0
+        with self.autocast():
+            loss_D = self.calculate_D_loss(netD, real, fake)
+        gradient_penalty = self.calculate_penalty(netD, real, fake)
+        if self.opt.adaptive_critic:
+            self.record_critic_stats(loss_D, gradient_penalty)
         # Combined loss and calculate gradients
-        loss_D = 0.5 * (loss_D_real + loss_D_fake) + gradient_penalty
-        loss_D.backward()
+        loss_D = loss_D + gradient_penalty
+        self.scaler_D.scale(loss_D * self.loss_weight).backward()
         return loss_D
 
+    def backward_D_twin(self, real, fake):
+        """backward_D_basic() of netD_A and netD_B in one batched call. Returns the losses of both discriminators"""
+        with self.autocast():
+            losses = self.calculate_D_loss_twin(real, fake)
+        penalties = self.calculate_penalty(self.twin_D, real, fake, groups=2)
+        if not isinstance(penalties, torch.Tensor):
+            penalties = [penalties] * 2
+        losses = [loss_D + gradient_penalty for loss_D, gradient_penalty in zip(losses, penalties)]
+        if self.opt.adaptive_critic:
+            for loss_D, gradient_penalty in zip(losses, penalties):
+                self.record_critic_stats(loss_D - gradient_penalty, gradient_penalty)
+        self.scaler_D.scale((losses[0] + losses[1]) * self.loss_weight).backward()
+        return losses
+
+    def calculate_penalty(self, netD, real, fake, groups=1):
+        """Returns the gradient penalty or R1 penalty of the critic if it is applied in this step, else 0. See cal_gradient_penalty() for groups"""
+        if not self.apply_penalty:
+            return 0
+        # Lazy regularization: the penalty is only applied every reg_interval steps and weighted accordingly
+        if self.opt.weight_norm == 'gp':
+            gradient_penalty = self.cal_gradient_penalty(netD, real, fake, real.device, lambda_gp=self.opt.lambda_gp, groups=groups)
+        else:
+            gradient_penalty = self.cal_r1_penalty(netD, real, gamma=self.opt.lambda_gp, groups=groups)
+        return gradient_penalty * self.opt.reg_interval
+
+    def record_critic_stats(self, loss_D, gradient_penalty):
+        """Adds a critic evaluation to the statistics read by the CriticScheduler; only called with --adaptive_critic"""
+        # The critic loss is half the negative wasserstein estimate E[D(fake)] - E[D(real)]
+        self.critic_stats += torch.stack([-2 * loss_D.detach().float(), torch.as_tensor(gradient_penalty, device=self.device).detach().float(),
+                                          torch.ones((), device=self.device)]) * self.loss_weight
+
     def clip_weights_D(self, opt):
         """ 
         DEPRECATED!
@@ -61,7 +91,7 @@ class CycleGAN_W(CycleGAN):
         for p in self.netD_B.parameters():
             p.data.clamp_(-opt.clip_value, opt.clip_value)
 
-    def cal_gradient_penalty(self, netD, real_data, fake_data, device, constant=1.0, lambda_gp=10.0):
+    def cal_gradient_penalty(self, netD, real_data, fake_data, device, constant=1.0, lambda_gp=10.0, groups=1):
         """Calculate the gradient penalty loss, used in WGAN-GP paper https://arxiv.org/abs/1704.00028
 
         Arguments:
@@ -71,27 +101,73 @@ class CycleGAN_W(CycleGAN):
             device (str)                -- GPU / CPU: from torch.device('cuda:{}'.format(self.gpu_ids[0])) if self.gpu_ids else torch.device('cpu')
             constant (float)            -- the constant used in formula ( ||gradient||_2 - constant)^2
             lambda_gp (float)           -- weight for this loss
+            groups (int)                -- number of equally sized groups of samples, e.g. the inputs of twin critics, that are penalized separately
 
-        Returns the gradient penalty loss
+        Returns the gradient penalty loss, one per group if groups > 1
         """
         if lambda_gp > 0.0:
             alpha = torch.rand(real_data.shape[0], 1, device=device)
             alpha = alpha.expand(real_data.shape[0], real_data.nelement() // real_data.shape[0]).contiguous().view(*real_data.shape)
-            interpolatesv = alpha * real_data + ((1 - alpha) * fake_data)
+            interpolatesv = alpha * real_data + ((1 - alpha) * fake_data.detach())
 
             interpolatesv.requires_grad_(True)
-            disc_interpolates = netD(interpolatesv)
-            gradients = torch.autograd.grad(outputs=disc_interpolates, inputs=interpolatesv,
+            with self.autocast():
+                disc_interpolates = netD(interpolatesv)
+            # With fp16 the critic output is scaled to keep the gradients representable, cf. the AMP gradient penalty recipe
+            gradients = torch.autograd.grad(outputs=self.scaler_D.scale(disc_interpolates), inputs=interpolatesv,
                                             grad_outputs=torch.ones(disc_interpolates.size()).to(device),
                                             create_graph=True, retain_graph=True, only_inputs=True)
-            gradients = gradients[0].view(real_data.size(0), -1)  # flat the data
-            gradient_penalty = (((gradients + 1e-16).norm(2, dim=1) - constant) ** 2).mean() * lambda_gp        # added eps
-            return gradient_penalty
+            # The norm is computed in full precision, the eps vanishes in half precision
+            gradients = gradients[0].float().view(real_data.size(0), -1) / self.scaler_D.get_scale()  # flat the data
+            gradient_penalty = (((gradients + 1e-16).norm(2, dim=1) - constant) ** 2).view(groups, -1).mean(1) * lambda_gp        # added eps
+            return gradient_penalty if groups > 1 else gradient_penalty[0]
         else:
             return 0.0
 
+    def cal_r1_penalty(self, netD, real_data, gamma=10.0, groups=1):
+        """Calculate the R1 penalty on real data only, from https://arxiv.org/abs/1801.04406
+
+        Arguments:
+            netD (network)              -- discriminator network
+            real_data (tensor array)    -- real images
+            gamma (float)               -- weight for this loss, the penalty is gamma/2 * ||gradient||_2^2
+            groups (int)                -- number of equally sized groups of samples that are penalized separately, see cal_gradient_penalty()
+
+        Returns the R1 penalty loss, one per group if groups > 1
+        """
+        real_data = real_data.detach().requires_grad_(True)
+        with self.autocast():
+            disc_real = netD(real_data)
+        gradients = torch.autograd.grad(outputs=self.scaler_D.scale(disc_real).sum(), inputs=real_data, create_graph=True)
+        gradients = gradients[0].float().view(real_data.size(0), -1) / self.scaler_D.get_scale()
+        gradient_penalty = gradients.pow(2).sum(dim=1).view(groups, -1).mean(1) * gamma / 2
+        return gradient_penalty if groups > 1 else gradient_penalty[0]
+
+    def get_training_state(self, to_cpu=False):
+        state = super().get_training_state(to_cpu)
+        state['critic_steps'] = self.critic_steps
+        state['critic_stats'] = self.critic_stats.detach().to('cpu' if to_cpu else self.device, copy=True)
+        return state
+
+    def set_training_state(self, state):
+        super().set_training_state(state)
+        self.critic_steps = state['critic_steps']
+        if 'critic_stats' in state:
+            self.critic_stats.copy_(state['critic_stats'])
+
+    def pop_critic_stats(self):
+        """Returns the mean wasserstein estimate and penalty of all critic evaluations since the last call (averaged over all processes)"""
+        stats = distributed.all_reduce_mean(self.critic_stats.clone())
+        self.critic_stats.zero_()
+        wasserstein, penalty, count = stats.tolist()
+        count = max(count, 1e-12)
+        return wasserstein / count, penalty / count
+
     def optimize_parameters(self, optimize_G=True, optimize_D=True):
         """Calculate losses, gradients, and update network weights; called in every training iteration"""
+        self.apply_penalty = optimize_D and self.opt.weight_norm in ['gp', 'r1'] and self.critic_steps % self.opt.reg_interval == 0
         super().optimize_parameters(optimize_G, optimize_D)
+        if optimize_D:
+            self.critic_steps += 1
         if self.opt.weight_norm == 'clip':
-            self.clip_weights_D()
+            self.clip_weights_D(self.opt)
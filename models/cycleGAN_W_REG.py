@@ -33,9 +33,11 @@ class cycleGAN_W_REG(CycleGAN_W):
 
         
         self.netG_A = define.define_extractor(opt.input_nc, self.physicsModel.get_num_out_channels(), opt.data_length, opt.nef, opt.n_layers_E,
-                                            opt.norm, self.gpu_ids)
+                                            opt.norm, self.gpu_ids, arch=opt.netE_arch)
         self.netG_B = define.define_G(opt.input_nc, opt.output_nc, opt.ngf, opt.which_model_netG,
-                                            opt.norm, self.gpu_ids, init_type=opt.init_type, cbam=opt.cbamG)
+                                            opt.norm, self.gpu_ids, init_type=opt.init_type, cbam=opt.cbamG,
+                                            channels=define.load_generator_channels(opt.netG_channels).get('netG_B'),
+                                            arch=opt.netG_arch, expansion=opt.netG_expansion)
         self.networks = [self.netG_A, self.netG_B]
         
         if opt.isTrain:
@@ -44,7 +46,7 @@ class cycleGAN_W_REG(CycleGAN_W):
 
             self.fake_A_pool = ImagePool(opt.pool_size)  # create image buffer to store previously generated images
             # define loss functions
-            self.criterionGAN = networks.GANLoss(gan_mode=opt.gan_mode, tensor=self.Tensor)
+            self.criterionGAN = networks.GANLoss(gan_mode=opt.gan_mode, tensor=self.Tensor).to(self.device)
             self.criterionCycle = torch.nn.MSELoss()
             self.criterionEntropy = FeatureProfileLoss(kernel_sizes=(2,3,4,5))
             self.networks.extend([self.netD_B])
@@ -79,6 +81,15 @@ class cycleGAN_W_REG(CycleGAN_W):
             self.fake_A = self.netG_B.forward(ideal_spectra)
             self.rec_B = self.netG_A.forward(self.fake_A)
 
+    def forward_fakes(self):
+        """
+        Uses the generator G_B to generate only the fake spectra the discriminator D_B needs
+        """
+        self.real_A = self.input_A
+        self.real_B = self.physicsModel.quantity_to_param(self.input_B)
+        ideal_spectra = self.physicsModel.forward(self.real_B)
+        self.fake_A = self.netG_B.forward(ideal_spectra)
+
     def calculate_G_loss(self):
         """Calculate the loss for generators G_A and G_B"""
         # GAN loss
@@ -100,20 +111,9 @@ class cycleGAN_W_REG(CycleGAN_W):
         self.loss_G: T = self.loss_G_B + self.loss_cycle_A + self.loss_cycle_B + self.loss_feat_A
         return self.loss_G
 
-    def optimize_parameters(self, optimize_G=True, optimize_D=True):
-        """Calculate losses, gradients, and update network weights; called in every training iteration"""
-        # forward
-        self.forward() # compute fake images and reconstruction images.
-        # G_A and G_B
-        if optimize_G:
-            self.optimizer_G.zero_grad()
-            self.calculate_G_loss().backward()
-            self.optimizer_G.step()
-        if optimize_D:
-            # D_A and D_B
-            self.optimizer_D.zero_grad()
-            self.backward_D_B()
-            self.optimizer_D.step()
+    def backward_D(self):
+        """Calculate the loss and gradients of the only discriminator D_B"""
+        self.backward_D_B()
 
     def get_current_visuals(self, get_all = False):
         self.test()
@@ -150,5 +150,8 @@ class cycleGAN_W_REG(CycleGAN_W):
     def get_prediction(self) -> np.ndarray:
         return self.physicsModel.param_to_quantity(self.fake_B.detach().cpu()).numpy()
 
+    def get_prediction_tensor(self) -> T:
+        return self.physicsModel.param_to_quantity(self.fake_B.detach())
+
     def get_predicted_spectra(self) -> np.ndarray:
         return self.physicsModel.forward(self.fake_B).detach().cpu().numpy()
\ No newline at end of file
@@ -1,11 +1,12 @@
 from models.networks import *
 from models.auxiliaries.auxiliary import init_weights
+import json
 
 ##############################################################################
 # Generator / Discriminator
 ##############################################################################
 
-def define_G(input_nc, output_nc, ngf, which_model_netG, norm='instance', gpu_ids=[], init_type='normal', cbam=False):
+def define_G(input_nc, output_nc, ngf, which_model_netG, norm='instance', gpu_ids=[], init_type='normal', cbam=False, channels=None, arch='resnet', expansion=4):
     """Create a generator
     Parameters:
         ngf (int) -- the number of filters in the last conv layer
@@ -14,6 +15,9 @@ def define_G(input_nc, output_nc, ngf, which_model_netG, norm='instance', gpu_id
         init_type (str)    -- the name of our initialization method.
         init_gain (float)  -- scaling factor for normal, xavier and orthogonal.
         gpu_ids (int list) -- which GPUs the network runs on: e.g., 0,1,2
+        channels (dict) -- the number of channels of the layers and Resnet blocks of a pruned or distilled generator (see ResnetGenerator.default_channels()). Overrides ngf and which_model_netG
+        arch (str) -- the type of the Resnet blocks: resnet | separable (depthwise separable convolutions) | inverted (inverted residual blocks)
+        expansion (int) -- the factor the inverted residual blocks expand their channels by
     Returns a generator
     Our current implementation provides two types of generators:
         U-Net: [unet_32] (for 1x1024 input signals) and [unet_64] (for 1x2048 input signals)
@@ -29,7 +33,7 @@ def define_G(input_nc, output_nc, ngf, which_model_netG, norm='instance', gpu_id
 
     if use_gpu:
         assert(torch.cuda.is_available())
-    netG = ResnetGenerator(input_nc, output_nc, ngf, norm_layer=norm_layer, n_blocks=which_model_netG, gpu_ids=gpu_ids, cbam=cbam)
+    netG = ResnetGenerator(input_nc, output_nc, ngf, norm_layer=norm_layer, n_blocks=which_model_netG, gpu_ids=gpu_ids, cbam=cbam, channels=channels, block=arch, expansion=expansion)
     if len(gpu_ids) > 0:
         netG.cuda()
     init_weights(netG, init_type, activation='relu')
@@ -38,6 +42,14 @@ def define_G(input_nc, output_nc, ngf, which_model_netG, norm='instance', gpu_id
     else:
         return netG
 
+def load_generator_channels(path):
+    """Returns the channels of the pruned or distilled generators by network name from the architecture description written by prune.py or distill.py, or {} without path"""
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
 def define_D(opt, input_nc, ndf, n_layers_D=3, norm='instance', gpu_ids=[], init_type='normal', cbam=False, output_nc=1):
     netD = None
     use_gpu = len(gpu_ids) > 0
@@ -55,13 +67,21 @@ def define_D(opt, input_nc, ndf, n_layers_D=3, norm='instance', gpu_ids=[], init
     else:
         return netD
 
-def define_extractor(input_nc, output_nc, data_length, ndf, n_layers_D=3, norm='instance', gpu_ids=[]):
+def define_extractor(input_nc, output_nc, data_length, ndf, n_layers_D=3, norm='instance', gpu_ids=[], arch='mlp'):
+    """
+    Creates the extractor: an MLP with n_layers_D layers of ndf neurons (arch mlp),
+    or n_layers_D strided convolutions with ndf filters followed by a Linear layer (arch conv)
+    """
     use_gpu = len(gpu_ids) > 0
     norm_layer = get_norm_layer(norm_type=norm)
     if use_gpu:
         assert(torch.cuda.is_available())
-    # netExtractor = ExtractorConv((input_nc, output_nc), ndf, n_layers=n_layers_D, norm_layer=norm_layer, data_length=opt.data_length, gpu_ids=gpu_ids, cbam=cbam)
-    netExtractor = ExtractorMLP((input_nc * data_length, output_nc), num_neurons=[ndf]*n_layers_D, norm_layer=norm_layer, gpu_ids=gpu_ids)
+    if arch == 'mlp':
+        netExtractor = ExtractorMLP((input_nc * data_length, output_nc), num_neurons=[ndf]*n_layers_D, norm_layer=norm_layer, gpu_ids=gpu_ids)
+    elif arch == 'conv':
+        netExtractor = ExtractorConv(input_nc, output_nc, data_length, num_filters=[ndf]*n_layers_D, gpu_ids=gpu_ids)
+    else:
+        raise NotImplementedError('Extractor architecture [%s] is not implemented' % arch)
     if use_gpu:
         netExtractor.cuda()
     init_weights(netExtractor, "kaiming", activation='leaky_relu')
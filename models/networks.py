@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
 
 from models.auxiliaries.auxiliary import *
 from models.auxiliaries.CBAM import CBAM1d
@@ -24,8 +25,8 @@ class GANLoss(nn.Module):
         LSGAN needs no sigmoid. vanilla GANs will handle it with BCEWithLogitsLoss.
         """
         super(GANLoss, self).__init__()
-        self.register_buffer('real_label', torch.tensor(target_real_label).cuda())
-        self.register_buffer('fake_label', torch.tensor(target_fake_label).cuda())
+        self.register_buffer('real_label', torch.tensor(target_real_label))
+        self.register_buffer('fake_label', torch.tensor(target_fake_label))
         self.real_label_var = None
         self.fake_label_var = None
         self.Tensor = tensor
@@ -108,6 +109,31 @@ class ExtractorMLP(nn.Module):
         out = self.layers(input)
         return out
 
+class ExtractorConv(nn.Module):
+    """
+    Defines a small strided convolutional extractor with the inputs and outputs of ExtractorMLP.
+    Every convolution scales the spectrum down by the stride, a Linear layer maps the flattened features to the parameters.
+    """
+    def __init__(self, input_nc, output_nc, data_length, num_filters=(16,16,16), kernel_size=5, stride=4, gpu_ids=[]):
+        super(ExtractorConv, self).__init__()
+        self.gpu_ids = gpu_ids
+
+        self.layers = nn.Sequential()
+        c_in = input_nc
+        length = data_length
+        for i, c_out in enumerate(num_filters, 1):
+            self.layers.add_module('Conv'+str(i), get_conv()(c_in, c_out, kernel_size=kernel_size, stride=stride, padding=kernel_size//2))
+            self.layers.add_module('LeakyReLU'+str(i), nn.LeakyReLU())
+            c_in = c_out
+            length = (length + 2*(kernel_size//2) - kernel_size) // stride + 1
+        self.layers.add_module('Flatten', nn.Flatten())
+        self.layers.add_module('Linear', nn.Linear(c_in * length, output_nc))
+        self.layers.add_module('Sigmoid', nn.Sigmoid())
+
+    def forward(self, input):
+        out = self.layers(input)
+        return out
+
 class SplitterNetwork(nn.Module):
     """
     Creates a Splitter network consisting of a style extractor S and a parameter regression network R.
@@ -173,7 +199,7 @@ class SplitterNetwork(nn.Module):
         return parameters, style
 
 class StyleGenerator(nn.Module):
-    def __init__(self, content_nc: int, style_nc: int, n_c: int, n_blocks=4, norm_layer=get_norm_layer('instance'), use_dropout=False, padding_type='zero', cbam=False):
+    def __init__(self, content_nc: int, style_nc: int, n_c: int, n_blocks=4, norm_layer=get_norm_layer('instance'), use_dropout=False, padding_type='zero', cbam=False, checkpoint_blocks=False):
         """
         This ResNet applies the encoded style from the style tensor onto the given content tensor.
 
@@ -187,9 +213,11 @@ class StyleGenerator(nn.Module):
             - use_dropout: (boolean): if use dropout layers
             - padding_type (str): the name of padding layer in conv layers: reflect | replicate | zero
             - cbam (boolean): If true, use the Convolution Block Attention Module
+            - checkpoint_blocks (boolean): If true, recompute the activations of the Resnet blocks in the backward pass instead of storing them
         """
         assert n_blocks > 0
         super(StyleGenerator, self).__init__()
+        self.checkpoint_blocks = checkpoint_blocks
         channels = [content_nc + style_nc] + [n_c]*n_blocks + [content_nc]
         layers = [
             get_conv()(channels[0], channels[1], kernel_size=3, padding=1),
@@ -210,14 +238,14 @@ class StyleGenerator(nn.Module):
         --------
             - combined tensor of the same shape as the content tensor
         """
-        return self.model(torch.cat([content, style], 1))
+        return run_blocks(self.model, torch.cat([content, style], 1), self.checkpoint_blocks)
 
 # Defines the generator that consists of Resnet blocks between a few
 # downsampling/upsampling operations.
 # Code and idea originally from Justin Johnson's architecture.
 # https://github.com/jcjohnson/fast-neural-style/
 class ResnetGenerator(nn.Module):
-    def __init__(self, input_nc, output_nc, ngf=64, norm_layer=get_norm_layer('batch'), use_dropout=False, n_blocks=4, gpu_ids=[], padding_type='zero', cbam=False):
+    def __init__(self, input_nc, output_nc, ngf=64, norm_layer=get_norm_layer('batch'), use_dropout=False, n_blocks=4, gpu_ids=[], padding_type='zero', cbam=False, checkpoint_blocks=False, channels=None, block='resnet', expansion=4):
         """Construct a Resnet-based generator  
         Parameters:  
             - input_nc (int)      -- the number of channels in input images
@@ -227,6 +255,10 @@ class ResnetGenerator(nn.Module):
             - use_dropout (bool)  -- if use dropout layers
             - n_blocks (int)      -- the number of ResNet blocks
             - padding_type (str)  -- the name of padding layer in conv layers: reflect | replicate | zero
+            - checkpoint_blocks (bool) -- recompute the activations of the Resnet blocks in the backward pass instead of storing them
+            - channels (dict)     -- the number of output channels of the layers (see default_channels()), e.g. of a pruned or distilled generator. Overrides ngf and n_blocks
+            - block (str)         -- the type of the Resnet blocks: resnet | separable (SeparableResnetBlock) | inverted (InvertedResidualBlock)
+            - expansion (int)     -- the factor the inverted residual blocks expand their channels by
         """
         assert n_blocks >= 0
         super(ResnetGenerator, self).__init__()
@@ -234,47 +266,86 @@ class ResnetGenerator(nn.Module):
         self.output_nc = output_nc
         self.ngf = ngf
         self.gpu_ids = gpu_ids
+        self.checkpoint_blocks = checkpoint_blocks
+        self.expansion = expansion if block == 'inverted' else 1
+        n_downsampling = 2
+        self.channels = channels or ResnetGenerator.default_channels(ngf, n_blocks, n_downsampling, self.expansion)
+        block_types = {'resnet': ResnetBlock, 'separable': SeparableResnetBlock, 'inverted': InvertedResidualBlock}
+        if block not in block_types:
+            raise NotImplementedError('Resnet block type [%s] is not implemented' % block)
+        down, blocks, up = self.channels['down'], self.channels['blocks'], self.channels['up']
+        assert len(down) == len(up) + 1 == n_downsampling + 1
+        n_blocks = len(blocks)
 
         model = [get_padding('reflect')(3),
-                get_conv()(input_nc, ngf, kernel_size=7, padding=0),
-                 norm_layer(ngf),
+                get_conv()(input_nc, down[0], kernel_size=7, padding=0),
+                 norm_layer(down[0]),
                  nn.ReLU(True)]
 
-        n_downsampling = 2
         for i in range(n_downsampling):
-            mult = 2**i
-            model += [get_conv()(ngf * mult, ngf * mult * 2, kernel_size=3, stride=2, padding=1),
-                      norm_layer(ngf * mult * 2),
+            model += [get_conv()(down[i], down[i + 1], kernel_size=3, stride=2, padding=1),
+                      norm_layer(down[i + 1]),
                       nn.ReLU(True)]
 
-        mult = 2**n_downsampling
         for i in range(n_blocks):
-            model += [ResnetBlock(ngf * mult, padding_type=padding_type, norm_layer=norm_layer, use_dropout=use_dropout, cbam=cbam)]
+            model += [block_types[block](down[-1], padding_type=padding_type, norm_layer=norm_layer, use_dropout=use_dropout, cbam=cbam, hidden_dim=blocks[i])]
 
         for i in range(n_downsampling):
-            mult = 2**(n_downsampling - i)
-            model += [get_conv_transpose()(ngf * mult, int(ngf * mult / 2),
+            model += [get_conv_transpose()(([down[-1]] + up)[i], up[i],
                                          kernel_size=3, stride=2,
                                          padding=1, output_padding=1),
-                      norm_layer(int(ngf * mult / 2)),
+                      norm_layer(up[i]),
                       nn.ReLU(True)]
         model += [get_padding('reflect')(3)]
-        model += [get_conv()(ngf, output_nc, kernel_size=7, padding=0)]
+        model += [get_conv()(up[-1], output_nc, kernel_size=7, padding=0)]
         model += [nn.Tanh()]
 
         self.model = nn.Sequential(*model)
 
+    @staticmethod
+    def default_channels(ngf, n_blocks, n_downsampling=2, expansion=1):
+        """
+        Returns the number of output channels of the layers of an unpruned generator:
+            - down: the first convolution and the downsampling convolutions. The last one is the width of the Resnet blocks
+            - blocks: the first convolution of every Resnet block, expansion times the width of the blocks
+            - up: the upsampling (transposed) convolutions
+        """
+        return {
+            'down': [ngf * 2**i for i in range(n_downsampling + 1)],
+            'blocks': [ngf * 2**n_downsampling * expansion] * n_blocks,
+            'up': [ngf * 2**i for i in reversed(range(n_downsampling))]
+        }
+
     def forward(self, input):
-        return self.model(input)
+        return run_blocks(self.model, input, self.checkpoint_blocks)
 
 
 # Define a resnet block
+def run_blocks(layers: nn.Sequential, x, checkpoint_blocks=False):
+    """
+    Applies the layers to x. With checkpoint_blocks, only the inputs of the ResnetBlocks are kept for the backward pass,
+    the activations inside each block (including the CBAM attention) are recomputed from them during the backward pass.
+    This trades about one extra forward pass of the blocks for their activation memory.
+    The recomputation runs the blocks in training mode again, so it must not be used with BatchNorm layers (their running
+    statistics would be updated twice per step); CycleGAN.init_activation_checkpointing() rejects --norm batch.
+    """
+    if not (checkpoint_blocks and torch.is_grad_enabled()):
+        return layers(x)
+    for layer in layers:
+        if isinstance(layer, ResnetBlock):
+            x = checkpoint(layer, x, use_reentrant=False)
+        else:
+            x = layer(x)
+    return x
+
 class ResnetBlock(nn.Module):
-    def __init__(self, dim, padding_type, norm_layer, use_dropout, cbam=False):
+    def __init__(self, dim, padding_type, norm_layer, use_dropout, cbam=False, hidden_dim=None):
         super(ResnetBlock, self).__init__()
-        self.conv_block = self.build_conv_block(dim, padding_type, norm_layer, use_dropout, cbam=cbam)
+        self.conv_block = self.build_conv_block(dim, padding_type, norm_layer, use_dropout, cbam=cbam, hidden_dim=hidden_dim)
 
-    def build_conv_block(self, dim, padding_type, norm_layer, use_dropout, cbam=False):
+    def build_conv_block(self, dim, padding_type, norm_layer, use_dropout, cbam=False, hidden_dim=None):
+        """hidden_dim is the number of channels between the two convolutions. Default: dim"""
+        hidden_dim = hidden_dim or dim
         conv_block = []
         p = 0
         if padding_type == 'zero':
@@ -282,8 +353,8 @@ class ResnetBlock(nn.Module):
         else:
             conv_block += [get_padding('reflect')(padding_type)]
 
-        conv_block += [get_conv()(dim, dim, kernel_size=3, padding=p),
-                       norm_layer(dim),
+        conv_block += [get_conv()(dim, hidden_dim, kernel_size=3, padding=p),
+                       norm_layer(hidden_dim),
                        nn.ReLU(True)]
         if use_dropout:
             conv_block += [nn.Dropout(0.5)]
@@ -294,7 +365,7 @@ class ResnetBlock(nn.Module):
         else:
             conv_block += [get_padding('reflect')(padding_type)]
 
-        conv_block += [get_conv()(dim, dim, kernel_size=3, padding=p),
+        conv_block += [get_conv()(hidden_dim, dim, kernel_size=3, padding=p),
                        norm_layer(dim)]
         if cbam:
             conv_block.append(CBAM1d(dim))
@@ -305,6 +376,54 @@ class ResnetBlock(nn.Module):
         out = x + self.conv_block(x)
         return out
 
+class SeparableResnetBlock(ResnetBlock):
+    """Resnet block with depthwise separable convolutions: a depthwise convolution per channel followed by a pointwise (1x1) convolution"""
+
+    def build_conv_block(self, dim, padding_type, norm_layer, use_dropout, cbam=False, hidden_dim=None):
+        hidden_dim = hidden_dim or dim
+        p = 1 if padding_type == 'zero' else 0
+        padding = [] if padding_type == 'zero' else [get_padding('reflect')(padding_type)]
+
+        conv_block = padding + [get_conv()(dim, dim, kernel_size=3, padding=p, groups=dim),
+                                get_conv()(dim, hidden_dim, kernel_size=1),
+                                norm_layer(hidden_dim),
+                                nn.ReLU(True)]
+        if use_dropout:
+            conv_block += [nn.Dropout(0.5)]
+        conv_block += padding + [get_conv()(hidden_dim, hidden_dim, kernel_size=3, padding=p, groups=hidden_dim),
+                                 get_conv()(hidden_dim, dim, kernel_size=1),
+                                 norm_layer(dim)]
+        if cbam:
+            conv_block.append(CBAM1d(dim))
+
+        return nn.Sequential(*conv_block)
+
+class InvertedResidualBlock(ResnetBlock):
+    """
+    Inverted residual block of MobileNetV2 (https://arxiv.org/abs/1801.04381): a pointwise convolution expands the channels to hidden_dim,
+    a depthwise convolution filters them and a pointwise convolution projects them back to dim
+    """
+
+    def build_conv_block(self, dim, padding_type, norm_layer, use_dropout, cbam=False, hidden_dim=None):
+        hidden_dim = hidden_dim or dim
+        p = 1 if padding_type == 'zero' else 0
+        padding = [] if padding_type == 'zero' else [get_padding('reflect')(padding_type)]
+
+        conv_block = [get_conv()(dim, hidden_dim, kernel_size=1),
+                      norm_layer(hidden_dim),
+                      nn.ReLU(True)]
+        conv_block += padding + [get_conv()(hidden_dim, hidden_dim, kernel_size=3, padding=p, groups=hidden_dim),
+                                 norm_layer(hidden_dim),
+                                 nn.ReLU(True)]
+        if use_dropout:
+            conv_block += [nn.Dropout(0.5)]
+        conv_block += [get_conv()(hidden_dim, dim, kernel_size=1),
+                       norm_layer(dim)]
+        if cbam:
+            conv_block.append(CBAM1d(dim))
+
+        return nn.Sequential(*conv_block)
+
 class NLayerDiscriminator(nn.Module):
     """
     Defines a Discriminator Network that scales down a given spectra of size L to L/(2*n_layers) with convolution, flattens it
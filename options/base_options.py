@@ -5,7 +5,7 @@ import argparse
 import os
 
 import torch
-from util import util
+from util import util, distributed
 
 class BaseOptions():
     def __init__(self):
@@ -37,11 +37,15 @@ class BaseOptions():
         self.parser.add_argument('--ndf', type=int, default=64, help='# of discrim filters in first conv layer')#
         self.parser.add_argument('--nef', type=int, default=100, help='# of extrator filters in first conv layer')
         self.parser.add_argument('--which_model_netG', type=int, default=6, help='number of resnet block for the generator')
+        self.parser.add_argument('--netG_arch', type=str, default='resnet', help='Resnet blocks of the generator [resnet | separable | inverted]. separable: depthwise separable convolutions, inverted: inverted residual (bottleneck) blocks')
+        self.parser.add_argument('--netG_expansion', type=int, default=4, help='channel expansion of the inverted residual blocks (--netG_arch inverted)')
+        self.parser.add_argument('--netE_arch', type=str, default='mlp', help='architecture of the extractor [mlp | conv]. conv: --n_layers_E strided convolutions with --nef filters')
         self.parser.add_argument('--which_model_feat', type=str, default='resnet34', help='selects model to use for feature network')
         self.parser.add_argument('--n_layers_D', type=int, default=3, help='number of layers for the discriminator')
         self.parser.add_argument('--n_layers_E', type=int, default=3, help='number of layers for the extractor')
         self.parser.add_argument('--cbamG', action='store_true', help='Use the convolutional block attention module for the Generator')
         self.parser.add_argument('--cbamD', action='store_true', help='Use the convolutional block attention module for the Discriminator')
+        self.parser.add_argument('--netG_channels', type=str, default=None, help='architecture description (JSON) of pruned or distilled generators, written by prune.py and distill.py. Read from opt.txt when a pruned experiment is resumed with --continue_train; distilled students are inference-only')
         self.parser.add_argument('--n_downsampling', type=int, default=3, help='Number of down-/upsampling steps in the Generator')
         self.parser.add_argument('--gpu_ids', type=str, default='0', help='gpu ids: e.g. 0  0,1,2, 0,2. use -1 for CPU')
         self.parser.add_argument('--name', type=str, default='experiment_name', help='name of the experiment. It decides where to store samples and models')
@@ -80,6 +84,8 @@ class BaseOptions():
             if id >= 0:
                 opt.gpu_ids.append(id)
 
+        distributed.setup(opt)
+
         opt.ppm_range = list(map(float, opt.ppm_range.split(',')))
         opt.roi = slice(*list(map(int, opt.roi.split(','))))
 
@@ -95,24 +101,29 @@ class BaseOptions():
         self.opt = self.parser.parse_args()
         
         self.adjust(self.opt)
+        path = os.path.join(self.opt.checkpoints_dir, self.opt.name, 'opt.txt')
+        if self.isTrain and getattr(self.opt, 'continue_train', False) and os.path.isfile(path):
+            saved_opt = util.load_options(path)
+            if not getattr(saved_opt, 'isTrain', True):
+                # e.g. distilled students, whose checkpoints hold no discriminators and no training state
+                raise ValueError('%s is an inference-only experiment and cannot be trained further' % self.opt.name)
+            if self.opt.netG_channels is None:
+                # Pruned experiments point to the channels of their generators, which a resumed run must rebuild
+                self.opt.netG_channels = getattr(saved_opt, 'netG_channels', None)
 
         args = vars(self.opt)
         # save to the disk
-        if self.isTrain:
+        if self.isTrain and self.opt.rank == 0:
             expr_dir = os.path.join(self.opt.checkpoints_dir, self.opt.name)
             util.mkdirs(expr_dir)
-            file_name = os.path.join(expr_dir, 'opt.txt')
-            with open(file_name, 'wt') as opt_file:
-                opt_file.write('------------ Options -------------\n')
-                for k, v in sorted(args.items()):
-                    opt_file.write('%s: %s\n' % (str(k), str(v)))
-                opt_file.write('-------------- End ----------------\n')
+            util.save_options(self.opt, os.path.join(expr_dir, 'opt.txt'))
         if not self.opt.quiet:
             print('------------ Options -------------')
             for k, v in sorted(args.items()):
                 print('%s: %s' % (str(k), str(v)))
             print('-------------- End ----------------')
         
-        torch.cuda.set_device(self.opt.gpu_ids[0])
+        if self.opt.gpu_ids:
+            torch.cuda.set_device(self.opt.gpu_ids[0])
 
         return self.opt
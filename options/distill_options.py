@@ -0,0 +1,31 @@
+# Options that are used specifically to configure the distillation of trained generators into smaller students.
+# If an options is not set, its default will be used.
+
+from .base_options import BaseOptions
+
+
+class DistillOptions(BaseOptions):
+    def initialize(self):
+        BaseOptions.initialize(self)
+        # The students are trained on spectra of the physics model and need no dataset.
+        # They are trained on the GPUs of the training run (opt.txt), unless --gpu_ids is given
+        self.parser.set_defaults(dataroot=None, gpu_ids='-1')
+        for action in self.parser._actions:
+            if action.dest == 'dataroot':
+                action.required = False
+        self.parser.add_argument('--model_path', type=str, help='path of the teacher checkpoint')
+        self.parser.add_argument('--student_name', type=str, default=None, help='name of the student experiment. Default: <name>_student')
+        self.parser.add_argument('--distill', type=str, default='netG_A,netG_B', help='comma separated networks replaced by students, the others are copied from the teacher')
+        self.parser.add_argument('--student_ngf', type=int, default=16, help='# of filters in the first conv layer of the student generators')
+        self.parser.add_argument('--student_blocks', type=int, default=2, help='number of resnet blocks of the student generators')
+        self.parser.add_argument('--student_nef', type=int, default=32, help='# of neurons per layer of the student extractor (cycleGAN_W_REG)')
+        self.parser.add_argument('--student_layers_E', type=int, default=2, help='number of layers of the student extractor (cycleGAN_W_REG)')
+        self.parser.add_argument('--distill_iters', type=int, default=2000, help='number of training iterations of the students')
+        self.parser.add_argument('--distill_lr', type=float, default=0.0002, help='initial learning rate of the students')
+        self.parser.add_argument('--distill_loss', type=str, default='l1', help='distance of student and teacher outputs [l1 | mse]')
+        self.parser.add_argument('--eval_samples', type=int, default=1000, help='number of held-out spectra of the physics model students and teacher are compared on')
+        self.parser.add_argument('--eval_phase', type=str, default=None, help='dataset students and teacher are additionally validated on, e.g. val. Default: none')
+        self.parser.add_argument('--print_freq', type=int, default=100, help='frequency of printing the distillation loss')
+        self.parser.add_argument('--bench_iters', type=int, default=20, help='number of timed forward passes per network')
+        self.parser.add_argument('--phase', type=str, default='val', help='train, val, test, etc')
+        self.isTrain = False
@@ -0,0 +1,19 @@
+# Options that are used specifically to configure the export of the inference networks.
+# If an options is not set, its default will be used.
+
+from .base_options import BaseOptions
+
+
+class ExportOptions(BaseOptions):
+    def initialize(self):
+        BaseOptions.initialize(self)
+        # Exported networks are traced and benchmarked on the CPU
+        self.parser.set_defaults(gpu_ids='-1')
+        self.parser.add_argument('--model_path', type=str, help='path of the checkpoint to export')
+        self.parser.add_argument('--export_dir', type=str, default=None, help='directory the exported networks are saved to. Default: <checkpoints_dir>/<name>/export')
+        self.parser.add_argument('--formats', type=str, default='torchscript,onnx', help='comma separated export formats [torchscript | onnx]')
+        self.parser.add_argument('--opset', type=int, default=17, help='ONNX opset version')
+        self.parser.add_argument('--parity_tol', type=float, default=1e-4, help='maximum absolute difference between the outputs of the exported and the original networks')
+        self.parser.add_argument('--bench_iters', type=int, default=100, help='number of timed forward passes per network and runtime')
+        self.parser.add_argument('--phase', type=str, default='val', help='dataset the sample batch is taken from')
+        self.isTrain = False
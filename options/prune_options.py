@@ -0,0 +1,19 @@
+# Options that are used specifically to configure the channel pruning of the generators.
+# The fine-tuning uses the training options of the checkpoint. If an options is not set, its default will be used.
+
+from .train_options import TrainOptions
+
+
+class PruneOptions(TrainOptions):
+    def initialize(self):
+        TrainOptions.initialize(self)
+        # Fine-tuning runs on the GPUs of the training run (opt.txt), unless --gpu_ids is given
+        self.parser.set_defaults(gpu_ids='-1')
+        self.parser.add_argument('--model_path', type=str, help='path of the checkpoint to prune')
+        self.parser.add_argument('--pruned_name', type=str, default=None, help='name of the pruned experiment. Default: <name>_pruned')
+        self.parser.add_argument('--prune_amount', type=float, default=0.5, help='share of the channels removed from every layer of the generators')
+        self.parser.add_argument('--prune_criterion', type=str, default='weight', help='channel importance [weight | norm]. weight: L1 norm of the weights reading the channel, norm: scale of the (affine) normalization layer')
+        self.parser.add_argument('--finetune_iters', type=int, default=1000, help='number of training iterations after pruning')
+        self.parser.add_argument('--bench_iters', type=int, default=20, help='number of timed forward passes per generator')
+        # The options file of the pruned experiment is written by prune.py
+        self.isTrain = False
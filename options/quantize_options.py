@@ -0,0 +1,21 @@
+# Options that are used specifically to configure the int8 quantization of the inference networks.
+# If an options is not set, its default will be used.
+
+from .base_options import BaseOptions
+
+
+class QuantizeOptions(BaseOptions):
+    def initialize(self):
+        BaseOptions.initialize(self)
+        # Quantized networks run on the CPU
+        self.parser.set_defaults(gpu_ids='-1')
+        self.parser.add_argument('--model_path', type=str, help='path of the checkpoint to quantize')
+        self.parser.add_argument('--quant_dir', type=str, default=None, help='directory the quantized networks are saved to. Default: <checkpoints_dir>/<name>/int8')
+        self.parser.add_argument('--qengine', type=str, default='x86', help='quantized backend [x86 | fbgemm | qnnpack | onednn]')
+        self.parser.add_argument('--calib_phase', type=str, default='train', help='dataset the calibration batches of the static quantization are taken from')
+        self.parser.add_argument('--calib_batches', type=int, default=10, help='number of calibration batches')
+        self.parser.add_argument('--phase', type=str, default='val', help='dataset the accuracy of the quantized networks is evaluated on')
+        self.parser.add_argument('--max_err_increase', type=float, default=0.05, help='maximum relative increase of the mean average relative error of the quantized model')
+        self.parser.add_argument('--max_r2_drop', type=float, default=0.02, help='maximum absolute decrease of the mean R^2 of the quantized model')
+        self.parser.add_argument('--bench_iters', type=int, default=100, help='number of timed forward passes per network')
+        self.isTrain = False
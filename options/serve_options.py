@@ -0,0 +1,22 @@
+# Options that are used specifically to configure the inference server.
+# If an options is not set, its default will be used.
+
+from .base_options import BaseOptions
+
+
+class ServeOptions(BaseOptions):
+    def initialize(self):
+        BaseOptions.initialize(self)
+        # The server loads its network and options from the checkpoint directory, needs no dataset and runs on the CPU
+        self.parser.set_defaults(dataroot=None, gpu_ids='-1')
+        for action in self.parser._actions:
+            if action.dest == 'dataroot':
+                action.required = False
+        self.parser.add_argument('--model_path', type=str, help='path of the trained cycleGAN_W_REG checkpoint')
+        self.parser.add_argument('--host', type=str, default='127.0.0.1', help='address the HTTP server listens on')
+        self.parser.add_argument('--port', type=int, default=8000, help='port the HTTP server listens on')
+        self.parser.add_argument('--socket', type=str, default=None, help='path of a Unix socket to listen on instead of --host and --port')
+        self.parser.add_argument('--max_batch_size', type=int, default=64, help='maximum number of spectra coalesced into one forward pass')
+        self.parser.add_argument('--max_latency_ms', type=float, default=5.0, help='maximum time a request waits for further requests to join its batch')
+        self.parser.add_argument('--phase', type=str, default='test', help='train, val, test, etc')
+        self.isTrain = False
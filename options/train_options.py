@@ -19,6 +19,8 @@ class TrainOptions(BaseOptions):
         self.parser.add_argument('--save_epoch_freq', type=int, default=5, help='frequency of saving checkpoints at the end of epochs')
         self.parser.add_argument('--save_by_iter', action='store_true', help='whether saves model by iteration')
         self.parser.add_argument('--continue_train', action='store_true', help='continue training: load the latest model')
+        self.parser.add_argument('--snapshot_interval', type=float, default=30, help='minutes between snapshots of the full training state to the latest checkpoint, to resume from with --continue_train. 0 disables them. A snapshot is also saved on SIGTERM')
+        self.parser.add_argument('--keep_epoch_checkpoints', type=int, default=0, help='number of per-epoch checkpoints to keep, older ones are deleted. 0 keeps all')
         self.parser.add_argument('--epoch_count', type=int, default=1, help='the starting epoch count, we save the model by <epoch_count>, <epoch_count>+<save_latest_freq>, ...')
         self.parser.add_argument('--phase', type=str, default='train', help='train, val, test, etc')
 
@@ -31,6 +33,11 @@ class TrainOptions(BaseOptions):
         self.parser.add_argument('--lr_policy', type=str, default='linear', help='learning rate policy. [linear | step | plateau | cosine]')
         self.parser.add_argument('--lr_decay_iters', type=int, default=50, help='multiply by a gamma every lr_decay_iters iterations')
         self.parser.add_argument('--n_critic', type=int, default=1, help='number of optimizations for the critic before generator is optimized')
+        self.parser.add_argument('--adaptive_critic', action='store_true', help='adapt n_critic during training to the stability of the wasserstein estimate and gradient penalty, starting from --n_critic. Requires a wasserstein model')
+        self.parser.add_argument('--n_critic_min', type=int, default=1, help='minimum n_critic with --adaptive_critic')
+        self.parser.add_argument('--n_critic_max', type=int, default=10, help='maximum n_critic with --adaptive_critic')
+        self.parser.add_argument('--critic_tolerance', type=float, default=0.05, help='with --adaptive_critic, n_critic is decreased while the wasserstein estimate and penalty change less than this (relative to their running average) and increased while they change more than twice as much')
+        self.parser.add_argument('--critic_patience', type=int, default=5, help='number of consecutive generator updates with stable or unstable critic before n_critic is changed')
         self.parser.add_argument('--pool_size', type=int, default=50, help='the size of image buffer that stores previously generated images')
         
         self.parser.add_argument('--TTUR', action='store_true', help='Enable the Two Time-scale Update Rule for stabilizing training and reducing the chance of mode collapse')
@@ -39,11 +46,36 @@ class TrainOptions(BaseOptions):
         self.parser.add_argument('--glr', type=float, default=0.0002, help='initial generator learning rate for adam')
         self.parser.add_argument('--dlr', type=float, default=0.0002, help='initial discriminator learning rate for adam')
 
+        self.parser.add_argument('--val_batches', type=int, default=0, help='number of validation batches scored every --save_latest_freq iterations. 0 uses the full validation set')
+        self.parser.add_argument('--async_val', action='store_true', help='validate weight snapshots in a background thread with its own copy of the generators, so training continues meanwhile. Scores, plots and best checkpoints arrive with a delay')
+        self.parser.add_argument('--async_val_pending', type=int, default=1, help='maximum number of snapshots waiting for asynchronous validation. Further snapshots are skipped until the validation catches up')
+        self.parser.add_argument('--early_stop_patience', type=int, default=0, help='stop training once the validation score did not improve by more than --early_stop_tolerance for more than this many validations (every --save_latest_freq iterations). 0 disables early stopping')
+        self.parser.add_argument('--early_stop_tolerance', type=float, default=0.001, help='minimum decrease of the validation score that counts as improvement')
+        self.parser.add_argument('--early_stop_min_iters', type=int, default=0, help='training is not stopped early before this many iterations')
+        self.parser.add_argument('--watchdog_freq', type=int, default=0, help='iterations between divergence checks of the losses (nan/inf or runaway critic). On divergence training rolls back to the state of the last check, which is kept in host memory. 0 (default) disables the watchdog')
+        self.parser.add_argument('--watchdog_max_critic', type=float, default=1e4, help='critic losses with a larger magnitude count as divergence')
+        self.parser.add_argument('--watchdog_lr_factor', type=float, default=1.0, help='factor the learning rates are multiplied with on every rollback')
+        self.parser.add_argument('--watchdog_max_rollbacks', type=int, default=3, help='training is given up when it diverges after this many rollbacks')
+
         self.parser.add_argument('--gan_mode', type=str, default='vanilla', help='type of GAN loss [vanilla | lsgan | wasserstein]')
-        self.parser.add_argument('--weight_norm', type=str, default='gp', help='Only used with gan_mode=wasserstein. Method used to enforce lipschitz continuity [clip | gp | sn]')
+        self.parser.add_argument('--weight_norm', type=str, default='gp', help='Only used with gan_mode=wasserstein. Method used to enforce lipschitz continuity [clip | gp | r1 | sn]. r1 penalizes the critic gradients on real data only')
+        self.parser.add_argument('--lambda_gp', type=float, default=10.0, help='weight of the gradient penalty (gp) or gamma of the R1 penalty (r1)')
+        self.parser.add_argument('--reg_interval', type=int, default=1, help='lazy regularization: apply the gp / r1 penalty only every reg_interval critic steps, weighted by reg_interval')
         self.parser.add_argument('--lambda_A', type=float, default=10.0, help='weight for cycle loss (A -> B -> A)')
         self.parser.add_argument('--lambda_B', type=float, default=10.0, help='weight for cycle loss (B -> A -> B)')
         self.parser.add_argument('--lambda_identity', type=float, default=0.0, help='use identity mapping with the given weight')
         self.parser.add_argument('--lambda_feat', type=float, default=0, help='weight for feature loss')
+
+        # performance parameters
+        self.parser.add_argument('--compile', action='store_true', help='compile the generator and critic steps with torch.compile')
+        self.parser.add_argument('--compile_mode', type=str, default='default', help='torch.compile mode [default | reduce-overhead | max-autotune]')
+        self.parser.add_argument('--compile_cache_dir', type=str, default=None, help='directory of the on-disk compilation cache. Default: [checkpoints_dir]/compile_cache')
+        self.parser.add_argument('--amp', type=str, default='off', choices=['off', 'fp16', 'bf16'], help='mixed precision training [off | fp16 | bf16]. fp16 needs a GPU to be fast, bf16 also works on CPU')
+        self.parser.add_argument('--grad_checkpoint', type=str, default='', help='comma separated names of the networks whose Resnet blocks are recomputed in the backward pass instead of storing their activations, e.g. netG_A,netG_B (CycleGAN), netG_B (cycleGAN_W_REG) or styleGenerator (cycleGAN_REGv2), or "all" for all of them. Lowers the memory of the generator step at the cost of about one extra forward pass of the blocks. Not supported with --norm batch')
+        self.parser.add_argument('--fuse_twins', action='store_true', help='evaluate netG_A and netG_B as well as netD_A and netD_B in one batched call each (vmap over their stacked parameters). Only for models with twin networks: cycleGAN, cycleGAN_W')
+        self.parser.add_argument('--lean', action='store_true', help='lower the peak memory: drop the intermediate spectra and loss graphs after every step instead of keeping them until the next one')
+        self.parser.add_argument('--accum_steps', type=int, default=1, help='number of micro-batches of batch_size whose gradients are accumulated per optimizer step. The effective batch size is batch_size*accum_steps')
+        self.parser.add_argument('--dist_backend', type=str, default=None, help='torch.distributed backend when started with torchrun [gloo | nccl]. Default: nccl on GPU, gloo on CPU')
+        self.parser.add_argument('--profile_iters', type=int, default=10, help='number of timed forward and backward passes per network of the profile saved as profile.json before training (FLOPs, memory and latency per network and layer). 0 disables profiling')
         
         self.isTrain = True
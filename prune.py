@@ -0,0 +1,124 @@
+"""
+Structured channel pruning of the Resnet generators.
+
+Once you have trained your model with train.py, you can use this script to remove the '--prune_amount' least important
+channels (see '--prune_criterion') from every layer of its Resnet generators: whole filters of the (transposed)
+convolutions are removed together with the matching inputs of the following layers. The channels of the Resnet blocks'
+skip connections are pruned consistently across all blocks.
+The pruned model is fine-tuned for '--finetune_iters' iterations with the losses and training options of the checkpoint,
+and saved as new experiment '--pruned_name' with
+    - latest: the checkpoint of the pruned model
+    - generators.json: the channels of the pruned generators, loaded by define_G() with --netG_channels
+    - opt.txt: the training options with --netG_channels, to continue training, validate or export the pruned model by its name
+    - prune.json: the number of parameters, runtime and validation scores before pruning, after pruning and after fine-tuning
+
+Usage:
+    python prune.py --dataroot datasets/ucsf --name CycleGAN-WGP_ucsf --checkpoints_dir ./checkpoints --model_path ./checkpoints/CycleGAN-WGP_ucsf/best --prune_amount 0.5
+"""
+from data.data_loader import CreateDataLoader
+from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
+from models.auxiliaries import pruning
+from models.networks import ResnetGenerator
+from models import define
+from util.util import get_networks, load_options, merge_options, mkdir, record_network_inputs, save_options, set_network
+from util.benchmark import measure
+from util.critic_scheduler import CriticScheduler
+from util.validator import Validator
+from options.prune_options import PruneOptions
+from models.models import create_model
+import json
+import numpy as np
+import os
+import torch
+
+
+def evaluate(model, generators):
+    """Returns the validation scores of the model and the parameters and runtime of the generators"""
+    avg_abs_err, _, avg_err_rel, r2 = validator.get_validation_score(model, val_set, per_sample=False)
+    with torch.inference_mode():
+        inputs = record_network_inputs(model, [sample_batch])
+        generators = {name: network for name, network in get_networks(model).items() if name in generators}
+        for network in generators.values():
+            network.eval()
+        time_ms = {name: measure(lambda: network(*inputs[name][0]), model.device, n_iter=opt.bench_iters)['time_ms'] for name, network in generators.items()}
+        for network in generators.values():
+            network.train()
+    return {'avg_err_rel': float(np.mean(avg_err_rel)), 'r2': float(np.mean(r2)),
+            'parameters': {name: pruning.count_parameters(network) for name, network in generators.items()}, 'time_ms': time_ms}
+
+
+pruneOptions = PruneOptions()
+opt = pruneOptions.parse()  # get pruning options
+train_options = load_options(os.path.join(opt.checkpoints_dir, opt.name, 'opt.txt'))
+default_options = pruneOptions.get_defaults()
+opt = merge_options(default_options, train_options, opt)
+
+# hard-code some parameters for pruning
+opt.isTrain = True      # fine-tuning
+opt.phase = 'train'
+opt.name = opt.pruned_name or opt.name + '_pruned'
+opt.fuse_twins = False  # the twins and compiled functions would hold on to the unpruned generators
+opt.compile = False
+save_dir = os.path.join(opt.checkpoints_dir, opt.name)
+mkdir(save_dir)
+
+physicsModel = MRSPhysicsModel(opt)
+data_loader = CreateDataLoader(opt, 'train')     # creates the dataset first, it determines opt.data_length
+train_set = data_loader.load_data()
+val_set = CreateDataLoader(opt, 'val').load_data()
+sample_batch = next(iter(val_set))
+model = create_model(opt, physicsModel)
+model.load_checkpoint(opt.model_path)
+validator = Validator(opt)
+
+generators = {name: network for name, network in get_networks(model).items() if isinstance(network, ResnetGenerator)}
+if not generators:
+    raise ValueError('%s has no Resnet generators to prune' % opt.model)
+report = {'prune_amount': opt.prune_amount, 'prune_criterion': opt.prune_criterion, 'original': evaluate(model, generators)}
+
+channels = define.load_generator_channels(opt.netG_channels)
+for name, network in generators.items():
+    keep = pruning.select_channels(pruning.rank_channels(network, opt.prune_criterion), opt.prune_amount)
+    channels[name] = {key: [len(indices) for indices in groups] for key, groups in keep.items()}
+    pruned = define.define_G(opt.input_nc, opt.output_nc, opt.ngf, opt.which_model_netG, opt.norm, model.gpu_ids,
+                             init_type=opt.init_type, cbam=opt.cbamG, channels=channels[name])
+    pruning.copy_pruned_weights(network, getattr(pruned, 'module', pruned), keep)
+    getattr(pruned, 'module', pruned).checkpoint_blocks = network.checkpoint_blocks
+    set_network(model, name, pruned)
+    print('%s: %d -> %d parameters, channels %s' % (name, pruning.count_parameters(network), pruning.count_parameters(pruned), channels[name]))
+model.init_optimizers(opt)      # the optimizers of the training state hold the parameters of the unpruned generators
+report['pruned'] = evaluate(model, generators)
+
+critic_scheduler = CriticScheduler(opt, model)
+i = 0
+epoch = 0
+while i < opt.finetune_iters:
+    epoch += 1
+    data_loader.set_epoch(epoch)
+    for data in train_set:
+        if i >= opt.finetune_iters:
+            break
+        model.set_input(data)
+        optimize_gen = critic_scheduler.optimize_G(i)
+        model.optimize_parameters(optimize_G=optimize_gen)
+        critic_scheduler.step(optimize_gen, epoch=epoch, total_iters=i)
+        i += 1
+        if i % opt.print_freq == 0:
+            print('Fine-tuning iteration %d: %s' % (i, ', '.join('%s %.4f' % (key, value) for key, value in model.get_current_losses().items())))
+report['finetuned'] = evaluate(model, generators)
+
+opt.netG_channels = os.path.join(save_dir, 'generators.json')
+with open(opt.netG_channels, 'w') as f:
+    json.dump(channels, f, indent=4)
+model.create_checkpoint(os.path.join(save_dir, 'latest'))
+model.wait_for_checkpoints()
+model.save_network_architecture(model.networks)
+opt.continue_train = False
+save_options(opt, os.path.join(save_dir, 'opt.txt'))
+with open(os.path.join(save_dir, 'prune.json'), 'w') as f:
+    json.dump(report, f, indent=4)
+
+for stage in ['original', 'pruned', 'finetuned']:
+    print('%-10s avg_err_rel %.4f, R^2 %.4f, %s' % (stage, report[stage]['avg_err_rel'], report[stage]['r2'],
+          ', '.join('%s %d parameters %.2f ms' % (name, report[stage]['parameters'][name], report[stage]['time_ms'][name]) for name in generators)))
+print('Pruned model saved to', save_dir)
@@ -0,0 +1,152 @@
+"""
+Int8 post-training quantization of the inference networks for the CPU.
+
+Once you have trained your model with train.py, you can use this script to quantize its inference networks
+(the generators, the extractor of cycleGAN_W_REG or the splitter and style generator of cycleGAN_REGv2).
+Convolutional networks (ResnetGenerator, the splitter and style generator) are quantized statically: the ranges of
+their activations are calibrated on '--calib_batches' batches of the '--calib_phase' set. Networks of linear layers
+only (ExtractorMLP) are quantized dynamically.
+The quantized model is evaluated on the '--phase' set with compute_error() against the labels and against the
+predictions of the float model. The quantized networks are only saved (as TorchScript) to '--quant_dir' if the mean
+average relative error increases by at most '--max_err_increase' and the mean R^2 drops by at most '--max_r2_drop'.
+The speedup of every network and of the inference forward pass is reported in quantization.json.
+
+Usage:
+    python quantize.py --dataroot datasets/ucsf --name CycleGAN-WGP_ucsf --checkpoints_dir ./checkpoints --model_path ./checkpoints/CycleGAN-WGP_ucsf/best
+"""
+from data.data_loader import CreateDataLoader
+from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
+from util.util import compute_error, get_networks, load_options, merge_options, mkdir, record_network_inputs, set_network, split_batch
+from util.benchmark import measure, print_results
+from options.quantize_options import QuantizeOptions
+from models.models import create_model
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+import copy
+import itertools
+import json
+import numpy as np
+import os
+import sys
+import torch
+import torch.nn as nn
+
+
+def is_convolutional(network: nn.Module):
+    return any(isinstance(module, nn.modules.conv._ConvNd) for module in network.modules())
+
+
+def quantize_static(network: nn.Module, calibration: list):
+    """Quantizes weights and activations to int8, with the activation ranges observed on the calibration inputs"""
+    prepared = prepare_fx(copy.deepcopy(network).eval(), get_default_qconfig_mapping(opt.qengine), calibration[0])
+    with torch.no_grad():
+        for inputs in calibration:
+            prepared(*inputs)
+    return convert_fx(prepared)
+
+
+def predict(model, dataset):
+    """Returns the predicted quantities and the labels of all samples of the dataset"""
+    predictions = []
+    labels = []
+    for data in dataset:
+        labels.append(data['label_A'])
+        for batch in split_batch(data, opt.batch_size):
+            model.set_input(batch)
+            model.test()
+            predictions.append(model.get_prediction())
+    return np.concatenate(predictions), torch.cat(labels).numpy()
+
+
+def summarize(predictions, y):
+    avg_abs_err, _, avg_err_rel, r2 = compute_error(predictions, y)
+    return {'avg_abs_err': list(map(float, avg_abs_err)), 'avg_err_rel': list(map(float, avg_err_rel)), 'r2': list(map(float, r2)),
+            'mean_avg_err_rel': float(np.mean(avg_err_rel)), 'mean_r2': float(np.mean(r2))}
+
+
+quantizeOptions = QuantizeOptions()
+opt = quantizeOptions.parse()  # get quantization options
+eval_phase = opt.phase
+train_options = load_options(os.path.join(opt.checkpoints_dir, opt.name, 'opt.txt'))
+default_options = quantizeOptions.get_defaults()
+opt = merge_options(default_options, train_options, opt)
+
+# hard-code some parameters for quantization
+opt.gpu_ids = []
+opt.isTrain = False     # only the inference networks, opt.txt of the training run has isTrain=True
+opt.phase = 'val'       # inference forward pass
+torch.backends.quantized.engine = opt.qengine
+quant_dir = opt.quant_dir or os.path.join(opt.checkpoints_dir, opt.name, 'int8')
+
+physicsModel = MRSPhysicsModel(opt)
+calibration_set = CreateDataLoader(opt, opt.calib_phase).load_data()    # creates the dataset first, it determines opt.data_length
+dataset = CreateDataLoader(opt, eval_phase).load_data()
+model = create_model(opt, physicsModel)
+model.load_checkpoint(opt.model_path)
+networks = get_networks(model)
+for network in networks.values():
+    network.eval()
+
+sample_batch = next(iter(dataset))
+with torch.inference_mode():
+    calibration = record_network_inputs(model, itertools.islice(calibration_set, opt.calib_batches))
+    samples = {name: inputs[0] for name, inputs in record_network_inputs(model, [sample_batch]).items()}
+    float_predictions, labels = predict(model, dataset)
+    model.set_input(sample_batch)
+    float_time = measure(model.test, 'cpu', n_iter=opt.bench_iters)['time_ms']
+
+report = {'qengine': opt.qengine, 'networks': {}}
+timings = {}
+quantized = {}
+for name, network in networks.items():
+    if is_convolutional(network):
+        quantized[name] = quantize_static(network, calibration[name])
+        method = 'static'
+    else:
+        quantized[name] = quantize_dynamic(copy.deepcopy(network), {nn.Linear}, dtype=torch.qint8)
+        method = 'dynamic'
+    sample = samples[name]
+    with torch.inference_mode():
+        error = max((q - f).abs().max().item() for q, f in zip(torch.utils._pytree.tree_leaves(quantized[name](*sample)),
+                                                                torch.utils._pytree.tree_leaves(network(*sample))))
+        timings['%s float' % name] = measure(lambda: network(*sample), 'cpu', n_iter=opt.bench_iters)
+        timings['%s int8' % name] = measure(lambda: quantized[name](*sample), 'cpu', n_iter=opt.bench_iters)
+    report['networks'][name] = {'method': method, 'batch_size': len(sample[0]), 'max_abs_err': error,
+                                'time_ms': {'float': timings['%s float' % name]['time_ms'], 'int8': timings['%s int8' % name]['time_ms']},
+                                'speedup': timings['%s float' % name]['time_ms'] / timings['%s int8' % name]['time_ms']}
+    set_network(model, name, quantized[name])
+
+with torch.inference_mode():
+    int8_predictions, _ = predict(model, dataset)
+    model.set_input(sample_batch)
+    int8_time = measure(model.test, 'cpu', n_iter=opt.bench_iters)['time_ms']
+timings['inference float'] = {'time_ms': float_time}
+timings['inference int8'] = {'time_ms': int8_time}
+print_results({key: {'time_ms': value['time_ms']} for key, value in timings.items()})
+
+report['inference'] = {'time_ms': {'float': float_time, 'int8': int8_time}, 'speedup': float_time / int8_time}
+report['float'] = summarize(float_predictions, labels)
+report['int8'] = summarize(int8_predictions, labels)
+report['int8_vs_float'] = summarize(int8_predictions, float_predictions)
+err_increase = report['int8']['mean_avg_err_rel'] / report['float']['mean_avg_err_rel'] - 1
+r2_drop = report['float']['mean_r2'] - report['int8']['mean_r2']
+accepted = err_increase <= opt.max_err_increase and r2_drop <= opt.max_r2_drop
+report.update(err_increase=err_increase, r2_drop=r2_drop, accepted=accepted)
+print('Mean average relative error: %.4f (float) -> %.4f (int8), %+.1f%%' % (report['float']['mean_avg_err_rel'], report['int8']['mean_avg_err_rel'], err_increase * 100))
+print('Mean R^2: %.4f (float) -> %.4f (int8)' % (report['float']['mean_r2'], report['int8']['mean_r2']))
+print('Inference speedup: %.2fx' % report['inference']['speedup'])
+
+mkdir(quant_dir)
+if accepted:
+    for name, network in quantized.items():
+        path = os.path.join(quant_dir, name + '_int8.pt')
+        with torch.no_grad():
+            torch.jit.trace(network, samples[name], check_trace=False).save(path)
+        report['networks'][name]['path'] = path
+with open(os.path.join(quant_dir, 'quantization.json'), 'w') as f:
+    json.dump(report, f, indent=4)
+if not accepted:
+    print('Accuracy loss exceeds --max_err_increase %g or --max_r2_drop %g, the quantized networks are not saved. See %s'
+          % (opt.max_err_increase, opt.max_r2_drop, os.path.join(quant_dir, 'quantization.json')))
+    sys.exit(1)
+print('Quantized networks saved to', quant_dir)
@@ -3,6 +3,8 @@ import os
 from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
 from util.util import update_options
 from util.validator import Validator
+from util.divergence_watchdog import DivergenceWatchdog
+from util.critic_scheduler import CriticScheduler
 from options.train_options import TrainOptions
 from data.data_loader import CreateDataLoader
 from models.models import create_model
@@ -15,7 +17,7 @@ from util.plot_PBT import plotPBT
 # tensorboard --logdir ray_results/
 
 def get_score(validator: Validator, dataset, model: cycleGAN_W_REG):
-    avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, dataset, 20)
+    avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, dataset, 20, per_sample=False)
     score = np.mean(avg_err_rel)
     return score
 
@@ -27,25 +29,36 @@ def training_function(config, checkpoint_dir=None):
     val_set = CreateDataLoader(opt, 'val').load_data()
 
     model = create_model(opt, physicsModel)       # create a model given opt.model and other options
+    critic_scheduler = CriticScheduler(opt, model, tune.get_trial_dir())
     if checkpoint_dir is not None:
         path = os.path.join(checkpoint_dir, "checkpoint")
         checkpoint = model.load_checkpoint(path)
         step = checkpoint['step']
         scores = checkpoint['scores']
+        if 'critic_scheduler' in checkpoint:
+            critic_scheduler.load_state_dict(checkpoint['critic_scheduler'])
     else:
         scores=[]
         step=0
 
+    if checkpoint_dir is None and opt.profile_iters > 0:
+        model.save_network_profile(next(iter(val_set)), opt.profile_iters, tune.get_trial_dir())
     validator = Validator(opt)
+    watchdog = DivergenceWatchdog(model, opt, os.path.join(tune.get_trial_dir(), 'events.jsonl')) if opt.watchdog_freq > 0 else None
 
     iter_to_next_display = opt.display_freq
     while True:
         # Loads batch_size samples from the dataset
         for i, data in enumerate(train_set):
             model.set_input(data)         # unpack data from dataset and apply preprocessing
-            # Only update critic every n_critic steps
-            optimize_gen = not(i % opt.n_critic)
+            # Only update generator every n_critic steps
+            optimize_gen = critic_scheduler.optimize_G(i)
             model.optimize_parameters(optimize_G=optimize_gen)   # calculate loss functions, get gradients, update network weights
+            critic_scheduler.step(optimize_gen, step=step)
+            if watchdog is not None and watchdog.check(step=step) == 'abort':
+                # Diverged trials are stopped by the CustomStopper
+                tune.report(score=float('inf'), diverged=True)
+                return
 
             iter_to_next_display-= opt.batch_size
 
@@ -60,9 +73,11 @@ def training_function(config, checkpoint_dir=None):
                         d = {
                             'step': step,
                             'score': scores[-1],
-                            'scores': scores
+                            'scores': scores,
+                            'critic_scheduler': critic_scheduler.state_dict()
                         }
                         model.create_checkpoint(path, d)
+                        model.wait_for_checkpoints()
 
                 tune.report(score=scores[-1])
             
@@ -81,6 +96,8 @@ class CustomStopper(tune.Stopper):
             self.scores = []
 
         def __call__(self, trial_id, result):
+            if result.get('diverged', False):
+                return True
             step = result["training_iteration"]-1
             if  len(self.scores)<=step:
                 self.scores.append(result["score"])
@@ -0,0 +1,38 @@
+"""
+Inference server for spectral quantification.
+
+Once you have trained a cycleGAN_W_REG model with train.py, you can use this script to serve it.
+It loads the extractor of the checkpoint at '--model_path' and the physics model, and answers
+POST /quantify requests with the metabolite quantities of the given spectra. Concurrent requests are coalesced
+into batches of at most '--max_batch_size' spectra, waiting at most '--max_latency_ms' for further requests.
+GET /metrics returns latency and throughput statistics. The server runs on the CPU.
+
+Usage:
+    python serve.py --name CycleGAN-WGP_ucsf --checkpoints_dir ./checkpoints --model_path ./checkpoints/CycleGAN-WGP_ucsf/best
+    python serve.py [...] --socket /tmp/quantify.sock
+"""
+from util.inference_server import DynamicBatcher, Quantifier, create_server
+from util.util import load_options, merge_options
+from options.serve_options import ServeOptions
+import os
+
+serveOptions = ServeOptions()
+opt = serveOptions.parse()  # get serve options
+train_options = load_options(os.path.join(opt.checkpoints_dir, opt.name, 'opt.txt'))
+default_options = serveOptions.get_defaults()
+opt = merge_options(default_options, train_options, opt)
+
+# hard-code some parameters for serving
+opt.gpu_ids = []
+opt.phase = 'test'
+
+quantifier = Quantifier(opt, opt.model_path)
+batcher = DynamicBatcher(quantifier, max_batch_size=opt.max_batch_size, max_latency=opt.max_latency_ms / 1000)
+server = create_server(quantifier, batcher, opt.host, opt.port, opt.socket)
+print('Serving %s on %s' % (opt.model_path, opt.socket or 'http://%s:%d' % (opt.host, opt.port)))
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()
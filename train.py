@@ -1,15 +1,24 @@
+import json
 import os
+import signal
 import sys
 from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
 import time
 from util.validator import Validator
+from util.async_validator import AsyncValidator
+from util.divergence_watchdog import DivergenceWatchdog
+from util.early_stopping import EarlyStopping
+from util.critic_scheduler import CriticScheduler
 from options.train_options import TrainOptions
 from data.data_loader import CreateDataLoader
 from models.models import create_model
 from util.visualizer import Visualizer
 from util.visdom import Visdom
+from util import distributed
 
 opt = TrainOptions().parse()
+distributed.init_process_group(opt)
+is_main = distributed.is_main_process()   # only the main process writes checkpoints, logs and visuals
 if not opt.quiet:
     print('------------ Creating Training Set ------------')
 pysicsModel = MRSPhysicsModel(opt)
@@ -26,85 +35,212 @@ val_set = CreateDataLoader(opt, 'val').load_data()
 model = create_model(opt, pysicsModel)       # create a model given opt.model and other options
 latest_path = os.path.join(model.save_dir, 'latest')
 best_path = os.path.join(model.save_dir, 'best')
+# Every process keeps its own random number generators and image pools, so each saves its own latest checkpoint
+rank_latest_path = latest_path if opt.rank == 0 else '%s_rank%d' % (latest_path, opt.rank)
 best_score = sys.maxsize
-if opt.continue_train:
-    model.load_checkpoint(latest_path)
-visualizer = Visualizer(opt)    # create a visualizer that display/save images and plots
-visdom = Visdom(opt)
-
 total_iters = 0                 # the total number of training iterations
+start_batch = 0                 # the batch of the first epoch training starts at
+critic_scheduler = CriticScheduler(opt, model, model.save_dir)
+early_stopping = EarlyStopping(opt.early_stop_patience, opt.early_stop_tolerance, opt.early_stop_min_iters) if opt.early_stop_patience > 0 else None
+if opt.continue_train:
+    # Checkpoints contain the full training state and the position in the training set
+    checkpoint = model.load_checkpoint(rank_latest_path if os.path.isfile(rank_latest_path) else latest_path)
+    opt.epoch_count = checkpoint.get('epoch', opt.epoch_count)
+    start_batch = checkpoint.get('batch', start_batch)
+    total_iters = checkpoint.get('total_iters', total_iters)
+    best_score = checkpoint.get('best_score', best_score)
+    if 'data' in checkpoint:
+        data_loader.load_state_dict(checkpoint['data'])
+    if 'critic_scheduler' in checkpoint:
+        critic_scheduler.load_state_dict(checkpoint['critic_scheduler'])
+    if early_stopping is not None and 'early_stopping' in checkpoint:
+        early_stopping.load_state_dict(checkpoint['early_stopping'])
+if is_main and opt.profile_iters > 0 and not opt.continue_train:
+    # FLOPs, memory and latency of the networks at the configured batch size, saved as profile.json next to architecture.txt.
+    # Only for new runs: a resumed run continues with the restored training state
+    model.save_network_profile(next(iter(val_set)), opt.profile_iters)
+if opt.compile:
+    # Compile for the full and the last partial batches before training starts
+    if not opt.quiet:
+        print('------------ Compiling Training Step ------------')
+    batch_sizes = {opt.batch_size, dataset_size % opt.batch_size, len(val_set.sampler) % opt.batch_size} - {0}
+    model.warmup(train_set, sorted(batch_sizes, reverse=True))
+if is_main:
+    visualizer = Visualizer(opt)    # create a visualizer that display/save images and plots
+    visdom = Visdom(opt)
+
+batch_samples = opt.batch_size * opt.accum_steps   # number of samples per optimizer step
 t_data = 0
 
 validator = Validator(opt)
+async_validator = AsyncValidator(opt, pysicsModel, model.checkpoint_writer, best_path, best_score, opt.async_val_pending) if opt.async_val else None
+watchdog = DivergenceWatchdog(model, opt, os.path.join(model.save_dir, 'events.jsonl')) if opt.watchdog_freq > 0 else None
+
+def progress(epoch, batch):
+    """Training progress saved with every checkpoint: training continues with the given batch of the given epoch"""
+    state = {'epoch': epoch, 'batch': batch, 'total_iters': total_iters, 'best_score': best_score, 'data': data_loader.state_dict(),
+             'critic_scheduler': critic_scheduler.state_dict()}
+    if early_stopping is not None:
+        state['early_stopping'] = early_stopping.state_dict()
+    return state
+
+def save_latest(epoch, batch):
+    global last_snapshot, last_snapshot_time
+    if last_snapshot != (epoch, batch):
+        model.create_checkpoint(rank_latest_path, progress(epoch, batch))
+        last_snapshot = (epoch, batch)
+    last_snapshot_time = time.time()
+
+# On SIGTERM (e.g. preemption) the latest checkpoint is saved after the current iteration before training stops
+stop_requested = False
+def request_stop(signum, frame):
+    global stop_requested
+    stop_requested = True
+signal.signal(signal.SIGTERM, request_stop)
+last_snapshot = None
+last_snapshot_time = time.time()
+stopped_early = False
 
 if not opt.quiet:
     print('------------- Beginning Training -------------')
 for epoch in range(opt.epoch_count, opt.n_epochs + opt.n_epochs_decay + 1):
-    print('>>>>> Epoch: ', epoch)
+    if is_main:
+        print('>>>>> Epoch: ', epoch)
     epoch_start_time = time.time()  # timer for entire epoch
     iter_data_time = time.time()    # timer for data loading per iteration
-    epoch_iter = 0                  # the number of training iterations in current epoch, reset to 0 every epoch
-    visdom.reset()              # reset the visualizer: make sure it saves the results to HTML at least once every epoch
+    epoch_iter = start_batch * batch_samples    # the number of training iterations in current epoch, reset to 0 every epoch
+    data_loader.set_epoch(epoch, start_batch)
+    if is_main:
+        visdom.reset()              # reset the visualizer: make sure it saves the results to HTML at least once every epoch
     # Loads batch_size samples from the dataset
-    for i, data in enumerate(train_set):
+    for i, data in enumerate(train_set, start_batch):
         iter_start_time = time.time()  # timer for computation per iteration
 
-        total_iters += opt.batch_size
-        epoch_iter += opt.batch_size
+        total_iters += batch_samples
+        epoch_iter += batch_samples
         model.set_input(data)         # unpack data from dataset and apply preprocessing
-        # Only update critic every n_critic steps
-        optimize_gen = not(i % opt.n_critic)
+        # Only update generator every n_critic steps
+        optimize_gen = critic_scheduler.optimize_G(i)
         model.optimize_parameters(optimize_G=optimize_gen)   # calculate loss functions, get gradients, update network weights
+        critic_scheduler.step(optimize_gen, epoch=epoch, total_iters=total_iters)
+        if watchdog is not None and watchdog.check(epoch=epoch, total_iters=total_iters) == 'abort':
+            model.wait_for_checkpoints()
+            print('Training diverged %d times, giving up. The best checkpoint is kept.' % watchdog.rollbacks)
+            sys.exit(1)
 
-        if total_iters % opt.print_freq == 0:    # print training losses and save logging information to the disk
+        if is_main and total_iters % opt.print_freq < batch_samples:    # print training losses and save logging information to the disk
             t_data = iter_start_time - iter_data_time
             losses = model.get_current_losses()
-            t_comp = (time.time() - iter_start_time) / opt.batch_size
+            t_comp = (time.time() - iter_start_time) / batch_samples
             visualizer.print_current_losses(epoch, epoch_iter, losses, t_comp, t_data, total_iters)
             
-        if total_iters % opt.plot_freq == 0:
+        if is_main and total_iters % opt.plot_freq < batch_samples:
             visualizer.plot_current_losses()
             visualizer.save_smooth_loss()
 
-        if total_iters % opt.save_latest_freq == 0:   # cache our latest model every <save_latest_freq> iterations
+        if async_validator is not None:
+            for result in async_validator.poll():
+                visualizer.plot_current_validation_score(result['val_err_rel'], result['total_iters'])
+                visualizer.plot_current_training_score(result['train_err_rel'], result['total_iters'])
+                best_score = min(best_score, result['score'])
+                stopped_early = early_stopping is not None and early_stopping.step(result['score'], result['total_iters'])
+
+        if async_validator is not None and total_iters % opt.save_latest_freq < batch_samples:
+            # The snapshot is validated in the background, the scores are collected above when they are ready
+            if not async_validator.submit(model.get_checkpoint(progress(epoch, i + 1)), total_iters):
+                print('skipping the validation at total_iters %d, the previous one is still running' % total_iters)
+            print('saving the latest model (epoch %d, total_iters %d)' % (epoch, total_iters))
+            save_latest(epoch, i + 1)
+            visdom.display_current_results(model.get_current_visuals(), epoch, True)
+        elif total_iters % opt.save_latest_freq < batch_samples:   # cache our latest model every <save_latest_freq> iterations
             # if opt.val_path:
             opt.phase = 'val'
-            avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, val_set, num_batches=20)
-            visualizer.plot_current_validation_score(avg_err_rel, total_iters)
+            # All processes validate their shard, the scores are computed over all shards
+            val_batches = opt.val_batches if opt.val_batches > 0 else sys.maxsize
+            avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, val_set, num_batches=val_batches, per_sample=False)
+            if is_main:
+                visualizer.plot_current_validation_score(avg_err_rel, total_iters)
             if best_score > sum(avg_err_rel):
                 best_score = sum(avg_err_rel)
-                model.create_checkpoint(best_path)
+                if is_main:
+                    model.create_checkpoint(best_path, progress(epoch, i + 1))
+            # All processes compute the same score, so they all stop at the same iteration
+            stopped_early = early_stopping is not None and early_stopping.step(sum(avg_err_rel), total_iters)
 
-            avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, train_set, num_batches=20)
-            visualizer.plot_current_training_score(avg_err_rel, total_iters)
+            avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, train_set, num_batches=20, per_sample=False)
             opt.phase = 'train'
-            print('saving the latest model (epoch %d, total_iters %d)' % (epoch, total_iters))
-            model.create_checkpoint(latest_path)
-            visdom.display_current_results(model.get_current_visuals(), epoch, True)
+            if is_main:
+                visualizer.plot_current_training_score(avg_err_rel, total_iters)
+                print('saving the latest model (epoch %d, total_iters %d)' % (epoch, total_iters))
+            save_latest(epoch, i + 1)
+            if is_main:
+                visdom.display_current_results(model.get_current_visuals(), epoch, True)
+
+        snapshot_due = opt.snapshot_interval > 0 and time.time() - last_snapshot_time > opt.snapshot_interval * 60
+        stop, snapshot_due = distributed.any_rank([stop_requested, snapshot_due], model.device)
+        if (stop or snapshot_due) and last_snapshot != (epoch, i + 1):
+            if is_main:
+                print('saving a snapshot (epoch %d, total_iters %d)' % (epoch, total_iters))
+            save_latest(epoch, i + 1)
+        if stop:
+            model.wait_for_checkpoints()
+            print('Training stopped by SIGTERM. Resume with --continue_train')
+            sys.exit(128 + signal.SIGTERM)
+        if stopped_early:
+            if is_main:
+                print('Validation score did not improve by more than %g for %d validations, stopping early (epoch %d, total_iters %d)'
+                      % (opt.early_stop_tolerance, early_stopping.num_bad_validations, epoch, total_iters))
+            break
 
         model.set_input(data)
         iter_data_time = time.time()
+    if stopped_early:
+        break
+    start_batch = 0
 
     # visdom.display_current_results(model.get_current_visuals(), epoch, True)
 
     model.update_learning_rate()    # update learning rates in the end of every epoch.
 
-    if epoch % opt.save_epoch_freq == 0:              # cache our model every <save_epoch_freq> epochs
+    if is_main and epoch % opt.save_epoch_freq == 0:              # cache our model every <save_epoch_freq> epochs
         print('saving the model at the end of epoch %d, iters %d' % (epoch, total_iters))
-        model.create_checkpoint(latest_path)
-        model.create_checkpoint(os.path.join(model.save_dir, str(epoch)))
-
-    print('End of epoch %d / %d \t Time Taken: %d sec' %
-          (epoch, opt.n_epochs + opt.n_epochs_decay, time.time() - epoch_start_time))
+        model.create_checkpoint(os.path.join(model.save_dir, str(epoch)), progress(epoch + 1, 0))
+    if epoch % opt.save_epoch_freq == 0:
+        save_latest(epoch + 1, 0)
+
+    if is_main:
+        print('End of epoch %d / %d \t Time Taken: %d sec' %
+              (epoch, opt.n_epochs + opt.n_epochs_decay, time.time() - epoch_start_time))
+
+if async_validator is not None:
+    # Scores of the last snapshots still update the best checkpoint
+    async_validator.wait()
+    for result in async_validator.poll():
+        visualizer.plot_current_validation_score(result['val_err_rel'], result['total_iters'])
+        visualizer.plot_current_training_score(result['train_err_rel'], result['total_iters'])
+        best_score = min(best_score, result['score'])
 
 # if opt.val_path:
 opt.phase = 'val'
-avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, val_set)
-visualizer.plot_current_validation_score(avg_abs_err, total_iters)
-if best_score > sum(avg_err_rel):
+avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, val_set, per_sample=False)
+val_err_rel = avg_err_rel
+if is_main:
+    visualizer.plot_current_validation_score(avg_abs_err, total_iters)
+if is_main and best_score > sum(avg_err_rel):
     best_score = sum(avg_err_rel)
-    model.create_checkpoint(best_path)
-avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, train_set)
-visualizer.plot_current_training_score(avg_abs_err, total_iters)
+    model.create_checkpoint(best_path, progress(opt.n_epochs + opt.n_epochs_decay + 1, 0))
+avg_abs_err, err_rel, avg_err_rel, r2 = validator.get_validation_score(model, train_set, per_sample=False)
 opt.phase = 'train'
-model.create_checkpoint(latest_path)
\ No newline at end of file
+if is_main:
+    visualizer.plot_current_training_score(avg_abs_err, total_iters)
+save_latest(opt.n_epochs + opt.n_epochs_decay + 1, 0)
+model.wait_for_checkpoints()
+if is_main:
+    # Summary of the run: the final validation score (sum of the relative errors) and the per-metabolite relative errors
+    summary = {'stopped_early': stopped_early, 'total_iters': total_iters, 'best_score': float(best_score),
+               'final_score': float(sum(val_err_rel)), 'final_avg_err_rel': [float(e) for e in val_err_rel]}
+    if hasattr(model, 'critic_steps'):
+        summary.update(critic_steps=model.critic_steps, n_critic=critic_scheduler.n_critic)
+    with open(os.path.join(model.save_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=4)
+    print('Training finished:', summary)
\ No newline at end of file
@@ -0,0 +1,122 @@
+import copy
+import queue
+import sys
+import threading
+import torch
+from data.data_loader import CreateDataLoader
+from models.models import create_model
+from util.checkpoint_writer import CheckpointWriter
+from util.util import get_rng_states, set_rng_states
+from util.validator import Validator
+
+
+class AsyncValidator():
+    """
+    Validates weight snapshots in a background thread, so training continues while a snapshot is scored.
+    The thread has its own inference copy of the model (generators only) and its own data loaders.
+    Like in train.py, each snapshot is scored on the validation set and on num_train_batches batches of the training set,
+    and the snapshot is saved as best checkpoint if its validation score is the best so far.
+    At most max_pending snapshots wait for validation, further snapshots are skipped until the thread catches up.
+    The scores are collected by the training loop with poll().
+    """
+
+    def __init__(self, opt, physicsModel, checkpoint_writer: CheckpointWriter, best_path, best_score, max_pending=1, num_train_batches=20):
+        """
+        Parameters:
+            opt -- training options
+            physicsModel -- the physics model of the trained model
+            checkpoint_writer (CheckpointWriter) -- writer of the best checkpoints
+            best_path (str) -- path of the best checkpoint
+            best_score (float) -- validation score of the current best checkpoint
+            max_pending (int) -- maximum number of snapshots waiting for validation
+            num_train_batches (int) -- number of training batches scored per snapshot
+        """
+        if opt.world_size > 1:
+            raise ValueError('--async_val is only supported in single process training')
+        self.opt = copy.copy(opt)
+        self.opt.isTrain = False
+        self.opt.phase = 'val'
+        self.opt.quiet = True
+        # Creating the model and the data loaders draws from the random number generators of training (weight initialization, seed
+        # of the training set). They are restored, so that a resumed run continues exactly like an uninterrupted one
+        rng_states = get_rng_states()
+        try:
+            self.model = create_model(self.opt, physicsModel)
+            self.val_set = CreateDataLoader(self.opt, 'val').load_data()
+            self.train_set = CreateDataLoader(self.opt, 'train').load_data()
+        finally:
+            set_rng_states(rng_states)
+        # The datasets are loaded in this thread while training runs. Random samples (the B samples of RegCycleGANDataset) are drawn
+        # from their own generator, so that the validation does not change the random numbers of training
+        self.train_set.dataset.generator = torch.Generator().manual_seed(0)
+        self.validator = Validator(self.opt)
+        self.val_batches = opt.val_batches if opt.val_batches > 0 else sys.maxsize
+        self.num_train_batches = num_train_batches
+        self.checkpoint_writer = checkpoint_writer
+        self.best_path = best_path
+        self.best_score = best_score
+        self.stream = torch.cuda.Stream(self.model.device) if self.model.device.type == 'cuda' else None
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.results = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='AsyncValidator', daemon=True)
+        self.thread.start()
+
+    def submit(self, checkpoint: dict, total_iters):
+        """
+        Queues a checkpoint created by get_checkpoint() after total_iters training iterations for validation.
+        The checkpoint must not share tensors with the live training state.
+        Returns False if the snapshot was skipped because max_pending snapshots are already waiting.
+        """
+        self._raise_error()
+        try:
+            self.queue.put_nowait((checkpoint, total_iters))
+            return True
+        except queue.Full:
+            return False
+
+    def poll(self):
+        """Returns the results of all validations finished since the last call, in the order the snapshots were submitted"""
+        self._raise_error()
+        results = []
+        while not self.results.empty():
+            results.append(self.results.get_nowait())
+        return results
+
+    def wait(self):
+        """Blocks until all queued snapshots are validated"""
+        self.queue.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError('Validating a snapshot failed') from error
+
+    def _run(self):
+        while True:
+            checkpoint, total_iters = self.queue.get()
+            try:
+                if self.stream is not None:
+                    with torch.cuda.stream(self.stream):
+                        self.results.put(self._validate(checkpoint, total_iters))
+                else:
+                    self.results.put(self._validate(checkpoint, total_iters))
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _validate(self, checkpoint, total_iters):
+        # The inference model has the generators, which come first in the networks of the trained model
+        for network, state in zip(self.model.networks, checkpoint['networks']):
+            network.load_state_dict(state)
+        val_abs_err, _, val_err_rel, val_r2 = self.validator.get_validation_score(self.model, self.val_set, self.val_batches, per_sample=False)
+        _, _, train_err_rel, _ = self.validator.get_validation_score(self.model, self.train_set, self.num_train_batches, per_sample=False)
+        score = sum(val_err_rel)
+        best = self.best_score > score
+        if best:
+            self.best_score = score
+            self.checkpoint_writer.write(self.best_path, dict(checkpoint, best_score=score))
+        return {'total_iters': total_iters, 'val_abs_err': val_abs_err, 'val_err_rel': val_err_rel, 'val_r2': val_r2,
+                'train_err_rel': train_err_rel, 'score': score, 'best': best}
@@ -0,0 +1,74 @@
+"""Small helpers to measure the runtime and memory footprint of training code."""
+import time
+import torch
+
+
+class SavedTensorsMeter():
+    """
+    Context manager that sums up the size of all tensors autograd saves for the backward pass.
+    Works on every device and is used as activation memory estimate where no CUDA allocator statistics are available.
+    """
+    def __init__(self):
+        self.bytes = 0
+        self._seen = set()
+
+    def pack(self, tensor: torch.Tensor):
+        key = (tensor.untyped_storage().data_ptr(), tensor.device)
+        if key not in self._seen:
+            self._seen.add(key)
+            self.bytes += tensor.untyped_storage().nbytes()
+        return tensor
+
+    def __enter__(self):
+        self._hooks = torch.autograd.graph.saved_tensors_hooks(self.pack, lambda x: x)
+        self._hooks.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._hooks.__exit__(*args)
+
+
+def synchronize(device):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def measure(fn, device='cpu', n_iter=20, n_warmup=3):
+    """
+    Runs fn() n_warmup times untimed and n_iter times timed.
+
+    Returns:
+    --------
+        - dictionary with the mean runtime in ms, the size of the tensors saved for backward in MB
+          and, on CUDA devices, the peak allocated memory in MB
+    """
+    for _ in range(n_warmup):
+        fn()
+    synchronize(device)
+
+    meter = SavedTensorsMeter()
+    with meter:
+        fn()
+
+    if torch.device(device).type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+    synchronize(device)
+    start = time.perf_counter()
+    for _ in range(n_iter):
+        fn()
+    synchronize(device)
+    result = {
+        'time_ms': (time.perf_counter() - start) / n_iter * 1000,
+        'saved_mb': meter.bytes / 2**20
+    }
+    if torch.device(device).type == 'cuda':
+        result['peak_mb'] = torch.cuda.max_memory_allocated(device) / 2**20
+    return result
+
+
+def print_results(results: dict):
+    """Prints a table of the results returned by measure() keyed by name."""
+    keys = sorted({key for r in results.values() for key in r})
+    print(('%-30s' + '%16s' * len(keys)) % ('', *keys))
+    for name, r in results.items():
+        print(('%-30s' + '%16.2f' * len(keys)) % (name, *[r.get(key, float('nan')) for key in keys]))
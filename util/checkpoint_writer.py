@@ -0,0 +1,69 @@
+import os
+import queue
+import threading
+import torch
+
+
+class CheckpointWriter():
+    """
+    Writes checkpoints in a background thread, so training continues while a checkpoint is serialized.
+    Checkpoints are written in the order they were submitted. Each one is written to a temporary file first and then renamed,
+    so a checkpoint file is always complete, even if training is interrupted while writing.
+    """
+
+    def __init__(self, keep_epochs=0, max_pending=2):
+        """
+        Parameters:
+            keep_epochs (int) -- number of per-epoch checkpoints (files named by their epoch) to keep in a directory. 0 keeps all
+            max_pending (int) -- maximum number of checkpoints waiting to be written. write() blocks while the queue is full
+        """
+        self.keep_epochs = keep_epochs
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='CheckpointWriter', daemon=True)
+        self.thread.start()
+
+    def write(self, path: str, checkpoint: dict):
+        """Queues the checkpoint to be saved at path. The checkpoint must not share tensors with the live training state."""
+        self._raise_error()
+        self.queue.put((path, checkpoint))
+
+    def wait(self):
+        """Blocks until all queued checkpoints are written"""
+        self.queue.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError('Writing a checkpoint failed') from error
+
+    def _run(self):
+        while True:
+            path, checkpoint = self.queue.get()
+            try:
+                self._save(path, checkpoint)
+                if self.keep_epochs > 0:
+                    self._remove_old_epochs(os.path.dirname(path))
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _save(self, path, checkpoint):
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                torch.save(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+
+    def _remove_old_epochs(self, dir):
+        """Removes all but the newest keep_epochs per-epoch checkpoints. 'latest' and 'best' are single files that are replaced on every write."""
+        epochs = sorted(int(name) for name in os.listdir(dir) if name.isdigit())
+        for epoch in epochs[:-self.keep_epochs]:
+            os.remove(os.path.join(dir, str(epoch)))
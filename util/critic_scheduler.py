@@ -0,0 +1,96 @@
+import os
+from util import distributed
+
+
+class CriticScheduler():
+    """
+    Decides in which training iterations the generator is optimized. The critic is optimized in every iteration.
+    By default the generator is optimized every n_critic-th iteration.
+    With --adaptive_critic the number of critic iterations per generator update is adapted after every generator update,
+    based on the mean wasserstein estimate and gradient penalty of the critic iterations since the previous one:
+    If both changed less than critic_tolerance relative to their running averages for critic_patience generator updates,
+    the critic is considered converged and n_critic is decreased. If one of them changed more than twice the tolerance
+    for critic_patience generator updates, n_critic is increased. Changes in between reset both counters (hysteresis).
+    n_critic stays within [n_critic_min, n_critic_max]. Every change is logged to critic_schedule.txt in the checkpoint directory.
+    """
+
+    momentum = 0.9  # momentum of the running averages
+
+    def __init__(self, opt, model, log_dir=None):
+        self.adaptive = opt.adaptive_critic
+        self.n_critic = opt.n_critic
+        self.model = model
+        if self.adaptive:
+            if not hasattr(model, 'pop_critic_stats'):
+                raise ValueError('--adaptive_critic requires a wasserstein model, e.g. cycleGAN_W or cycleGAN_W_REG')
+            self.n_critic_min = opt.n_critic_min
+            self.n_critic_max = max(opt.n_critic_max, opt.n_critic_min)
+            self.tolerance = opt.critic_tolerance
+            self.patience = opt.critic_patience
+        self.log_path = os.path.join(log_dir, 'critic_schedule.txt') if log_dir and distributed.is_main_process() else None
+        self.iters_since_G = 0
+        self.wasserstein = None
+        self.penalty = None
+        self.num_stable = 0
+        self.num_unstable = 0
+
+    def optimize_G(self, i):
+        """Returns whether the generator is optimized in the training iteration with batch index i"""
+        if not self.adaptive:
+            return not(i % self.n_critic)
+        return self.iters_since_G + 1 >= self.n_critic
+
+    def step(self, optimized_G, **info):
+        """
+        Updates the schedule; called after every training iteration.
+        The given keyword arguments (e.g. epoch and total_iters) are added to the log.
+        """
+        if not self.adaptive:
+            return
+        if not optimized_G:
+            self.iters_since_G += 1
+            return
+        self.iters_since_G = 0
+        wasserstein, penalty = self.model.pop_critic_stats()
+        if self.wasserstein is None:
+            self.wasserstein, self.penalty = wasserstein, penalty
+            return
+        change = max(self.relative_change(wasserstein, self.wasserstein), self.relative_change(penalty, self.penalty))
+        self.wasserstein = self.momentum * self.wasserstein + (1 - self.momentum) * wasserstein
+        self.penalty = self.momentum * self.penalty + (1 - self.momentum) * penalty
+        if change < self.tolerance:
+            self.num_stable += 1
+            self.num_unstable = 0
+        elif change > 2 * self.tolerance:
+            self.num_unstable += 1
+            self.num_stable = 0
+        else:
+            self.num_stable = self.num_unstable = 0
+
+        if self.num_stable >= self.patience or self.num_unstable >= self.patience:
+            step = 1 if self.num_unstable >= self.patience else -1
+            n_critic = min(max(self.n_critic + step, self.n_critic_min), self.n_critic_max)
+            self.num_stable = self.num_unstable = 0
+            if n_critic != self.n_critic:
+                self.log(n_critic, wasserstein, penalty, change, info)
+                self.n_critic = n_critic
+
+    @staticmethod
+    def relative_change(value, average):
+        return abs(value - average) / max(abs(average), 1e-8)
+
+    def log(self, n_critic, wasserstein, penalty, change, info):
+        message = ' '.join('%s: %s' % (key, value) for key, value in info.items())
+        message += ' n_critic: %d -> %d (wasserstein: %.4f, penalty: %.4f, relative change: %.4f)' % (self.n_critic, n_critic, wasserstein, penalty, change)
+        if self.log_path is not None:
+            print(message)
+            with open(self.log_path, 'a') as f:
+                f.write(message + '\n')
+
+    def state_dict(self):
+        return {'n_critic': self.n_critic, 'iters_since_G': self.iters_since_G, 'wasserstein': self.wasserstein,
+                'penalty': self.penalty, 'num_stable': self.num_stable, 'num_unstable': self.num_unstable}
+
+    def load_state_dict(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
@@ -0,0 +1,111 @@
+"""
+Helpers for multi-process data parallel training with torch.distributed.
+train.py is started once per process by torchrun, e.g. on a CPU box with 4 processes:
+
+    torchrun --nproc_per_node 4 train.py --gpu_ids -1 [...]
+
+or with one process per GPU:
+
+    torchrun --nproc_per_node 4 train.py --gpu_ids 0,1,2,3 [...]
+
+Every process trains on its own shard of the training set with --batch_size samples per step.
+Instead of wrapping the networks in DistributedDataParallel, the gradients are averaged explicitly before every optimizer step,
+since the critics are evaluated several times per step and differentiated twice by the gradient penalty.
+"""
+import itertools
+import os
+import numpy as np
+import torch
+import torch.distributed as dist
+
+
+def setup(opt):
+    """
+    Reads the rank and the number of processes set by torchrun into opt.rank, opt.local_rank and opt.world_size.
+    On GPUs every process uses one of the given gpu_ids, selected by its local rank. Only rank 0 prints.
+    """
+    opt.rank = int(os.environ.get('RANK', 0))
+    opt.local_rank = int(os.environ.get('LOCAL_RANK', 0))
+    opt.world_size = int(os.environ.get('WORLD_SIZE', 1))
+    if opt.world_size > 1 and opt.gpu_ids:
+        opt.gpu_ids = [opt.gpu_ids[opt.local_rank % len(opt.gpu_ids)]]
+    if opt.rank > 0:
+        opt.quiet = True
+
+
+def init_process_group(opt):
+    """Joins the process group if more than one process was started. Uses gloo on CPU and nccl on GPU by default."""
+    if opt.world_size > 1 and not dist.is_initialized():
+        backend = opt.dist_backend or ('nccl' if opt.gpu_ids else 'gloo')
+        dist.init_process_group(backend, rank=opt.rank, world_size=opt.world_size)
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def is_main_process():
+    """True for rank 0 and for single process training. Checkpoints, logs and visuals are only written by the main process."""
+    return not is_distributed() or dist.get_rank() == 0
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+def broadcast_parameters(networks):
+    """Copies the parameters and buffers of the given networks from rank 0 to all other ranks"""
+    if is_distributed():
+        for network in networks:
+            for tensor in itertools.chain(network.parameters(), network.buffers()):
+                dist.broadcast(tensor.data, 0)
+
+
+def all_reduce_gradients(optimizer: torch.optim.Optimizer):
+    """Averages the gradients of all parameters of the optimizer over all ranks with a single all-reduce"""
+    if not is_distributed():
+        return
+    grads = [p.grad for group in optimizer.param_groups for p in group['params'] if p.grad is not None]
+    if not grads:
+        return
+    flat = torch.cat([grad.reshape(-1) for grad in grads])
+    dist.all_reduce(flat)
+    flat /= dist.get_world_size()
+    for grad, reduced in zip(grads, flat.split([grad.numel() for grad in grads])):
+        grad.copy_(reduced.view_as(grad))
+
+
+def all_reduce_mean(tensor: torch.Tensor) -> torch.Tensor:
+    """Averages the tensor over all ranks in place and returns it"""
+    if is_distributed():
+        dist.all_reduce(tensor)
+        tensor /= dist.get_world_size()
+    return tensor
+
+
+def broadcast_object(obj):
+    """Returns obj of rank 0 on all ranks"""
+    if not is_distributed():
+        return obj
+    objects = [obj]
+    dist.broadcast_object_list(objects, 0)
+    return objects[0]
+
+
+def any_rank(flags: list, device) -> list:
+    """Returns for each of the given boolean flags whether it is set on any rank"""
+    if not is_distributed():
+        return flags
+    flags = torch.tensor(flags, dtype=torch.int32, device=device)
+    dist.all_reduce(flags, op=dist.ReduceOp.MAX)
+    return flags.bool().tolist()
+
+
+def all_gather(array: np.ndarray) -> np.ndarray:
+    """Concatenates the arrays of all ranks along the first dimension, in rank order"""
+    if not is_distributed():
+        return array
+    arrays = [None] * dist.get_world_size()
+    dist.all_gather_object(arrays, array)
+    return np.concatenate(arrays)
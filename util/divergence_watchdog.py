@@ -0,0 +1,94 @@
+import json
+import time
+import torch
+from util import distributed
+
+
+class DivergenceWatchdog():
+    """
+    Detects diverging training runs: NaN or Inf losses, or critic losses whose magnitude exceeds a threshold.
+    The losses are checked on their device in every iteration, the result is only synchronized every check_freq iterations.
+    After every healthy check the training state is snapshotted in host memory, so the snapshot takes no device memory. On divergence the model is rolled back to
+    this snapshot and the learning rates are optionally reduced. After max_rollbacks rollbacks the run is given up.
+    Every divergence is appended as a JSON line to the events file, so tuning tools can stop the trial.
+    """
+
+    def __init__(self, model, opt, events_path):
+        """
+        Parameters:
+            model -- the CycleGAN model to watch
+            opt -- training options, see the watchdog parameters in TrainOptions
+            events_path (str) -- file the divergence events are appended to
+        """
+        self.model = model
+        self.check_freq = opt.watchdog_freq
+        self.max_critic = opt.watchdog_max_critic
+        self.lr_factor = opt.watchdog_lr_factor
+        self.max_rollbacks = opt.watchdog_max_rollbacks
+        self.events_path = events_path
+        self.critic_losses = [name for name in model.loss_names if name.startswith('loss_D')]
+        self.rollbacks = 0
+        self.iterations = 0
+        self.snapshot = model.get_training_state(to_cpu=True)
+        self._reset()
+
+    def _reset(self):
+        self.nonfinite = torch.zeros((), dtype=torch.bool, device=self.model.device)
+        self.critic_max = torch.zeros((), device=self.model.device)
+
+    def check(self, **info):
+        """
+        Checks the current losses of the model; called after every training iteration.
+        The given keyword arguments (e.g. epoch and total_iters) are added to the events.
+
+        Returns
+        -------
+            - 'ok', 'rollback' if the model was rolled back to the last snapshot or 'abort' if training should stop
+        """
+        losses = [getattr(self.model, name) for name in self.model.loss_names]
+        losses = [loss.detach().float() for loss in losses if isinstance(loss, torch.Tensor)]
+        if losses:
+            self.nonfinite |= ~torch.stack(losses).isfinite().all()
+        critic_losses = [getattr(self.model, name) for name in self.critic_losses]
+        critic_losses = [loss.detach().float() for loss in critic_losses if isinstance(loss, torch.Tensor)]
+        if critic_losses:
+            self.critic_max = torch.maximum(self.critic_max, torch.stack(critic_losses).abs().max())
+
+        self.iterations += 1
+        if self.iterations % self.check_freq:
+            return 'ok'
+        nonfinite, runaway = distributed.any_rank([self.nonfinite.item(), self.critic_max.item() > self.max_critic], self.model.device)
+        critic_max = self.critic_max.item()
+        self._reset()
+        if not (nonfinite or runaway):
+            self.snapshot = self.model.get_training_state(to_cpu=True)
+            return 'ok'
+
+        self.rollbacks += 1
+        action = 'abort' if self.rollbacks > self.max_rollbacks else 'rollback'
+        if action == 'rollback':
+            self.model.set_training_state(self.snapshot)
+            if self.lr_factor != 1:
+                self.scale_learning_rates(self.lr_factor)
+            # Further rollbacks return to the reduced learning rates
+            self.snapshot = self.model.get_training_state(to_cpu=True)
+        self.emit(event='divergence', reason='nan/inf loss' if nonfinite else 'critic loss above %g' % self.max_critic,
+                  critic_max=critic_max, action=action, rollbacks=self.rollbacks,
+                  lr={name: optimizer.param_groups[0]['lr'] for name, optimizer in self.model.optimizers.items()}, **info)
+        return action
+
+    def scale_learning_rates(self, factor):
+        """Multiplies the learning rates of all optimizers, including the base rates of the schedulers"""
+        for optimizer in self.model.optimizers.values():
+            for group in optimizer.param_groups:
+                group['lr'] *= factor
+        for scheduler in self.model.schedulers:
+            if hasattr(scheduler, 'base_lrs'):
+                scheduler.base_lrs = [lr * factor for lr in scheduler.base_lrs]
+
+    def emit(self, **event):
+        event = dict(time=time.time(), **event)
+        if distributed.is_main_process():
+            print('WARNING: training diverged:', event)
+            with open(self.events_path, 'a') as f:
+                f.write(json.dumps(event) + '\n')
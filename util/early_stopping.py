@@ -0,0 +1,35 @@
+class EarlyStopping():
+    """
+    Plateau based early stopping on the validation score (lower is better), analogous to the CustomStopper of raytune.py:
+    Training stops once the score did not improve by more than tolerance for more than patience validations,
+    but not before min_iters training iterations.
+    """
+
+    def __init__(self, patience, tolerance=0.001, min_iters=0):
+        """
+        Parameters:
+            patience (int) -- number of validations without improvement after which training stops
+            tolerance (float) -- minimum decrease of the score that counts as improvement
+            min_iters (int) -- training never stops before this many training iterations
+        """
+        self.patience = patience
+        self.tolerance = tolerance
+        self.min_iters = min_iters
+        self.best_score = float('inf')
+        self.num_bad_validations = 0
+
+    def step(self, score, total_iters):
+        """Records the validation score after total_iters training iterations. Returns True if training should stop."""
+        if score < self.best_score - self.tolerance:
+            self.best_score = score
+            self.num_bad_validations = 0
+        else:
+            self.num_bad_validations += 1
+        return total_iters >= self.min_iters and self.num_bad_validations > self.patience
+
+    def state_dict(self):
+        return {'best_score': self.best_score, 'num_bad_validations': self.num_bad_validations}
+
+    def load_state_dict(self, state):
+        self.best_score = state['best_score']
+        self.num_bad_validations = state['num_bad_validations']
@@ -36,7 +36,8 @@ class ImagePool():
             return images
         return_images = []
         for image in images:
-            image = torch.unsqueeze(image.detach(), 0)
+            # A copy, a view would keep the whole batch alive as long as the image is in the pool
+            image = torch.unsqueeze(image.detach(), 0).clone()
             if self.num_imgs < self.pool_size:   # if the buffer is not full; keep inserting current images to the buffer
                 self.num_imgs = self.num_imgs + 1
                 self.images.append(image)
@@ -52,3 +53,15 @@ class ImagePool():
                     return_images.append(image)
         return_images = torch.cat(return_images, 0)   # collect all the images and return
         return return_images
+
+    def state_dict(self):
+        """Returns the buffered images so the pool can be restored with load_state_dict()"""
+        if self.pool_size == 0:
+            return {}
+        return {'num_imgs': self.num_imgs, 'images': list(self.images)}
+
+    def load_state_dict(self, state_dict):
+        if self.pool_size == 0:
+            return
+        self.num_imgs = state_dict['num_imgs']
+        self.images = list(state_dict['images'])
@@ -0,0 +1,289 @@
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import torch
+from models import define
+from models.auxiliaries import auxiliary
+from models.auxiliaries.mrs_physics_model import MRSPhysicsModel
+
+T = torch.Tensor
+
+
+class Quantifier():
+    """
+    Quantifies spectra with the extractor (netG_A) of a trained cycleGAN_W_REG checkpoint: param_to_quantity(netG_A(spectra)).
+    Only the extractor and the physics model are loaded, and both run on the CPU.
+    """
+
+    def __init__(self, opt, checkpoint_path):
+        if opt.model != 'cycleGAN_W_REG':
+            raise ValueError('Serving needs the extractor of a cycleGAN_W_REG checkpoint, not %s' % opt.model)
+        self.opt = opt
+        self.physicsModel = MRSPhysicsModel(opt)
+        self.label_names = self.physicsModel.get_label_names()
+        state = torch.load(checkpoint_path, map_location='cpu', weights_only=False)['networks'][0]
+        # Checkpoints of GPU runs store the extractor wrapped in nn.DataParallel
+        state = {key[len('module.'):] if key.startswith('module.') else key: value for key, value in state.items()}
+        # The basis spectra of the physics model are cut to the region of interest
+        self.data_length = self.physicsModel.basis_spectra.shape[-1]
+        auxiliary.set_num_dimensions(1)
+        self.network = define.define_extractor(opt.input_nc, self.physicsModel.get_num_out_channels(), self.data_length,
+                                               opt.nef, opt.n_layers_E, opt.norm, gpu_ids=[], arch=opt.netE_arch)
+        self.network.load_state_dict(state)
+        self.network.eval()
+
+    def preprocess(self, spectra: np.ndarray) -> T:
+        """
+        Applies the transformations of the dataset to single (CxL) or batched (NxCxL) spectra and returns them as batch.
+        The spectra have two channels (real and imaginary) or already the channels of --representation,
+        and the length of the data files or of the region of interest (--roi).
+        """
+        spectra = np.asarray(spectra, dtype=float)
+        if spectra.ndim == 2:
+            spectra = spectra[None]
+        if spectra.ndim != 3:
+            raise ValueError('Expected spectra of shape CxL or NxCxL, got %s' % (spectra.shape,))
+        if spectra.shape[1] == 2 and self.opt.input_nc == 1:
+            if self.opt.representation == 'mag':
+                spectra = np.sqrt(spectra[:,0:1,:]**2 + spectra[:,1:2,:]**2)
+            else:
+                spectra = spectra[:,0:1,:] if self.opt.representation == 'real' else spectra[:,1:2,:]
+        if spectra.shape[-1] != self.data_length:
+            spectra = spectra[..., self.opt.roi]
+        if spectra.shape[1:] != (self.opt.input_nc, self.data_length):
+            raise ValueError('Expected spectra with %d channels and %d points in the region of interest, got %s'
+                             % (self.opt.input_nc, self.data_length, spectra.shape[1:]))
+        scale = np.abs(spectra).max(axis=(1, 2), keepdims=True)
+        if not np.all(np.isfinite(scale)) or np.any(scale == 0):
+            raise ValueError('Spectra must be finite and not all zero in the region of interest')
+        spectra = spectra / scale
+        return torch.from_numpy(spectra).float()
+
+    def __call__(self, spectra: T) -> T:
+        """Returns the quantities (NxM) of a batch of preprocessed spectra (NxCxL)"""
+        with torch.inference_mode():
+            return self.physicsModel.param_to_quantity(self.network.forward(spectra))
+
+
+class DynamicBatcher():
+    """
+    Coalesces concurrent requests into batches for one forward pass each.
+    A batch is run once it holds max_batch_size spectra or its first request waited max_latency seconds.
+    A single request larger than max_batch_size is run as its own batch.
+    Latency (from submit() to the result) and batch sizes of the last window requests are kept for metrics().
+    """
+
+    def __init__(self, predict, max_batch_size=64, max_latency=0.005, window=1000):
+        """
+        Parameters:
+            predict -- function mapping a batch of inputs to a batch of outputs
+            max_batch_size (int) -- maximum number of samples per batch
+            max_latency (float) -- maximum time in seconds a request waits for further requests
+            window (int) -- number of recent requests the latency statistics are computed over
+        """
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.queue = queue.Queue()
+        self.next_request = None
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.num_requests = self.num_samples = self.num_batches = 0
+        self.compute_time = 0.0
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.thread = threading.Thread(target=self._run, name='DynamicBatcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, inputs: T) -> Future:
+        """Queues a batch of inputs. Returns a future of the outputs"""
+        future = Future()
+        self.queue.put((inputs, future, time.perf_counter()))
+        return future
+
+    def _next_batch(self):
+        requests = [self.next_request or self.queue.get()]
+        self.next_request = None
+        size = len(requests[0][0])
+        deadline = requests[0][2] + self.max_latency
+        while size < self.max_batch_size:
+            try:
+                request = self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if size + len(request[0]) > self.max_batch_size:
+                self.next_request = request
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._next_batch()
+            start = time.perf_counter()
+            try:
+                outputs = self.predict(torch.cat([inputs for inputs, _, _ in requests])).split([len(inputs) for inputs, _, _ in requests])
+            except Exception as e:
+                for _, future, _ in requests:
+                    future.set_exception(e)
+                continue
+            end = time.perf_counter()
+            for (_, future, _), output in zip(requests, outputs):
+                future.set_result(output)
+            with self.lock:
+                self.num_requests += len(requests)
+                self.num_samples += sum(len(output) for output in outputs)
+                self.num_batches += 1
+                self.compute_time += end - start
+                self.latencies.extend(end - arrival for _, _, arrival in requests)
+                self.batch_sizes.append(sum(len(output) for output in outputs))
+
+    def metrics(self):
+        """Returns the request, batch, latency and throughput statistics since the start"""
+        with self.lock:
+            uptime = time.perf_counter() - self.start_time
+            latencies = np.array(self.latencies) * 1000
+            return {
+                'requests': self.num_requests,
+                'samples': self.num_samples,
+                'batches': self.num_batches,
+                'queued_requests': self.queue.qsize(),
+                'uptime_s': uptime,
+                'samples_per_s': self.num_samples / uptime,
+                'busy': self.compute_time / uptime,
+                'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+                'latency_ms': {
+                    'mean': float(latencies.mean()),
+                    'p50': float(np.percentile(latencies, 50)),
+                    'p95': float(np.percentile(latencies, 95)),
+                    'p99': float(np.percentile(latencies, 99)),
+                    'max': float(latencies.max())
+                } if len(latencies) else {}
+            }
+
+
+class QuantificationHandler(BaseHTTPRequestHandler):
+    """
+    POST /quantify with {"spectra": CxL or NxCxL nested lists} returns {"labels": [...], "quantities": M or NxM nested lists}.
+    GET /metrics returns the statistics of the DynamicBatcher, GET /health returns {"status": "ok"}.
+    """
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self.send_json(200, self.server.batcher.metrics())
+        elif self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        else:
+            self.send_json(404, {'error': 'unknown path %s' % self.path})
+
+    def do_POST(self):
+        if self.path != '/quantify':
+            self.send_json(404, {'error': 'unknown path %s' % self.path})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            spectra = np.asarray(body['spectra'], dtype=float)
+            inputs = self.server.quantifier.preprocess(spectra)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        try:
+            quantities = self.server.batcher.submit(inputs).result().tolist()
+        except Exception as e:
+            self.send_json(500, {'error': '%s: %s' % (type(e).__name__, e)})
+            return
+        self.send_json(200, {'labels': self.server.quantifier.label_names,
+                             'quantities': quantities if spectra.ndim == 3 else quantities[0]})
+
+    def send_json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Clients of Unix sockets have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        # Requests are counted in /metrics instead of logged one by one
+        pass
+
+
+class QuantificationHTTPServer(ThreadingHTTPServer):
+    # Concurrent clients beyond the default backlog of 5 connections would wait for TCP retransmits
+    request_queue_size = 128
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def create_server(quantifier: Quantifier, batcher: DynamicBatcher, host='127.0.0.1', port=8000, socket_path=None):
+    """Creates a threaded HTTP server on host:port or on the Unix socket socket_path. Start it with serve_forever()"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, QuantificationHandler)
+    else:
+        server = QuantificationHTTPServer((host, port), QuantificationHandler)
+    server.quantifier = quantifier
+    server.batcher = batcher
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class InferenceClient():
+    """Client of the inference server on host:port or on the Unix socket socket_path. Opens one connection per request, so it can be shared by threads"""
+
+    def __init__(self, host='127.0.0.1', port=8000, socket_path=None, timeout=60):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def quantify(self, spectra) -> np.ndarray:
+        """Returns the quantities (M) of a single spectrum (CxL) or the quantities (NxM) of a batch of spectra (NxCxL)"""
+        return np.asarray(self.request('POST', '/quantify', {'spectra': np.asarray(spectra).tolist()})['quantities'])
+
+    def metrics(self) -> dict:
+        return self.request('GET', '/metrics')
+
+    def request(self, method, path, obj=None):
+        if self.socket_path:
+            connection = UnixHTTPConnection(self.socket_path, self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps(obj) if obj is not None else None
+            connection.request(method, path, body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            result = json.loads(response.read())
+            if response.status != 200:
+                raise RuntimeError('%s %s failed (%d): %s' % (method, path, response.status, result.get('error')))
+            return result
+        finally:
+            connection.close()
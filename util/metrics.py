@@ -0,0 +1,61 @@
+import numpy as np
+import torch
+from util import distributed
+
+
+class MetricsAccumulator():
+    """
+    Computes the per metabolite metrics of compute_error() (mean absolute error, average relative error and R^2) batch by batch,
+    without collecting the predictions: Only running sums and the mean and sum of squared deviations of the predictions
+    (merged with Chan's parallel algorithm) are kept, on the device of the predictions and in double precision.
+    They are copied to the host once, in compute().
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.sums = None    # sums of the absolute errors, relative errors and squared errors per metabolite
+        self.mean = None    # mean prediction per metabolite
+        self.m2 = None      # sum of squared deviations of the predictions from their mean per metabolite
+
+    def update(self, predictions: torch.Tensor, labels: torch.Tensor):
+        """Adds a batch of predictions and labels (NxM, N=number of samples, M=number of metabolites)"""
+        predictions = predictions.detach().double()
+        labels = labels.to(predictions.device).double()
+        error = predictions - labels
+        abs_error = error.abs()
+        sums = torch.stack([abs_error.sum(0), (abs_error / labels.abs()).sum(0), error.pow(2).sum(0)])
+        n_batch = len(predictions)
+        mean_batch = predictions.mean(0)
+        m2_batch = (predictions - mean_batch).pow(2).sum(0)
+        if self.n == 0:
+            self.sums, self.mean, self.m2 = sums, mean_batch, m2_batch
+        else:
+            n = self.n + n_batch
+            delta = mean_batch - self.mean
+            self.sums = self.sums + sums
+            self.mean = self.mean + delta * n_batch / n
+            self.m2 = self.m2 + m2_batch + delta.pow(2) * self.n * n_batch / n
+        self.n += n_batch
+
+    def compute(self):
+        """
+        Returns the metrics over all samples, and over all processes in distributed training:
+            - The Mean Absolute Error (L1) per metabolite. (M) with M=number of metabolites
+            - The Average Relative Error per metabolite. (M)
+            - The Coefficient of Determination (R^2) per metabolite. (M), like sklearn's r2_score(predictions, labels)
+        """
+        state = torch.cat([torch.full_like(self.mean, self.n)[None], self.sums, self.mean[None], self.m2[None]]).cpu().numpy()
+        states = distributed.all_gather(state[None])
+        n, sums, mean, m2 = states[0, 0], states[0, 1:4], states[0, 4], states[0, 5]
+        for other in states[1:]:
+            n_other, mean_other = other[0], other[4]
+            delta = mean_other - mean
+            m2 = m2 + other[5] + delta ** 2 * n * n_other / (n + n_other)
+            mean = mean + delta * n_other / (n + n_other)
+            sums = sums + other[1:4]
+            n = n + n_other
+        avg_abs_err, avg_err_rel = sums[0] / n, sums[1] / n
+        # The predictions are the "true" values of r2_score in compute_error(), a constant prediction gives 1 or 0 like sklearn
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r2 = np.where(m2 != 0, 1 - sums[2] / m2, np.where(sums[2] == 0, 1.0, 0.0))
+        return list(avg_abs_err), list(avg_err_rel), list(r2)
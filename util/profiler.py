@@ -0,0 +1,113 @@
+"""
+Profiles the computational cost of the networks of a model: per layer FLOPs, parameters and activation memory,
+and per network the measured forward and backward latency.
+"""
+import copy
+import torch
+import torch.nn as nn
+from torch.utils.flop_counter import FlopCounterMode
+from torch.utils._pytree import tree_leaves
+
+from util.benchmark import measure
+from util.util import get_networks, record_network_inputs
+
+
+def _size_mb(output):
+    return sum(t.numel() * t.element_size() for t in tree_leaves(output) if isinstance(t, torch.Tensor)) / 2**20
+
+
+def _backward(output):
+    sum(t.float().sum() for t in tree_leaves(output) if isinstance(t, torch.Tensor) and t.requires_grad).backward()
+
+
+def profile_network(network: nn.Module, inputs: tuple, device, n_iter=10, autocast=None):
+    """
+    Profiles a training step (forward and backward pass) of the network on the given inputs.
+    The network is copied, so that neither its gradients nor its normalization statistics are changed.
+
+    Returns:
+    --------
+        - dictionary with the totals of the network and a list of its layers (modules without children), each with
+          its number of parameters, the FLOPs of its forward pass and the size of its output in MB.
+          FLOPs are those of convolutions and matrix multiplications as counted by FlopCounterMode (a multiply-add counts as two FLOPs).
+          saved_mb is the size of the tensors autograd keeps for the backward pass, the latencies are means over n_iter runs
+    """
+    network = copy.deepcopy(network).train()
+    if not any(p.requires_grad for p in network.parameters()):
+        # Networks without parameters (the physics model) are differentiated with respect to their inputs
+        inputs = tuple(x.detach().float().requires_grad_() for x in inputs)
+    autocast = autocast or torch.autocast(torch.device(device).type, enabled=False)
+    root = type(network).__name__
+
+    layers = {name: module for name, module in network.named_modules() if name and not any(module.children())}
+    outputs = {}
+    def record(name):
+        def hook(module, args, output):
+            outputs.setdefault(name, _size_mb(output))
+        return hook
+    hooks = [module.register_forward_hook(record(name)) for name, module in layers.items()]
+    try:
+        with torch.no_grad(), autocast, FlopCounterMode(display=False) as forward_counter:
+            output = network(*inputs)
+    finally:
+        for hook in hooks:
+            hook.remove()
+    with FlopCounterMode(display=False) as training_counter:
+        with autocast:
+            output = network(*inputs)
+        _backward(output)
+    forward_flops = {name: sum(counts.values()) for name, counts in forward_counter.get_flop_counts().items()}
+
+    with autocast:
+        forward = measure(lambda: network(*inputs), device, n_iter=n_iter)
+    def step():
+        with autocast:
+            output = network(*inputs)
+        _backward(output)
+    training = measure(step, device, n_iter=n_iter)
+    total_flops = forward_counter.get_total_flops()
+    return {
+        'parameters': sum(p.numel() for p in network.parameters()),
+        'forward_mflops': total_flops / 1e6,
+        'backward_mflops': (training_counter.get_total_flops() - total_flops) / 1e6,
+        'output_mb': _size_mb(output),
+        'saved_mb': forward['saved_mb'],
+        'forward_ms': forward['time_ms'],
+        'backward_ms': max(training['time_ms'] - forward['time_ms'], 0),
+        'layers': [{
+            'name': name,
+            'type': type(module).__name__,
+            'parameters': sum(p.numel() for p in module.parameters()),
+            'mflops': forward_flops.get('%s.%s' % (root, name), 0) / 1e6,
+            'output_mb': outputs.get(name, 0)
+        } for name, module in layers.items()]
+    }
+
+
+def profile_model(model, data: dict, n_iter=10):
+    """
+    Profiles every network of the model and its physics model on the batch data with profile_network().
+    The networks are profiled on the inputs they get in the forward pass of the model, the discriminators on the real spectra
+    and the physics model on random parameters of a local generator. The random number generators of training are not used.
+
+    Returns:
+    --------
+        - dictionary with the batch size, the length of the spectra and the profile of every network by attribute name
+    """
+    phase, model.opt.phase = model.opt.phase, 'val'
+    try:
+        with torch.no_grad():
+            inputs = {name: calls[0] for name, calls in record_network_inputs(model, [data]).items()}
+    finally:
+        model.opt.phase = phase
+    spectra = model.input_A
+    networks = dict(get_networks(model), physicsModel=model.physicsModel)
+    params = torch.rand(len(spectra), model.physicsModel.get_num_out_channels(), generator=torch.Generator().manual_seed(0))
+    inputs['physicsModel'] = (params.to(spectra.device),)
+    return {
+        'batch_size': len(spectra),
+        'data_length': spectra.shape[-1],
+        'device': str(model.device),
+        'networks': {name: profile_network(network, inputs.get(name, (spectra,)), model.device, n_iter, model.autocast())
+                     for name, network in networks.items()}
+    }
@@ -1,5 +1,8 @@
 from __future__ import print_function
 from argparse import Namespace
+import copy
+import random
+import torch
 import numpy as np
 from PIL import Image
 import os
@@ -62,6 +65,90 @@ def save_image(image_numpy, image_path, aspect_ratio=1.0):
     image_pil.save(image_path)
 
 
+def split_batch(data: dict, batch_size: int):
+    """Splits a batch of the data loader into batches of at most batch_size samples"""
+    n = len(data['A'])
+    return [{key: value[i:i + batch_size] for key, value in data.items()} for i in range(0, n, batch_size)]
+
+
+def get_networks(model):
+    """Returns the networks of a CycleGAN model by attribute name, without nn.DataParallel"""
+    names = {id(value): name for name, value in vars(model).items() if isinstance(value, torch.nn.Module)}
+    return {names[id(network)]: getattr(network, 'module', network) for network in model.networks}
+
+
+def set_network(model, name, network):
+    """Replaces the network of a CycleGAN model stored as attribute name"""
+    old = getattr(model, name)
+    model.networks = [network if n is old else n for n in model.networks]
+    setattr(model, name, network)
+
+
+def record_network_inputs(model, batches):
+    """
+    Runs the inference forward pass (model.test()) on each batch of the data loader and returns the inputs of the networks,
+    as list of argument tuples (one per call) per network attribute name
+    """
+    inputs = {}
+    networks = get_networks(model)
+    # The models call network.forward() directly, which bypasses forward hooks
+    def recorder(name, forward):
+        def record(*args):
+            inputs.setdefault(name, []).append(tuple(arg.detach() for arg in args))
+            return forward(*args)
+        return record
+    for name, network in networks.items():
+        network.forward = recorder(name, network.forward)
+    try:
+        for data in batches:
+            model.set_input(data)
+            model.test()
+    finally:
+        for network in networks.values():
+            del network.forward
+    return inputs
+
+
+def copy_tensors(obj, device):
+    """
+    Returns a deep copy of a nested structure of dicts, lists and tuples (e.g. a state_dict) with all tensors copied to the given device.
+    Unlike copy.deepcopy the copy never shares memory with obj and does not allocate memory on the device of obj.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to(device, copy=True)
+    if isinstance(obj, dict):
+        result = type(obj)((key, copy_tensors(value, device)) for key, value in obj.items())
+        if hasattr(obj, '_metadata'):
+            result._metadata = copy.deepcopy(obj._metadata)   # state_dict versions
+        return result
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(copy_tensors(value, device) for value in obj)
+    return copy.deepcopy(obj)
+
+
+def get_rng_states():
+    """
+    Returns the states of all random number generators used during training (python, numpy, torch and CUDA)
+    """
+    return {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+        'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else []
+    }
+
+
+def set_rng_states(states: dict):
+    """
+    Restores the random number generators from a dictionary created by get_rng_states()
+    """
+    random.setstate(states['python'])
+    np.random.set_state(states['numpy'])
+    torch.set_rng_state(states['torch'])
+    if states['cuda'] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(states['cuda'])
+
+
 def mkdirs(paths):
     """create empty directories if they don't exist
 
@@ -200,7 +287,8 @@ def load_loss_from_file(path):
                     legend.append(t.replace(':', ''))
         y.append(y_i)
         has_legend=True
-    y.pop(0)
+    if y:
+        y.pop(0)
     x = [*np.array(range(len(y)))/10000]
 
     return {'X': x, 'Y': y, 'legend': legend}
@@ -300,13 +388,23 @@ def load_options(path):
             line = line.rstrip()
             if line.startswith('-'):
                 continue
-            args = line.split(': ')
+            # Empty values are written as 'key: ' and lose their separator with the trailing space
+            key, _, value = line.partition(':')
+            value = value.strip()
             try:
-                opt[args[0]] = eval(args[1])
+                opt[key] = eval(value)
             except:
-                opt[args[0]] = args[1]
+                opt[key] = value
     return Namespace(**opt)
 
+def save_options(opt, path):
+    """Writes the options to the option file at the given path, see load_options()"""
+    with open(path, 'wt') as opt_file:
+        opt_file.write('------------ Options -------------\n')
+        for k, v in sorted(vars(opt).items()):
+            opt_file.write('%s: %s\n' % (str(k), str(v)))
+        opt_file.write('-------------- End ----------------\n')
+
 def merge_options(default, base, overwrite):
     """
     Merges the three given Namespaces. The priority will be default < base < overwrite.
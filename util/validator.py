@@ -1,7 +1,9 @@
 from models.cycleGAN import CycleGAN
 
 from torch.utils.data.dataloader import DataLoader
-from util.util import compute_error
+from util.util import compute_error, split_batch
+from util import distributed
+from util.metrics import MetricsAccumulator
 import torch
 import numpy as np
 import sys
@@ -14,7 +16,7 @@ class Validator:
     def __init__(self, opt):
         self.opt = opt
 
-    def get_validation_score(self, model: CycleGAN, dataset: DataLoader, num_batches=sys.maxsize):
+    def get_validation_score(self, model: CycleGAN, dataset: DataLoader, num_batches=sys.maxsize, per_sample=True):
         """
         Computes various validation metrics for the given model.
 
@@ -22,6 +24,8 @@ class Validator:
         ----------
             - model (CycleGAN): The current CycleGAN model
             - dataset (DataLoader): The dataset the validation samples should be taken from. If none is given, the configured validation set will be used. Default=None
+            - per_sample (bool): If False, the relative errors per sample are not returned (None). The metrics are then accumulated
+              on the device batch by batch instead of collecting all predictions on the host. Default=True
 
         Returns
         -------
@@ -30,18 +34,33 @@ class Validator:
             - The Average Relative Error per metabolite. (M) with M=number of metabolites
             - The Coefficient of Determination (R^2) pre metabolite. (M) with M=number of metabolites
         """
+        if not per_sample:
+            metrics = MetricsAccumulator()
+            for i, data in enumerate(dataset):
+                if i>num_batches:
+                    break
+                for batch in split_batch(data, self.opt.batch_size):
+                    model.set_input(batch)
+                    model.test()
+                    metrics.update(model.get_prediction_tensor(), batch['label_A'])
+            avg_abs_err, avg_err_rel, r2 = metrics.compute()
+            return avg_abs_err, None, avg_err_rel, r2
+
         predictions = []
         labels = []
         for i, data in enumerate(dataset):
             if i>num_batches:
                 break
-            model.set_input(data)  # unpack data from data loader
             labels.append(data['label_A'])
-            model.test()           # run inference
-            prediction = model.get_prediction()
-            predictions.append(prediction)
-        predictions = np.concatenate(predictions)
-        labels = torch.cat(labels).numpy()
+            # Training batches hold several micro-batches with --accum_steps
+            for batch in split_batch(data, self.opt.batch_size):
+                model.set_input(batch)  # unpack data from data loader
+                model.test()            # run inference
+                prediction = model.get_prediction()
+                predictions.append(prediction)
+        # In distributed training every process validates its own shard
+        predictions = distributed.all_gather(np.concatenate(predictions))
+        labels = distributed.all_gather(torch.cat(labels).numpy())
         avg_abs_err, err_rel, avg_err_rel, r2 = compute_error(predictions, labels)
 
         return avg_abs_err, err_rel, avg_err_rel, r2
\ No newline at end of file
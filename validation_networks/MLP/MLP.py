@@ -23,6 +23,7 @@ class MLP():
         self.num_epoch = num_epoch
         self.val_fun = val_fun
         self.gpu=gpu
+        self.device = torch.device('cuda:%d' % gpu) if gpu is not None else torch.device('cpu')
         self.load(self.save_path+'.pth')
 
         
@@ -34,11 +35,10 @@ class MLP():
         else:
             self.input = torch.Tensor(batch_size, 1, 1)
             self.label = torch.Tensor(batch_size, 1, 1)
-            raise ValueError('MLP should run on a GPU!')
 
     def load(self, path):
         if os.path.isfile(path):
-            self.network.load_state_dict(torch.load(path))
+            self.network.load_state_dict(torch.load(path, map_location='cpu'))
             self.pretrained = True
             print('Loaded pretrained model from', path)
         else:
@@ -51,16 +51,18 @@ class MLP():
         self.optimizer.step()
         return loss.item()
 
-    def predict(self, x):
-        dataset = DataLoader(MLPDataset(x, None), batch_size=self.batch_size,
-                             num_workers=0, drop_last=False, shuffle=False)
-        return self._predict(dataset)
+    def predict_tensor(self, x: torch.Tensor) -> torch.Tensor:
+        """Predicts the quantities of a batch of spectra in one forward pass. Inputs on the device of the network are used without copies, the result stays on this device"""
+        with torch.inference_mode():
+            return self.network.forward(x.to(self.device, torch.float32))*3.6
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        return torch.cat([self.predict_tensor(batch) for batch in torch.from_numpy(x).split(self.batch_size)]).cpu().numpy()
 
     def _predict(self, val_dataset: DataLoader) -> np.ndarray:
         pred = []
         for spectra, _ in val_dataset:
-            self.input.resize_(spectra.size()).copy_(spectra)
-            pred.append((self.network.forward(self.input)*3.6).detach().cpu().numpy())
+            pred.append(self.predict_tensor(spectra).cpu().numpy())
 
         return np.concatenate(pred)
         